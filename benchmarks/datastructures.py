@@ -0,0 +1,104 @@
+import json
+import random
+import string
+from typing import Any, Dict, List, Optional
+
+from src.types import StockInfo
+
+
+def synthetic_stocks(num: int, timestamp=1686340993, seed=212) -> List[StockInfo]:
+    """Random but valid StockInfo rows, with unique symbols"""
+    rng = random.Random(seed)
+    stocks = []
+    for i in range(num):
+        symbol = "".join(rng.choices(string.ascii_uppercase, k=3)) + str(i)
+        price = round(rng.uniform(1, 500), 2)
+        stocks.append(
+            StockInfo(
+                name=f"{symbol.title()}, Inc.",
+                symbol=symbol,
+                marketcap=rng.randint(10**6, 10**12),
+                price=price,
+                volume=rng.randint(1, 10**8),
+                highprice=round(price * 1.02, 2),
+                lowprice=round(price * 0.98, 2),
+                open=round(price * 0.99, 2),
+                prevclose=round(price * 1.01, 2),
+                timestamp=timestamp,
+            )
+        )
+    return stocks
+
+
+def yahoo_quote(stock: StockInfo, formatted: bool) -> Dict[str, Any]:
+    """A quote as yahoo returns it, with the fields we don't map too"""
+
+    def number(raw, fmt: str, long_fmt: Optional[str] = None):
+        if not formatted:
+            return raw
+        value = {"raw": raw, "fmt": fmt}
+        if long_fmt is not None:
+            value["longFmt"] = long_fmt
+        return value
+
+    price = lambda raw: number(raw, f"{raw:.2f}")
+    return {
+        "language": "en-US",
+        "region": "US",
+        "quoteType": "EQUITY",
+        "typeDisp": "Equity",
+        "quoteSourceName": "Delayed Quote",
+        "triggerable": True,
+        "customPriceAlertConfidence": "HIGH",
+        "currency": "USD",
+        "exchange": "NYQ",
+        "shortName": stock.name,
+        "longName": stock.name,
+        "messageBoardId": f"finmb_{stock.symbol}",
+        "exchangeTimezoneName": "America/New_York",
+        "exchangeTimezoneShortName": "EDT",
+        "gmtOffSetMilliseconds": -14400000,
+        "market": "us_market",
+        "esgPopulated": False,
+        "marketState": "CLOSED",
+        "fiftyTwoWeekHigh": price(stock.highprice * 1.3),
+        "fiftyTwoWeekLow": price(stock.lowprice * 0.7),
+        "fiftyTwoWeekRange": number(
+            f"{stock.lowprice * 0.7:.2f} - {stock.highprice * 1.3:.2f}",
+            f"{stock.lowprice * 0.7:.2f} - {stock.highprice * 1.3:.2f}",
+        ),
+        "marketCap": number(
+            stock.marketcap, f"{stock.marketcap / 1e9:.3f}B", f"{stock.marketcap:,}"
+        ),
+        "regularMarketChange": price(stock.price - stock.prevclose),
+        "regularMarketChangePercent": number(
+            (stock.price / stock.prevclose - 1) * 100,
+            f"{(stock.price / stock.prevclose - 1) * 100:.2f}%",
+        ),
+        "regularMarketTime": number(stock.timestamp, "4:03PM EDT"),
+        "regularMarketPrice": price(stock.price),
+        "regularMarketDayHigh": price(stock.highprice),
+        "regularMarketDayRange": number(
+            f"{stock.lowprice:.2f} - {stock.highprice:.2f}",
+            f"{stock.lowprice:.2f} - {stock.highprice:.2f}",
+        ),
+        "regularMarketDayLow": price(stock.lowprice),
+        "regularMarketVolume": number(
+            stock.volume, f"{stock.volume / 1e6:.2f}M", f"{stock.volume:,}"
+        ),
+        "regularMarketPreviousClose": price(stock.prevclose),
+        "regularMarketOpen": price(stock.open),
+        "fullExchangeName": "NYSE",
+        "sourceInterval": 15,
+        "exchangeDataDelayedBy": 0,
+        "tradeable": False,
+        "cryptoTradeable": False,
+        "priceHint": 2,
+        "symbol": stock.symbol,
+    }
+
+
+def yahoo_response(stocks: List[StockInfo], formatted: bool) -> bytes:
+    """Body of a quote response for the stocks"""
+    result = [yahoo_quote(stock, formatted) for stock in stocks]
+    return json.dumps({"quoteResponse": {"result": result, "error": None}}).encode()
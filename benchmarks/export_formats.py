@@ -0,0 +1,88 @@
+"""
+Compares the csv and parquet exports: artifact size and read time.
+- Exports a throwaway sqlite database of synthetic stocks, one snapshot per day.
+- Reads: every row of the csv, every row of the parquet files,
+  and the parquet files for two columns of one day, as a typical consumer does.
+- Needs pyarrow.
+
+python -m benchmarks.export_formats [rows per day] [days]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+
+import pyarrow.parquet as pq
+
+import export
+from benchmarks.datastructures import synthetic_stocks
+from src import logger
+from src.databases import sqlitedb
+from src.databases.sqlitedb import SqliteDB
+
+DAY = 24 * 60 * 60
+
+
+def size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
+
+
+def timed(func) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def read_csv(path: str):
+    with open(path, newline="") as f:
+        for _ in csv.reader(f):
+            pass
+
+
+def run(rows: int, days: int):
+    with tempfile.TemporaryDirectory() as data_dir:
+        sqlitedb.DATA_DIR = export.DATA_DIR = data_dir
+        with SqliteDB.session() as db:
+            for day in range(days):
+                db.save(synthetic_stocks(rows, timestamp=1686340993 + day * DAY))
+
+        csv_path = os.path.join(data_dir, "data.csv")
+        parquet_path = os.path.join(data_dir, "parquet")
+        export_times = {
+            "csv": timed(lambda: export.CsvExport(source="sqlite")),
+            "parquet": timed(lambda: export.ParquetExport(source="sqlite")),
+        }
+        day = sorted(os.listdir(parquet_path))[-1].split("=")[1]
+
+        reads = {
+            "csv all rows": (csv_path, lambda: read_csv(csv_path)),
+            "parquet all rows": (parquet_path, lambda: pq.read_table(parquet_path)),
+            "parquet 2 cols 1 day": (
+                parquet_path,
+                lambda: pq.read_table(
+                    parquet_path,
+                    columns=["symbol", "price"],
+                    filters=[("date", "=", day)],
+                ),
+            ),
+        }
+        logger.info(f":: {rows * days} rows, {days} days")
+        for name, elapsed in export_times.items():
+            logger.info(f":: export {name:<8} {elapsed:8.3f}s")
+        for name, (path, read) in reads.items():
+            logger.info(
+                f":: {name:<22} {size(path) / 1024:10.0f} KiB {timed(read):8.3f}s"
+            )
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    run(rows, days)
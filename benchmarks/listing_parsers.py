@@ -0,0 +1,44 @@
+"""
+Compares the slickcharts table parsers on the saved index pages.
+- lxml with xpath against BeautifulSoup's html.parser, the fallback.
+- Checks both return the same symbols and names, in the same order.
+
+python -m benchmarks.listing_parsers [repeats]
+"""
+import os
+import sys
+import time
+
+from src import logger
+from src.listings.slick_charts import parse_table_lxml, parse_table_soup
+
+FIXTURES = os.path.join("tests", "fixtures", "slickcharts")
+PAGES = ["sp500", "nasdaq100", "dowjones"]
+
+
+def timed(func, html: str, repeats: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeats):
+        func(html)
+    return (time.perf_counter() - started) / repeats
+
+
+def run(repeats: int):
+    for page in PAGES:
+        with open(os.path.join(FIXTURES, f"{page}.html"), encoding="utf-8") as f:
+            html = f.read()
+
+        lxml_rows, soup_rows = parse_table_lxml(html), parse_table_soup(html)
+        assert list(lxml_rows.items()) == list(soup_rows.items()), page
+
+        lxml_time = timed(parse_table_lxml, html, repeats)
+        soup_time = timed(parse_table_soup, html, repeats)
+        logger.info(
+            f":: {page:<10} {len(lxml_rows):4} rows "
+            f"lxml {lxml_time * 1000:7.2f}ms soup {soup_time * 1000:7.2f}ms "
+            f"{soup_time / lxml_time:5.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
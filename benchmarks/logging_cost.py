@@ -0,0 +1,81 @@
+"""
+Measures what logging costs per quote on the scraping hot path.
+- submit: submit_data adding a batch of valid quotes, one debug message each.
+- convert failed: YahooAPI.convert_data on quotes missing a field,
+  a warning and a lazily pformatted debug dump each.
+- lazy dump / eager dump: the debug dump alone, formatted only when debug is on
+  and formatted before the level check, as it used to be.
+- Each runs with no sink, then with the file sink at INFO and DEBUG,
+  enqueued to a background thread and written synchronously.
+- Reports the time per quote, logging included.
+
+python -m benchmarks.logging_cost [quotes]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from pprint import pformat
+
+from benchmarks.datastructures import synthetic_stocks, yahoo_response
+from src import file_sink, logger
+from src.scrapers import YahooAPI
+from src.scrapers.main import submit_data
+from src.types import Result
+
+
+def timed(func) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+def run(quotes: int):
+    api = YahooAPI()
+    stocks = synthetic_stocks(quotes)
+    symbol_data = {stock.symbol: stock for stock in stocks}
+    body = json.loads(yahoo_response(stocks, formatted=False))
+    broken = body["quoteResponse"]["result"]
+    for quote in broken:
+        del quote["regularMarketOpen"]
+
+    scenarios = {
+        "submit": lambda: submit_data(api, symbol_data, Result({}, {}), 0),
+        "convert failed": lambda: [api.convert_data(q, q["symbol"]) for q in broken],
+        "lazy dump": lambda: [
+            logger.opt(lazy=True).debug("{}", lambda: pformat(q)) for q in broken
+        ],
+        "eager dump": lambda: [logger.debug(pformat(q)) for q in broken],
+    }
+    sinks = {
+        "no sink": None,
+        "INFO enqueued": "INFO",
+        "DEBUG enqueued": "DEBUG",
+        "DEBUG sync": "DEBUG",
+    }
+
+    results = []
+    with tempfile.TemporaryDirectory() as log_dir:
+        logger.remove()
+        for sink_name, level in sinks.items():
+            for name, func in scenarios.items():
+                handler = None
+                if level is not None:
+                    sink = dict(file_sink(level), sink=os.path.join(log_dir, "b.log"))
+                    sink["enqueue"] = sink_name.endswith("enqueued")
+                    handler = logger.add(**sink)
+                cost = timed(func) / quotes
+                if handler is not None:
+                    # waits for the enqueued messages to be written
+                    logger.remove(handler)
+                results.append(f":: {sink_name:<15} {name:<15} {cost * 1e6:8.2f}us")
+
+    logger.add(sys.stderr)
+    logger.info(f":: Logging cost per quote, {quotes} quotes")
+    for result in results:
+        logger.info(result)
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5_000)
@@ -0,0 +1,58 @@
+"""
+Compares PostgresDB save methods: copy, values and executemany.
+- Needs a postgres server configured by the POSTGRES_* variables in .env,
+  use a local one, executemany over a remote link takes very long.
+- Runs inside a throwaway `benchmark` schema, stockinfo data is not touched.
+
+python -m benchmarks.postgres_save [rows ...]
+"""
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from benchmarks.datastructures import synthetic_stocks
+from src import logger
+from src.databases import PostgresDB
+
+SCHEMA = "benchmark"
+
+
+class BenchmarkPostgresDB(PostgresDB):
+    def initdb(self):
+        self.cur.execute(f"CREATE SCHEMA IF NOT EXISTS {SCHEMA}")
+        self.cur.execute(f"SET search_path TO {SCHEMA}")
+        super().initdb()
+
+    def clear(self):
+        self.cur.execute("TRUNCATE stockinfo")
+        self.conn.commit()
+
+    def drop(self):
+        self.cur.execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        self.conn.commit()
+
+
+def run(sizes):
+    db = BenchmarkPostgresDB()
+    try:
+        for size in sizes:
+            data = synthetic_stocks(size)
+            for method in ("copy", "values", "executemany"):
+                db.clear()
+                started = time.perf_counter()
+                db.save(data, method=method)
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    f":: {size:>7} rows {method:<12} {elapsed:8.3f}s "
+                    f"{size / elapsed:10.0f} rows/s"
+                )
+    finally:
+        db.drop()
+        db.close()
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000]
+    run(sizes)
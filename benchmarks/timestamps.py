@@ -0,0 +1,92 @@
+"""
+Compares the shared timestamp normalization with the per quote parsing it replaced.
+- The old implementations are kept here as the reference.
+- Both must return the same epochs on the fixture corpus, including
+  daylight saving transitions and strings that don't parse.
+- Times a run's worth of quotes, where stockanalysis dates mostly repeat.
+
+python -m benchmarks.timestamps [quotes]
+"""
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Optional
+
+import pytz
+
+from src import logger
+from src.utils.timestamps import epoch_seconds, parse_market_time
+
+CORPUS = os.path.join("tests", "fixtures", "timestamps.json")
+
+
+def legacy_yahoo_date(data) -> int:
+    exchange_timezone_name = data["exchangeTimezoneName"]
+    regular_market_time_raw = data["regularMarketTime"]
+    if isinstance(regular_market_time_raw, dict):
+        regular_market_time_raw = regular_market_time_raw["raw"]
+
+    exchange_timezone = pytz.timezone(exchange_timezone_name)
+    regular_market_time = datetime.fromtimestamp(regular_market_time_raw)
+    regular_market_time = regular_market_time.astimezone(exchange_timezone)
+    utc_timezone = pytz.timezone("UTC")
+    return int(regular_market_time.astimezone(utc_timezone).timestamp())
+
+
+def legacy_market_time(raw_date: str) -> Optional[int]:
+    pattern = r"([A-Za-z]{3} \d{1,2}, \d{4}, \d{1,2}:\d{2} [APM]{2})"
+    matches = re.findall(pattern, raw_date)
+    if not matches:
+        return None
+
+    date = datetime.strptime(matches[0], "%b %d, %Y, %I:%M %p")
+    exchange_timezone = pytz.timezone("America/New_York")
+    date = exchange_timezone.localize(date)
+    utc_timezone = pytz.timezone("UTC")
+    return int(date.astimezone(utc_timezone).timestamp())
+
+
+def timed(func, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        func(item)
+    return time.perf_counter() - started
+
+
+def run(quotes: int):
+    with open(CORPUS) as f:
+        corpus = json.load(f)
+
+    yahoo = [data for data, _ in corpus["yahoo"]]
+    market_times = [raw for raw, _ in corpus["stockanalysis"]]
+    for data, expected in corpus["yahoo"]:
+        assert (
+            legacy_yahoo_date(data)
+            == expected
+            == epoch_seconds(data["regularMarketTime"])
+        ), data
+    for raw, expected in corpus["stockanalysis"]:
+        assert legacy_market_time(raw) == expected == parse_market_time(raw), raw
+    logger.info(f":: Identical output on {len(yahoo) + len(market_times)} fixtures")
+
+    # a run's quotes: yahoo epochs all differ, stockanalysis dates repeat
+    yahoo_run = [yahoo[i % len(yahoo)] for i in range(quotes)]
+    market_run = [market_times[i % 5] for i in range(quotes)]
+    parse_market_time.cache_clear()
+    results = {
+        "yahoo before": timed(legacy_yahoo_date, yahoo_run),
+        "yahoo after": timed(
+            lambda data: epoch_seconds(data["regularMarketTime"]), yahoo_run
+        ),
+        "stockanalysis before": timed(legacy_market_time, market_run),
+        "stockanalysis after": timed(parse_market_time, market_run),
+    }
+    for name, elapsed in results.items():
+        logger.info(f":: {name:<21} {elapsed / quotes * 1e6:8.2f}us per quote")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000)
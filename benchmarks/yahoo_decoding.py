@@ -0,0 +1,67 @@
+"""
+Compares decoding yahoo quote responses, before and after the lean path.
+- formatted: numbers as {raw, fmt, longFmt} objects, what formatted=true returns.
+- raw: plain numbers, what formatted=false returns.
+- Each response body is decoded with the stdlib json and with orjson if installed,
+  then converted to StockInfo rows by YahooAPI.parse_response.
+- Reports bytes per symbol and decode time per batch.
+
+python -m benchmarks.yahoo_decoding [batch size] [batches]
+"""
+import sys
+import time
+
+import requests
+
+from benchmarks.datastructures import synthetic_stocks, yahoo_response
+from src import logger
+from src.scrapers import YahooAPI
+from src.utils import json_decode
+
+
+def response(content: bytes) -> requests.Response:
+    response = requests.Response()
+    response.status_code = 200
+    response._content = content
+    return response
+
+
+def run(batch_size: int, batches: int):
+    api = YahooAPI()
+    api.cookie_cred = {"cookie": {}, "crumb": ""}
+    stocks = synthetic_stocks(batch_size * batches)
+    installed = json_decode.orjson
+    decoders = {"json": None}
+    if installed is not None:
+        decoders["orjson"] = installed
+
+    for formatted in (True, False):
+        bodies = [
+            yahoo_response(stocks[i : i + batch_size], formatted)
+            for i in range(0, len(stocks), batch_size)
+        ]
+        symbols = [
+            [stock.symbol for stock in stocks[i : i + batch_size]]
+            for i in range(0, len(stocks), batch_size)
+        ]
+        size = sum(len(body) for body in bodies) / len(stocks)
+        mode = "formatted" if formatted else "raw"
+
+        for decoder, module in decoders.items():
+            json_decode.orjson = module
+            started = time.perf_counter()
+            for body, batch in zip(bodies, symbols):
+                rows = api.parse_response(response(body), batch)
+                assert all(rows)
+            elapsed = (time.perf_counter() - started) / batches
+            logger.info(
+                f":: {mode:<9} {decoder:<6} {size:6.0f} bytes/symbol "
+                f"{elapsed * 1000:7.3f}ms per batch of {batch_size}"
+            )
+    json_decode.orjson = installed
+
+
+if __name__ == "__main__":
+    batch_size = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    batches = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    run(batch_size, batches)
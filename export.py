@@ -1,50 +1,334 @@
 """
-Connects to postgresql db and export the data in csv format
+Connects to postgresql or the local sqlite db and export the data in csv or parquet format
+- Rows are streamed straight to the file, memory use does not grow with the table.
+- postgres: COPY (SELECT ...) TO STDOUT, the server formats the csv.
+  Parquet export reads through a named server side cursor.
+- sqlite: Rows are read and written chunk_size at a time.
+- Parquet: Typed columns, one directory per trading date (date=YYYY-MM-DD),
+  so readers load only the columns and dates they need. Needs pyarrow.
+  Only the files of the dates being streamed are open at a time.
+- A full csv export is written to a temporary file first, and replaces
+  the previous artifact only once it succeeds.
+- Incremental: The last exported id is kept in export_state.json as a watermark,
+  only newer rows are appended, to the csv or as new parquet files.
+  A failed append is truncated off the csv, so a retry doesn't duplicate rows.
+  Every compact_every incremental runs, a full export rewrites the artifact.
+
+python export.py [--sqlite] [--parquet] [--incremental]
 """
+import abc
 import csv
 import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from dotenv import load_dotenv
 
 from src import logger
-from src.databases import DATA_DIR, PostgresDB, ensure_dir
+from src.databases import DATA_DIR, PostgresDB, SqliteDB, ensure_dir
+from src.databases.postgresdb import COLUMNS
+from src.utils.state import load_state, save_state
+from src.utils.timestamps import timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+SOURCES = {"postgres": PostgresDB, "sqlite": SqliteDB}
+EXCHANGE_TIMEZONE = timezone()
 
 
-class CsvExport:
-    def __init__(self):
-        self.db = PostgresDB()
-        self.csvpath = os.path.join(DATA_DIR, "data.csv")
+class Export(abc.ABC):
+    """Source database, watermark and compaction, shared by the exporters"""
+
+    name = ""
+
+    def __init__(
+        self, source="postgres", chunk_size=10000, incremental=False, compact_every=28
+    ):
+        """
+        source: postgres or sqlite
+        chunk_size: Rows held in memory at once
+        incremental: Append only the rows added since the last export
+        compact_every: Incremental exports after which a full export rewrites the artifact
+        """
+        if source not in SOURCES:
+            raise ValueError(f":: {self.__class__.__name__}: Unknown source {source}")
+        self.source = source
+        self.chunk_size = chunk_size
+        self.incremental = incremental
+        self.compact_every = compact_every
+        self.db = SOURCES[source]()
+        self.statepath = os.path.join(DATA_DIR, "export_state.json")
         ensure_dir(DATA_DIR)
         self.init_export()
 
+    @property
+    @abc.abstractmethod
+    def path(self) -> str:
+        """Where the artifact is written"""
+
     def init_export(self) -> None:
         try:
-            self.export()
+            self.run()
         except Exception as e:
-            logger.exception(f":: CsvExport: Failed to export data to csv {e}")
+            logger.exception(f":: {self.__class__.__name__}: Failed to export {e}")
         finally:
             self.close()
 
-    def export(self):
-        column_query = "SELECT column_name FROM information_schema.columns WHERE table_name = 'stockinfo'"
-        columns = self.db.fetch(column_query)
-        columns = [i[0] for i in columns]
+    def run(self):
+        states = load_state(self.statepath, {})
+        state = states.get(self.name)
+        # rows committed after this are left for the next export
+        upto = self.max_id()
+        full = not self.incremental or not self.resumable(state, upto)
+        after = 0 if full else state["last_id"]
 
-        query = f"SELECT * FROM stockinfo"
-        data = self.db.fetch(query)
+        rows = self.export(after, upto, full)
+        states[self.name] = {
+            "source": self.source,
+            "last_id": upto,
+            "since_compaction": 0 if full else state["since_compaction"] + 1,
+        }
+        save_state(self.statepath, states)
+        kind = "full" if full else f"incremental after id {after}"
+        logger.info(f":: {self.__class__.__name__}: Exported {rows} rows, {kind}.")
 
-        with open(self.csvpath, "w") as f:
-            csv_writer = csv.writer(f)
-            # write headers
-            csv_writer.writerow(columns)
-            # write data
-            csv_writer.writerows(data)
-        logger.info(f":: CsvExport: Exported {len(data)} rows.")
+    def resumable(self, state: Optional[Dict], upto: int) -> bool:
+        """Whether the last export can be appended to, instead of rewritten"""
+        return (
+            state is not None
+            and state["source"] == self.source
+            and state["last_id"] <= upto
+            and state["since_compaction"] < self.compact_every
+            and os.path.exists(self.path)
+        )
+
+    def max_id(self) -> int:
+        cursor = self.db.conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM stockinfo")
+        (max_id,) = cursor.fetchone()
+        cursor.close()
+        return max_id
+
+    @abc.abstractmethod
+    def export(self, after: int, upto: int, full: bool) -> int:
+        """Writes rows with after < id <= upto, returns the number of rows"""
+
+    def range_query(self, columns: str) -> str:
+        """Query for rows with after < id <= upto, taking (after, upto) as params"""
+        mark = "%s" if self.source == "postgres" else "?"
+        return (
+            f"SELECT {columns} FROM stockinfo "
+            f"WHERE id > {mark} AND id <= {mark} ORDER BY id"
+        )
 
     def close(self):
         self.db.close()
 
 
+class CsvExport(Export):
+    name = "csv"
+
+    @property
+    def path(self) -> str:
+        return os.path.join(DATA_DIR, "data.csv")
+
+    def export(self, after: int, upto: int, full: bool) -> int:
+        if not full:
+            with open(self.path, "a", newline="") as f:
+                size = f.tell()
+                try:
+                    return self.write(f, after, upto, header=False)
+                except Exception:
+                    # the watermark is not saved, the next run appends these rows again
+                    f.truncate(size)
+                    raise
+
+        # a failed export leaves the previous artifact in place
+        fd, tmp_path = tempfile.mkstemp(suffix=".csv", dir=DATA_DIR)
+        try:
+            with open(fd, "w", newline="") as f:
+                rows = self.write(f, after, upto, header=True)
+            os.replace(tmp_path, self.path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return rows
+
+    def write(self, f, after: int, upto: int, header: bool) -> int:
+        query, params = self.range_query("*"), (after, upto)
+        if self.source == "postgres":
+            return self.export_postgres(f, query, params, header=header)
+        return self.export_sqlite(f, query, params, header=header)
+
+    def export_postgres(self, f, query: str, params: Tuple, header: bool) -> int:
+        options = "FORMAT csv, HEADER" if header else "FORMAT csv"
+        # COPY takes no bind parameters, the driver quotes them into the query
+        query = self.db.cur.mogrify(query, params).decode()
+        self.db.cur.copy_expert(f"COPY ({query}) TO STDOUT WITH ({options})", f)
+        return self.db.cur.rowcount
+
+    def export_sqlite(self, f, query: str, params: Tuple, header: bool) -> int:
+        cursor = self.db.conn.execute(query, params)
+        csv_writer = csv.writer(f)
+        if header:
+            csv_writer.writerow([column[0] for column in cursor.description])
+
+        rows = 0
+        while chunk := cursor.fetchmany(self.chunk_size):
+            csv_writer.writerows(chunk)
+            rows += len(chunk)
+        return rows
+
+
+class ParquetExport(Export):
+    name = "parquet"
+
+    def __init__(self, *args, **kwargs):
+        if pa is None:
+            raise ImportError(
+                ":: ParquetExport: pyarrow is needed, pip install pyarrow"
+            )
+        super().__init__(*args, **kwargs)
+
+    @property
+    def path(self) -> str:
+        return os.path.join(DATA_DIR, "parquet")
+
+    def export(self, after: int, upto: int, full: bool) -> int:
+        if full:
+            # partitions of a previous export may be stale
+            shutil.rmtree(self.path, ignore_errors=True)
+
+        # incremental exports add a file to each date, named after the watermark
+        writers = DateWriters(self.path, f"part-{after}", self.chunk_size)
+        rows = 0
+        try:
+            for chunk in self.read_chunks(after, upto):
+                writers.write(self.partition(chunk))
+                rows += len(chunk)
+        finally:
+            writers.close()
+        return rows
+
+    def read_chunks(self, after: int, upto: int) -> Iterator[List[Tuple]]:
+        if self.source == "postgres":
+            # named cursors are server side, rows arrive as they are fetched
+            cursor = self.db.conn.cursor(name="parquet_export")
+            cursor.itersize = self.chunk_size
+        else:
+            cursor = self.db.conn.cursor()
+
+        cursor.execute(self.range_query(", ".join(COLUMNS)), (after, upto))
+        while chunk := cursor.fetchmany(self.chunk_size):
+            yield chunk
+        cursor.close()
+
+    @staticmethod
+    def partition(chunk: List[Tuple]) -> Dict[str, "pa.Table"]:
+        """Groups rows into one table per trading date"""
+        dates: Dict[str, List[Tuple]] = {}
+        timestamp = COLUMNS.index("timestamp")
+        for row in chunk:
+            dates.setdefault(trading_date(row[timestamp]), []).append(row)
+
+        return {
+            date: pa.Table.from_arrays(
+                [pa.array(column) for column in zip(*rows)], schema=schema()
+            )
+            for date, rows in dates.items()
+        }
+
+
+class DateWriters:
+    """
+    Parquet files of the dates being exported, rows are buffered into row groups.
+    Rows come ordered by id, so roughly by date, once the stream has moved past
+    a date its file is closed. A date seen again gets another file.
+    """
+
+    def __init__(self, root: str, prefix: str, row_group_size: int) -> None:
+        self.root = root
+        self.prefix = prefix
+        self.row_group_size = row_group_size
+        self.writers: Dict[str, "pq.ParquetWriter"] = {}
+        # tables waiting to be written, per open date
+        self.buffers: Dict[str, List["pa.Table"]] = {}
+        # files written per date
+        self.parts: Dict[str, int] = {}
+
+    def write(self, tables: Dict[str, "pa.Table"]) -> None:
+        for date, table in tables.items():
+            buffer = self.buffers.setdefault(date, [])
+            buffer.append(table)
+            if sum(len(t) for t in buffer) >= self.row_group_size:
+                self.flush(date)
+
+        earliest = min(tables, default=None)
+        for date in [d for d in self.buffers if earliest and d < earliest]:
+            self.close_date(date)
+
+    def flush(self, date: str) -> None:
+        tables = self.buffers.get(date)
+        if not tables:
+            return
+        if date not in self.writers:
+            self.writers[date] = self.open(date)
+        self.writers[date].write_table(pa.concat_tables(tables))
+        self.buffers[date] = []
+
+    def open(self, date: str) -> "pq.ParquetWriter":
+        path = os.path.join(self.root, f"date={date}")
+        ensure_dir(path)
+        part = self.parts.get(date, 0)
+        self.parts[date] = part + 1
+        name = f"{self.prefix}.parquet" if not part else f"{self.prefix}-{part}.parquet"
+        return pq.ParquetWriter(os.path.join(path, name), schema())
+
+    def close_date(self, date: str) -> None:
+        self.flush(date)
+        self.buffers.pop(date, None)
+        writer = self.writers.pop(date, None)
+        if writer is not None:
+            writer.close()
+
+    def close(self) -> None:
+        for date in list(self.buffers):
+            self.close_date(date)
+
+
+@lru_cache
+def schema() -> "pa.Schema":
+    """Columns typed as in StockInfo"""
+    return pa.schema(
+        [
+            ("name", pa.string()),
+            ("symbol", pa.string()),
+            ("marketcap", pa.int64()),
+            ("price", pa.float64()),
+            ("volume", pa.int64()),
+            ("highprice", pa.float64()),
+            ("lowprice", pa.float64()),
+            ("open", pa.float64()),
+            ("prevclose", pa.float64()),
+            ("timestamp", pa.int64()),
+        ]
+    )
+
+
+@lru_cache(maxsize=4096)
+def trading_date(timestamp: int) -> str:
+    """Date of a utc timestamp on the exchange's calendar"""
+    return datetime.fromtimestamp(timestamp, EXCHANGE_TIMEZONE).strftime("%Y-%m-%d")
+
+
 if __name__ == "__main__":
     load_dotenv()
 
@@ -52,5 +336,11 @@ if __name__ == "__main__":
 
     init_logger()
 
-    CsvExport()
-    logger.info(f":: CSV File exported to {os.path.abspath(DATA_DIR)}/data.csv")
+    source = "sqlite" if "--sqlite" in sys.argv else "postgres"
+    incremental = "--incremental" in sys.argv
+    if "--parquet" in sys.argv:
+        ParquetExport(source=source, incremental=incremental)
+        logger.info(f":: Parquet files exported to {os.path.abspath(DATA_DIR)}/parquet")
+    else:
+        CsvExport(source=source, incremental=incremental)
+        logger.info(f":: CSV File exported to {os.path.abspath(DATA_DIR)}/data.csv")
@@ -1,68 +1,144 @@
+import os
 import sys
+import threading
 from pprint import pformat
-from typing import Deque, List
+from typing import Iterable, List
 
 from dotenv import load_dotenv
 
 from src import logger
-from src.databases import DBType, PostgresDB, SqliteDB
+from src.databases import DATA_DIR, DBType, PostgresDB, SqliteDB, StreamWriter
 from src.listings import listings_map
-from src.runners import executor, parallel_executor
-from src.scrapers import ScraperType, StockAnalysisAPI, YahooAPI, scraper_instance
-
-
-def main(symbols: Deque[str]):
+from src.runners import Scheduler, async_executor, executor, parallel_executor
+from src.scrapers import (
+    AsyncStockAnalysisAPI,
+    AsyncYahooAPI,
+    ScraperType,
+    StockAnalysisAPI,
+    YahooAPI,
+    async_scraper_instance,
+    scraper_instance,
+)
+from src.utils.circuit_breaker import circuit_breakers
+from src.utils.rate_limiter import load_rates, save_rates
+
+# Request rates learned by the scrapers, the next run starts from them
+RATES_PATH = os.path.join(DATA_DIR, "rates.json")
+
+
+def main(pages: Iterable[List[str]], use_async=False):
     """
-    Takes in a Deque of symbols to scrape, distributes them to scrapers.
-    Runs scraping tasks in parallel. Saves scraped data to databases.
+    Takes in pages of symbols to scrape, distributes them to scrapers.
+    Scraping starts with the first page while later pages are still being fetched.
+    Runs scraping tasks in parallel. Streams scraped data to databases.
+    use_async: Use the asyncio engine instead of the thread pool
     """
     dbs: List[DBType] = [
         PostgresDB,
         SqliteDB,
     ]
-    scrapers: List[ScraperType] = [
-        YahooAPI(batch_size=50, rate_limit=1.0),
-        YahooAPI(batch_size=30, use_proxy=True, rate_limit=1.0),
-        StockAnalysisAPI(batch_size=1, rate_limit=0.3),
-        StockAnalysisAPI(batch_size=1, use_proxy=True, rate_limit=0.5),
-    ]
-    symbol_access_funcs = [
-        symbols.pop,
-        symbols.popleft,
-        symbols.popleft,
-        symbols.pop,
-    ]
-
-    all_data, failures = parallel_executor(
-        scraper_instance, scrapers, symbol_access_funcs, symbols
-    )
-
-    logger.info(f":: Scraped {len(all_data)} stocks data.")
+    load_rates(RATES_PATH)
+    if use_async:
+        scrapers: List[ScraperType] = [
+            AsyncYahooAPI(
+                batch_size=50, rate_limit=1.0, adaptive_batch=True, adaptive_rate=True
+            ),
+            AsyncYahooAPI(
+                batch_size=30,
+                use_proxy=True,
+                rate_limit=1.0,
+                adaptive_batch=True,
+                proxy_lanes=3,
+            ),
+            AsyncStockAnalysisAPI(
+                batch_size=1, rate_limit=0.3, concurrency=8, adaptive_rate=True
+            ),
+            AsyncStockAnalysisAPI(
+                batch_size=1, use_proxy=True, rate_limit=0.5, proxy_lanes=3
+            ),
+        ]
+        engine, instance_func = async_executor, async_scraper_instance
+    else:
+        scrapers = [
+            YahooAPI(
+                batch_size=50, rate_limit=1.0, adaptive_batch=True, adaptive_rate=True
+            ),
+            YahooAPI(
+                batch_size=30,
+                use_proxy=True,
+                rate_limit=1.0,
+                adaptive_batch=True,
+                proxy_lanes=3,
+            ),
+            StockAnalysisAPI(batch_size=1, rate_limit=0.3, adaptive_rate=True),
+            StockAnalysisAPI(
+                batch_size=1, use_proxy=True, rate_limit=0.5, proxy_lanes=3
+            ),
+        ]
+        engine, instance_func = parallel_executor, scraper_instance
+    # Batches are handed out by measured throughput, idle scrapers steal from slow ones
+    scheduler = Scheduler(streaming=True)
+    symbol_access_funcs = [scheduler.worker(name=str(s)).pop for s in scrapers]
+    feeder = threading.Thread(target=feed, args=(scheduler, pages), daemon=True)
+    feeder.start()
+
+    # Scraped stocks are saved in micro batches while scraping continues
+    # with a sink the engine keeps no stocks, only the symbols scraped
+    with StreamWriter(dbs) as writer:
+        _, failures = engine(
+            instance_func,
+            scrapers,
+            symbol_access_funcs,
+            scheduler.symbols,
+            sink=writer.put,
+        )
+
+    for scraper in scrapers:
+        if isinstance(scraper, YahooAPI):
+            stats = scraper.retry_stats
+            logger.info(
+                f":: {scraper}: Retries took {stats['requests']} requests, "
+                f"saved {stats['saved']} over one by one retries"
+            )
+    for breaker in circuit_breakers.values():
+        if breaker.retries or breaker.trips:
+            logger.info(f":: Backoff: {breaker}")
+    save_rates(RATES_PATH)
+
+    logger.info(f":: Scraped {writer.saved} stocks data.")
     logger.info(f":: Failed stocks {len(failures)}: {pformat(failures)}")
 
-    if not all_data:
-        logger.error(":: No data scraped. Exiting.")
+    if not writer.saved:
+        logger.error(":: No data scraped.")
         return
 
-    for db_class in dbs:
-        try:
-            with db_class.session() as db:
-                db.save(all_data)
-        except Exception as e:
-            logger.error(f":: Failed to connect to {db_class.__name__}: {e}")
-
     logger.info(f":: Saving to databases complete!")
 
 
+def feed(scheduler: Scheduler, pages: Iterable[List[str]]):
+    """Feeds pages of symbols to the scheduler as the listing fetcher yields them"""
+    try:
+        for page in pages:
+            scheduler.feed(page)
+            logger.debug(f":: Listing: {len(scheduler.symbols)} symbols so far")
+    except Exception as e:
+        logger.exception(f":: Failed getting listings: {e}")
+    finally:
+        scheduler.close()
+    logger.info(f":: Fetching {len(scheduler.symbols)} stocks")
+
+
 if __name__ == "__main__":
     load_dotenv()
     from src import init_logger
 
     args = sys.argv
 
-    # Parse verbosity and help flags
+    # Parse verbosity, help and engine flags
     verbose = "-v" in args or "--verbose" in args
     help = "-h" in args or "--help" in args
+    use_async = "--async" in args
+    refresh = "--refresh" in args
     init_logger(verbose=verbose)
 
     # Pase stock listing
@@ -72,15 +148,11 @@ if __name__ == "__main__":
 
     # Help information
     if symbols_fetcher is None or help:
-        logger.info(f":: Usage: {', '.join(list(listings_map.keys()))}")
+        logger.info(
+            f":: Usage: {', '.join(list(listings_map.keys()))} [-v] [--async] [--refresh]"
+        )
         sys.exit(1)
 
-    # Try to scrape listings from fetcher
-    try:
-        symbols = symbols_fetcher.get_data()
-    except Exception as e:
-        logger.exception(f":: Failed getting listings for {listing_arg} {e}")
-        sys.exit(0)
-
-    logger.info(f":: Fetching {len(symbols)} stocks from {listing_arg}")
-    main(symbols)
+    # Listings are scraped as they are fetched
+    logger.info(f":: Fetching stocks from {listing_arg}")
+    main(symbols_fetcher.stream(refresh=refresh), use_async=use_async)
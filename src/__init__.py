@@ -2,13 +2,30 @@ import sys
 
 from loguru import logger
 
+LOG_FILE = "file.log"
+
+
+def file_sink(level: str) -> dict:
+    """
+    Log file written by a background thread, so scraper threads only enqueue.
+    Rotated at 20 MB, old files are compressed and the last 5 kept.
+    """
+    return {
+        "sink": LOG_FILE,
+        "level": level,
+        "enqueue": True,
+        "rotation": "20 MB",
+        "retention": 5,
+        "compression": "gz",
+    }
+
 
 def init_logger(verbose=False):
-    """Initialize logger"""
+    """Initialize logger, debug messages are only logged when verbose"""
     verbose_config = {
         "handlers": [
             {"sink": sys.stdout},
-            {"sink": "file.log"},
+            file_sink("DEBUG"),
         ],
     }
     default_config = {
@@ -18,7 +35,7 @@ def init_logger(verbose=False):
                 "level": "INFO",
                 "format": "{time:h:mm:ss:A} {level} {message}",
             },
-            {"sink": "file.log"},
+            file_sink("INFO"),
         ]
     }
     config = default_config if not verbose else verbose_config
@@ -18,15 +18,20 @@ def ensure_dir(path):
         os.makedirs(path)
 
 
-from src.databases.listing_cache import ListingCache
+from src.databases.listing_cache import ListingCache, NameIndex
+
+# Shared by all scrapers in this process
+name_index = NameIndex()
 
 
 def cache_listings(symbols: Dict[str, str]):
+    name_index.update(symbols)
     with ListingCache.session() as db:
         db.save(symbols)
 
 
 from src.databases.postgresdb import PostgresDB
 from src.databases.sqlitedb import SqliteDB
+from src.databases.writer import StreamWriter
 
 DBType = Type[PostgresDB] | Type[SqliteDB]
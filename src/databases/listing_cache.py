@@ -1,13 +1,22 @@
 """
 A sqlite db to keep record of fullnames of stocks with their symbols
+- NameIndex keeps the same records in memory for the scrapers,
+  loaded once per process instead of querying the db per stock.
+- The latest snapshot of each listing is kept with its fetch time and http validators,
+  so a fresh one can be reused instead of fetched.
+- Symbols added and removed between snapshots are recorded as listing changes.
 """
+import json
 import os
 import sqlite3
+import threading
+import time
 from contextlib import contextmanager
-from typing import Dict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from src import logger
 from src.databases import DATA_DIR, ensure_dir
+from src.types import ListingSnapshot
 
 
 class ListingCache:
@@ -27,6 +36,27 @@ class ListingCache:
             )
         """
         )
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS snapshots (
+                listing TEXT PRIMARY KEY NOT NULL,
+                symbols TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                etag TEXT,
+                last_modified TEXT
+            )
+        """
+        )
+        self.cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS listing_changes (
+                listing TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                change TEXT NOT NULL CHECK (change IN ('added', 'removed')),
+                changed_at REAL NOT NULL
+            )
+        """
+        )
         self.conn.commit()
 
     def get_name(self, symbol: str):
@@ -37,10 +67,30 @@ class ListingCache:
             """
             SELECT name FROM stocklist WHERE symbol = ?
         """,
-            symbol,
+            (symbol,),
         )
         return self.cursor.fetchone()
 
+    def get_names(self, symbols: List[str], chunk_size=500) -> Dict[str, str]:
+        """
+        Get names of many stocks at once, in chunks of IN (...) lookups
+        """
+        names = {}
+        for i in range(0, len(symbols), chunk_size):
+            chunk = symbols[i : i + chunk_size]
+            placeholders = ", ".join("?" * len(chunk))
+            self.cursor.execute(
+                f"SELECT symbol, name FROM stocklist WHERE symbol IN ({placeholders})",
+                chunk,
+            )
+            names.update(self.cursor.fetchall())
+        return names
+
+    def get_all(self) -> Dict[str, str]:
+        """Get all symbol and name pairs"""
+        self.cursor.execute("SELECT symbol, name FROM stocklist")
+        return dict(self.cursor.fetchall())
+
     def save(self, data: Dict[str, str]):
         """
         Take a dictionary of symbol and name and update the database
@@ -59,6 +109,80 @@ class ListingCache:
         logger.debug(f":: ListDB: Saved {len(data)} stocks to cache.")
         return self
 
+    def get_snapshot(self, listing: str) -> Optional[ListingSnapshot]:
+        self.cursor.execute(
+            """
+            SELECT symbols, fetched_at, etag, last_modified
+            FROM snapshots WHERE listing = ?
+        """,
+            (listing,),
+        )
+        row = self.cursor.fetchone()
+        if row is None:
+            return None
+        symbols, fetched_at, etag, last_modified = row
+        return ListingSnapshot(json.loads(symbols), fetched_at, etag, last_modified)
+
+    def save_snapshot(
+        self, listing: str, snapshot: ListingSnapshot
+    ) -> Tuple[List[str], List[str]]:
+        """
+        Replace the listing's snapshot, recording the changes from the previous one
+        Returns added and removed symbols, none for a first snapshot
+        """
+        previous = self.get_snapshot(listing)
+        added, removed = [], []
+        if previous is not None:
+            added = [s for s in snapshot.symbols if s not in previous.symbols]
+            removed = [s for s in previous.symbols if s not in snapshot.symbols]
+
+        with self.conn:
+            self.cursor.executemany(
+                """
+                INSERT INTO listing_changes (listing, symbol, change, changed_at)
+                VALUES (?, ?, ?, ?)
+            """,
+                [(listing, s, "added", snapshot.fetched_at) for s in added]
+                + [(listing, s, "removed", snapshot.fetched_at) for s in removed],
+            )
+            self.cursor.execute(
+                """
+                INSERT OR REPLACE INTO snapshots (
+                    listing, symbols, fetched_at, etag, last_modified
+                ) VALUES (?, ?, ?, ?, ?)
+            """,
+                (
+                    listing,
+                    json.dumps(snapshot.symbols),
+                    snapshot.fetched_at,
+                    snapshot.etag,
+                    snapshot.last_modified,
+                ),
+            )
+        return added, removed
+
+    def touch_snapshot(self, listing: str, fetched_at: Optional[float] = None):
+        """Mark a snapshot as fetched again, eg. when the server says not modified"""
+        with self.conn:
+            self.cursor.execute(
+                "UPDATE snapshots SET fetched_at = ? WHERE listing = ?",
+                (fetched_at or time.time(), listing),
+            )
+
+    def get_changes(self, listing: str, since: float = 0.0) -> Dict[str, List[str]]:
+        """Symbols added and removed from the listing since a time"""
+        self.cursor.execute(
+            """
+            SELECT symbol, change FROM listing_changes
+            WHERE listing = ? AND changed_at > ? ORDER BY rowid
+        """,
+            (listing, since),
+        )
+        changes: Dict[str, List[str]] = {"added": [], "removed": []}
+        for symbol, change in self.cursor.fetchall():
+            changes[change].append(symbol)
+        return changes
+
     def close(self):
         self.conn.close()
 
@@ -73,3 +197,53 @@ class ListingCache:
             logger.exception(e)
         finally:
             db.close()
+
+
+class NameIndex:
+    """
+    Process wide symbol to name lookup, shared by all scraper threads.
+    - The whole listing cache is loaded on first use.
+    - Misses are looked up in one IN (...) query per batch and remembered,
+      so a symbol costs at most one db lookup per process.
+    """
+
+    def __init__(self):
+        self.names: Dict[str, str] = {}
+        self.missing: Set[str] = set()
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def get(self, symbol: str) -> Optional[str]:
+        name = self.names.get(symbol)
+        if name is None:
+            name = self.lookup([symbol]).get(symbol)
+        return name
+
+    def lookup(self, symbols: Iterable[str]) -> Dict[str, str]:
+        """Get names of symbols, querying the listing cache only for unseen ones"""
+        with self.lock:
+            if not self.loaded:
+                self.load()
+
+            unseen = [
+                s for s in symbols if s not in self.names and s not in self.missing
+            ]
+            if unseen:
+                found = {}
+                with ListingCache.session() as db:
+                    found = db.get_names(unseen)
+                self.names.update(found)
+                self.missing.update(s for s in unseen if s not in found)
+
+            return {s: self.names[s] for s in symbols if s in self.names}
+
+    def update(self, data: Dict[str, str]) -> None:
+        with self.lock:
+            self.names.update(data)
+            self.missing.difference_update(data)
+
+    def load(self) -> None:
+        with ListingCache.session() as db:
+            self.names.update(db.get_all())
+        self.loaded = True
+        logger.debug(f":: NameIndex: Loaded {len(self.names)} names.")
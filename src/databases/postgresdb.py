@@ -1,15 +1,49 @@
+"""
+POSTGRESQL DATABASE
+- Rows are saved in bulk, by one of the save methods:
+- copy: Streams rows as csv through COPY FROM STDIN, one round trip per save.
+  Falls back to values if COPY fails.
+- values: Multi row INSERT ... VALUES pages via execute_values.
+- executemany: One INSERT per row, a round trip each.
+- A stock is stored once per (symbol, timestamp), saving it again is skipped.
+  COPY loads into a temporary staging table, then inserts from it skipping conflicts.
+"""
+import csv
+import io
 import os
 from contextlib import contextmanager
-from typing import List
+from typing import List, Tuple
 
 import psycopg2
+import psycopg2.extras
 
 from src import logger
-from src.types import StockInfo
+from src.types import SaveResult, StockInfo
+
+COLUMNS = (
+    "name",
+    "symbol",
+    "marketcap",
+    "price",
+    "volume",
+    "highprice",
+    "lowprice",
+    "open",
+    "prevclose",
+    "timestamp",
+)
+
+UNIQUE_INDEX = "stockinfo_symbol_timestamp"
 
 
 class PostgresDB:
-    def __init__(self):
+    def __init__(self, save_method="copy", page_size=1000):
+        """
+        save_method: copy, values or executemany
+        page_size: Rows per INSERT statement for the values method
+        """
+        self.save_method = save_method
+        self.page_size = page_size
         self.conn = psycopg2.connect(
             host=os.getenv("POSTGRES_HOST"),
             port=os.getenv("POSTGRES_PORT"),
@@ -39,43 +73,135 @@ class PostgresDB:
         """
         )
         self.conn.commit()
+        self.migrate()
 
-    def save(self, data: List[StockInfo]):
-        """Save data of multiple stocks in bulk"""
-        self.cur.executemany(
+    def migrate(self):
+        """
+        Removes duplicate rows of a symbol and timestamp, keeping the first saved,
+        then adds the unique index that keeps them out
+        """
+        self.cur.execute(
             """
-            INSERT INTO stockinfo (
-                name,
-                symbol,
-                marketcap,
-                price,
-                volume,
-                highprice,
-                lowprice,
-                open,
-                prevclose,
-                timestamp
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """,
-            [
-                (
-                    d.name,
-                    d.symbol,
-                    d.marketcap,
-                    d.price,
-                    d.volume,
-                    d.highprice,
-                    d.lowprice,
-                    d.open,
-                    d.prevclose,
-                    d.timestamp,
-                )
-                for d in data
-            ],
+            SELECT 1 FROM pg_indexes
+            WHERE schemaname = current_schema() AND indexname = %s
+            """,
+            (UNIQUE_INDEX,),
+        )
+        if self.cur.fetchone():
+            return
+
+        self.cur.execute(
+            """
+            DELETE FROM stockinfo a USING stockinfo b
+            WHERE a.symbol = b.symbol AND a.timestamp = b.timestamp AND a.id > b.id
+            """
+        )
+        logger.info(f":: PostgresDB: Removed {self.cur.rowcount} duplicate rows")
+        self.cur.execute(
+            f"CREATE UNIQUE INDEX {UNIQUE_INDEX} ON stockinfo (symbol, timestamp)"
         )
         self.conn.commit()
-        logger.debug(f":: PostgresDB: Saved {len(data)} records to database")
-        return self
+
+    def save(self, data: List[StockInfo], method=None) -> SaveResult:
+        """
+        Save data of multiple stocks in bulk
+        Stocks already saved for the same timestamp are skipped
+        """
+        method = method or self.save_method
+        rows = [self.to_row(d) for d in data]
+
+        if method == "copy":
+            try:
+                inserted = self.copy_rows(rows)
+            except psycopg2.Error as e:
+                logger.warning(f":: PostgresDB: COPY failed, using INSERT: {e}")
+                self.conn.rollback()
+                inserted = self.insert_values(rows)
+        elif method == "values":
+            inserted = self.insert_values(rows)
+        elif method == "executemany":
+            inserted = self.insert_many(rows)
+        else:
+            raise ValueError(f":: PostgresDB: Unknown save method {method}")
+
+        self.conn.commit()
+        result = SaveResult(inserted=inserted, skipped=len(data) - inserted)
+        logger.debug(
+            f":: PostgresDB: Saved {result.inserted} records to database, "
+            f"skipped {result.skipped} already saved"
+        )
+        return result
+
+    def copy_rows(self, rows: List[Tuple]) -> int:
+        """
+        Stream rows as csv from an in-memory buffer with COPY into a staging table,
+        then move them over skipping conflicts. Returns rows inserted
+        """
+        columns = ", ".join(COLUMNS)
+        self.cur.execute(
+            f"""
+            CREATE TEMP TABLE IF NOT EXISTS stockinfo_incoming ON COMMIT DELETE ROWS
+            AS SELECT {columns} FROM stockinfo WITH NO DATA
+            """
+        )
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        self.cur.copy_expert(
+            f"COPY stockinfo_incoming ({columns}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+        self.cur.execute(
+            f"""
+            INSERT INTO stockinfo ({columns}) SELECT {columns} FROM stockinfo_incoming
+            ON CONFLICT (symbol, timestamp) DO NOTHING
+            """
+        )
+        return self.cur.rowcount
+
+    def insert_values(self, rows: List[Tuple]) -> int:
+        """Insert rows with one multi row INSERT per page. Returns rows inserted"""
+        inserted = psycopg2.extras.execute_values(
+            self.cur,
+            f"""
+            INSERT INTO stockinfo ({', '.join(COLUMNS)}) VALUES %s
+            ON CONFLICT (symbol, timestamp) DO NOTHING RETURNING 1
+            """,
+            rows,
+            page_size=self.page_size,
+            fetch=True,
+        )
+        return len(inserted)
+
+    def insert_many(self, rows: List[Tuple]) -> int:
+        """Insert rows one statement at a time. Returns rows inserted"""
+        placeholders = ", ".join(["%s"] * len(COLUMNS))
+        inserted = 0
+        for row in rows:
+            self.cur.execute(
+                f"""
+                INSERT INTO stockinfo ({', '.join(COLUMNS)}) VALUES ({placeholders})
+                ON CONFLICT (symbol, timestamp) DO NOTHING
+                """,
+                row,
+            )
+            inserted += self.cur.rowcount
+        return inserted
+
+    @staticmethod
+    def to_row(d: StockInfo) -> Tuple:
+        return (
+            d.name,
+            d.symbol,
+            d.marketcap,
+            d.price,
+            d.volume,
+            d.highprice,
+            d.lowprice,
+            d.open,
+            d.prevclose,
+            d.timestamp,
+        )
 
     def fetch(self, query: str, params=None):
         self.cur.execute(query, params)
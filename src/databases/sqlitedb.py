@@ -1,4 +1,11 @@
-"""SQLITE DATABASE"""
+"""
+SQLITE DATABASE
+- Opened with a writer profile: WAL journal, tunable synchronous, cache and mmap size.
+- Rows are saved in chunks, each chunk in its own transaction.
+- A stock is stored once per (symbol, timestamp), saving it again is skipped.
+- Schema changes for existing databases are applied as migrations,
+  tracked by sqlite's user_version pragma.
+"""
 import os
 import sqlite3
 from contextlib import contextmanager
@@ -6,17 +13,59 @@ from typing import List
 
 from src import logger
 from src.databases import DATA_DIR, ensure_dir
-from src.types import StockInfo
+from src.types import SaveResult, StockInfo
+
+# Applied in order, the index of the last applied one is stored in user_version
+MIGRATIONS = [
+    # 1: reads by symbol over time, and by time
+    """
+    CREATE INDEX IF NOT EXISTS stockinfo_symbol_timestamp
+    ON stockinfo (symbol, timestamp)
+    """,
+    # 2
+    """
+    CREATE INDEX IF NOT EXISTS stockinfo_timestamp ON stockinfo (timestamp)
+    """,
+    # 3: one row per symbol and timestamp, keeping the first one saved
+    """
+    DELETE FROM stockinfo WHERE id NOT IN (
+        SELECT MIN(id) FROM stockinfo GROUP BY symbol, timestamp
+    );
+    DROP INDEX IF EXISTS stockinfo_symbol_timestamp;
+    CREATE UNIQUE INDEX stockinfo_symbol_timestamp ON stockinfo (symbol, timestamp)
+    """,
+]
 
 
 class SqliteDB:
-    def __init__(self):
+    def __init__(
+        self,
+        journal_mode="WAL",
+        synchronous="NORMAL",
+        cache_size=-64000,
+        mmap_size=256 * 1024 * 1024,
+        chunk_size=5000,
+    ):
+        """
+        synchronous: OFF, NORMAL or FULL, NORMAL is safe with WAL
+        cache_size: Pages if positive, KiB if negative
+        mmap_size: Bytes of the db file to memory map, 0 to disable
+        chunk_size: Rows per transaction when saving
+        """
         self.dbpath = os.path.join(DATA_DIR, "database.sqlite")
         ensure_dir(DATA_DIR)
         self.conn = sqlite3.connect(self.dbpath)
         self.cursor = self.conn.cursor()
+        self.chunk_size = chunk_size
+        self.apply_pragmas(journal_mode, synchronous, cache_size, mmap_size)
         self.initdb()
 
+    def apply_pragmas(self, journal_mode, synchronous, cache_size, mmap_size):
+        self.cursor.execute(f"PRAGMA journal_mode = {journal_mode}")
+        self.cursor.execute(f"PRAGMA synchronous = {synchronous}")
+        self.cursor.execute(f"PRAGMA cache_size = {int(cache_size)}")
+        self.cursor.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+
     def initdb(self):
         self.cursor.execute(
             """
@@ -36,12 +85,43 @@ class SqliteDB:
         """
         )
         self.conn.commit()
+        self.migrate()
+
+    def migrate(self):
+        """Apply migrations newer than the database's user_version"""
+        version = self.cursor.execute("PRAGMA user_version").fetchone()[0]
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            try:
+                self.conn.executescript(
+                    f"BEGIN; {migration}; PRAGMA user_version = {number}; COMMIT;"
+                )
+            except sqlite3.Error:
+                self.conn.rollback()
+                raise
+            logger.info(f":: SqliteDB: Applied migration {number}")
 
-    def save(self, data: List[StockInfo]):
-        """Save data of multiple stocks in bulk"""
+    def save(self, data: List[StockInfo]) -> SaveResult:
+        """
+        Save data of multiple stocks in bulk, chunk_size rows per transaction
+        Stocks already saved for the same timestamp are skipped
+        """
+        changes = self.conn.total_changes
+        for i in range(0, len(data), self.chunk_size):
+            with self.conn:
+                self.save_chunk(data[i : i + self.chunk_size])
+
+        inserted = self.conn.total_changes - changes
+        result = SaveResult(inserted=inserted, skipped=len(data) - inserted)
+        logger.info(
+            f":: SqliteDB: Saved {result.inserted} stocks to database, "
+            f"skipped {result.skipped} already saved."
+        )
+        return result
+
+    def save_chunk(self, data: List[StockInfo]):
         self.cursor.executemany(
             """
-            INSERT INTO stockinfo (
+            INSERT OR IGNORE INTO stockinfo (
                 name,
                 symbol,
                 marketcap,
@@ -70,9 +150,6 @@ class SqliteDB:
                 for d in data
             ],
         )
-        self.conn.commit()
-        logger.info(f":: SqliteDB: Saved {len(data)} stocks to database.")
-        return self
 
     def close(self):
         self.conn.close()
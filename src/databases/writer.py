@@ -0,0 +1,154 @@
+"""
+Streams scraped stocks to the databases while scraping continues.
+- Scrapers put stocks into a bounded queue. It blocks when full,
+  so a database falling behind slows scraping down instead of growing memory.
+- A background thread drains the queue and saves micro batches,
+  once batch_size stocks are waiting or flush_interval seconds have passed.
+- Each database keeps one connection open for the whole run, opened and closed
+  on the writer thread, since sqlite connections can't be shared between threads.
+- close() flushes whatever is left and closes the connections.
+- If the writer thread dies, put() and close() raise instead of waiting forever.
+- Rows inserted and skipped as already saved are counted per database.
+"""
+import threading
+import time
+from queue import Empty, Full, Queue
+from typing import Dict, List, Optional
+
+from src import logger
+from src.types import StockInfo
+
+# Put in the queue to stop the writer thread
+STOP = object()
+# Seconds between checks that the writer thread is alive, while the queue is full
+PUT_CHECK_INTERVAL = 0.5
+
+
+class StreamWriter:
+    def __init__(self, dbs: List, batch_size=500, flush_interval=5.0, max_queue=5000):
+        self.db_classes = dbs
+        self.dbs: List = []
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: Queue = Queue(maxsize=max_queue)
+        self.thread = threading.Thread(
+            target=self.run, name="StreamWriter", daemon=True
+        )
+        self.saved = 0
+        self.inserted: Dict[str, int] = {}
+        self.skipped: Dict[str, int] = {}
+        self.error: Optional[BaseException] = None
+
+    def start(self) -> "StreamWriter":
+        self.thread.start()
+        return self
+
+    def put(self, stock: StockInfo) -> None:
+        """Queue a stock to be saved, waits while the queue is full"""
+        self.enqueue(stock)
+
+    def enqueue(self, item) -> None:
+        while True:
+            self.check_alive()
+            try:
+                self.queue.put(item, timeout=PUT_CHECK_INTERVAL)
+                return
+            except Full:
+                continue
+
+    def check_alive(self) -> None:
+        if self.thread.is_alive():
+            return
+        raise RuntimeError(f":: StreamWriter: Writer thread died: {self.error!r}")
+
+    def connect(self) -> None:
+        for db_class in self.db_classes:
+            try:
+                self.dbs.append(db_class())
+            except Exception as e:
+                logger.error(f":: Failed to connect to {db_class.__name__}: {e}")
+
+    def run(self) -> None:
+        try:
+            self.connect()
+            self.drain()
+        except BaseException as e:
+            self.error = e
+            logger.exception(f":: StreamWriter: Writer thread died: {e}")
+        finally:
+            for db in self.dbs:
+                try:
+                    db.close()
+                except Exception as e:
+                    logger.error(f":: {db.__class__.__name__}: Failed closing: {e}")
+
+    def drain(self) -> None:
+        batch: List[StockInfo] = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                stock = self.queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except Empty:
+                pass
+            else:
+                if stock is STOP:
+                    break
+                batch.append(stock)
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                self.flush(batch)
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+        # final flush on shutdown
+        self.flush(batch)
+
+    def flush(self, batch: List[StockInfo]) -> None:
+        if not batch:
+            return
+
+        for db in self.dbs:
+            name = db.__class__.__name__
+            try:
+                result = db.save(batch)
+            except Exception as e:
+                logger.error(f":: {name}: Failed saving batch: {e}")
+                self.rollback(db)
+                continue
+            self.inserted[name] = self.inserted.get(name, 0) + result.inserted
+            self.skipped[name] = self.skipped.get(name, 0) + result.skipped
+        self.saved += len(batch)
+        logger.debug(f":: StreamWriter: Flushed {len(batch)}, {self.saved} in total")
+
+    def rollback(self, db) -> None:
+        try:
+            db.conn.rollback()
+        except Exception as e:
+            logger.error(f":: {db.__class__.__name__}: Failed rolling back: {e}")
+
+    def close(self) -> None:
+        self.enqueue(STOP)
+        self.thread.join()
+        if self.error is not None:
+            raise RuntimeError(
+                f":: StreamWriter: Writer thread died: {self.error!r}"
+            ) from self.error
+        logger.info(f":: StreamWriter: Saved {self.saved} stocks to databases.")
+        for name, inserted in self.inserted.items():
+            logger.info(
+                f":: {name}: Inserted {inserted}, "
+                f"skipped {self.skipped[name]} already saved"
+            )
+
+    def __enter__(self) -> "StreamWriter":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        if exc_info[0] is None:
+            self.close()
+            return
+        # the scrape failed, don't hide its exception behind the writer's
+        try:
+            self.close()
+        except Exception as e:
+            logger.error(f":: StreamWriter: Failed closing: {e}")
@@ -0,0 +1,133 @@
+"""
+Listings served from their last snapshot while it is fresh.
+- A snapshot younger than ttl seconds is returned without any request.
+- Stale snapshots are refreshed with a conditional request where the site supports
+  ETag or Last-Modified, a not modified answer just renews the snapshot.
+- Symbols added and removed since the previous snapshot are logged and recorded,
+  `changes` returns them for the rest of the pipeline.
+- If refreshing fails, a stale snapshot is still better than no listing.
+- `stream` yields symbols page by page as they are fetched,
+  so scraping can start before the whole listing is downloaded.
+"""
+import abc
+import time
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional
+
+from requests import Response
+
+from src import logger
+from src.databases import ListingCache, cache_listings
+from src.types import ListingSnapshot
+
+
+class NotModified(Exception):
+    """The listing has not changed since the previous snapshot"""
+
+
+class CachedListing(abc.ABC):
+    # key in listings_map, snapshots are stored under it
+    name = ""
+    ttl = 24 * 60 * 60
+
+    def __init__(self) -> None:
+        self.added: List[str] = []
+        self.removed: List[str] = []
+
+    @abc.abstractmethod
+    def fetch_pages(
+        self, previous: Optional[ListingSnapshot]
+    ) -> Iterator[ListingSnapshot]:
+        """
+        Pages of the listing from the site, in any order
+        Raises NotModified if it has not changed since previous
+        """
+
+    def get_data(self, refresh=False) -> Deque[str]:
+        """Queue of symbols to scrape, refresh: Ignore a fresh snapshot"""
+        return deque(symbol for page in self.stream(refresh) for symbol in page)
+
+    def stream(self, refresh=False) -> Iterator[List[str]]:
+        """Symbols to scrape, a page at a time, refresh: Ignore a fresh snapshot"""
+        label = self.__class__.__name__
+        previous = self.load_snapshot()
+        if previous is not None and not refresh and self.fresh(previous):
+            age = (time.time() - previous.fetched_at) / 60
+            logger.debug(f":: {label}: Using snapshot from {age:.0f} minutes ago")
+            yield list(previous.symbols)
+            return
+
+        snapshot = ListingSnapshot({}, time.time())
+        try:
+            for page in self.fetch_pages(previous):
+                yield [s for s in page.symbols if s not in snapshot.symbols]
+                snapshot.symbols.update(page.symbols)
+                snapshot.etag = page.etag or snapshot.etag
+                snapshot.last_modified = page.last_modified or snapshot.last_modified
+        except NotModified:
+            logger.debug(f":: {label}: Not modified since last snapshot")
+            with ListingCache.session() as db:
+                db.touch_snapshot(self.name)
+            yield list(previous.symbols)
+            return
+        except Exception as e:
+            if previous is None:
+                raise
+            logger.warning(f":: {label}: Refresh failed, using stale snapshot: {e}")
+            yield [s for s in previous.symbols if s not in snapshot.symbols]
+            return
+
+        self.save_snapshot(snapshot)
+        self.save_to_cache(snapshot.symbols)
+        logger.debug(f":: {label}: Found {len(snapshot.symbols)} stocks.")
+
+    def fresh(self, snapshot: ListingSnapshot) -> bool:
+        return time.time() - snapshot.fetched_at < self.ttl
+
+    def load_snapshot(self) -> Optional[ListingSnapshot]:
+        with ListingCache.session() as db:
+            return db.get_snapshot(self.name)
+
+    def save_snapshot(self, snapshot: ListingSnapshot) -> None:
+        with ListingCache.session() as db:
+            self.added, self.removed = db.save_snapshot(self.name, snapshot)
+        if self.added or self.removed:
+            logger.info(
+                f":: {self.__class__.__name__}: {len(self.added)} added "
+                f"{self.added[:10]}, {len(self.removed)} removed {self.removed[:10]}"
+            )
+
+    def changes(self, since: float = 0.0) -> Dict[str, List[str]]:
+        """Symbols added and removed since a time, across snapshots"""
+        # stays empty if the cache can't be read, the session logs why
+        changes: Dict[str, List[str]] = {"added": [], "removed": []}
+        with ListingCache.session() as db:
+            changes = db.get_changes(self.name, since)
+        return changes
+
+    def save_to_cache(self, symbols: Dict[str, str]):
+        try:
+            cache_listings(symbols)
+        except:
+            logger.error(
+                f":: {self.__class__.__name__} Error: Cannot save listings to cache."
+            )
+
+    @staticmethod
+    def conditional_headers(previous: Optional[ListingSnapshot]) -> Dict[str, str]:
+        """Validators of the previous snapshot, to only get the page when changed"""
+        headers = {}
+        if previous is not None and previous.etag:
+            headers["if-none-match"] = previous.etag
+        if previous is not None and previous.last_modified:
+            headers["if-modified-since"] = previous.last_modified
+        return headers
+
+    @staticmethod
+    def snapshot(symbols: Dict[str, str], response: Response) -> ListingSnapshot:
+        return ListingSnapshot(
+            symbols,
+            fetched_at=time.time(),
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
@@ -1,53 +1,100 @@
-from collections import deque
-from typing import Dict
+import concurrent.futures
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import requests
 
 from src import logger
-from src.databases import cache_listings
+from src.listings.cached import CachedListing
+from src.types import ListingSnapshot
 
+MAX_PAGES = 99
+# Times a failed page is requested again
+MAX_PAGE_RETRIES = 2
 
-class NYSE:
-    def __init__(self) -> None:
+
+class NYSE(CachedListing):
+    name = "nyse"
+
+    def __init__(self, concurrency=4) -> None:
+        """concurrency: Pages requested at a time"""
+        super().__init__()
+        self.concurrency = concurrency
         self.url = "https://www.nyse.com/api/quotes/filter"
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
         }
 
-    def get_data(self):
-        symbols_names = {}
-        results_per_page = 1001  # Only 1k is returned
-
-        # Iterate over all pages, until resultPerPage < 1000
-        for page_no in range(1, 100):
-            post_data = self.gen_post_data(page_no, results_per_page)
-            response = requests.post(self.url, headers=self.headers, json=post_data)
+    def fetch_pages(
+        self, previous: Optional[ListingSnapshot]
+    ) -> Iterator[ListingSnapshot]:
+        """
+        Fetches up to `concurrency` pages at a time, yielding each as it arrives.
+        The page count is unknown upfront, a page with less than 1000 results
+        is the last one, pages requested past it come back empty.
+        Failed pages are retried, failures of pages past the last one don't count.
+        """
+        # The filter api is a POST without validators, only the ttl applies
+        pending: Dict[concurrent.futures.Future, int] = {}
+        attempts: Dict[int, int] = {}
+        failed: Dict[int, Exception] = {}
+        retry: List[int] = []
+        next_page, last_page = 1, MAX_PAGES
+        with concurrent.futures.ThreadPoolExecutor(self.concurrency) as executor:
+            while pending or retry or next_page <= last_page:
+                while len(pending) < self.concurrency and (
+                    retry or next_page <= last_page
+                ):
+                    if retry:
+                        page_no = retry.pop()
+                    else:
+                        page_no, next_page = next_page, next_page + 1
+                    pending[executor.submit(self.fetch_page, page_no)] = page_no
 
-            if response.status_code == 200:
-                # Parse response to get symbols and names, for this page
-                try:
-                    all_stocks_data, valid_data = self.parse_response(response)
-                except:
-                    raise Exception(
-                        f":: NYSEListing: Cannot parse {page_no} page response."
-                    )
-                else:
-                    symbols_names.update(valid_data)
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    page_no = pending.pop(future)
+                    try:
+                        all_stocks_data, page = future.result()
+                    except Exception as e:
+                        attempts[page_no] = attempts.get(page_no, 0) + 1
+                        if attempts[page_no] > MAX_PAGE_RETRIES:
+                            failed[page_no] = e
+                        elif page_no <= last_page:
+                            logger.debug(
+                                f":: NYSEListing: Retrying page {page_no}: {e}"
+                            )
+                            retry.append(page_no)
+                        continue
                     # Check if last page or pagination remaining
                     if len(all_stocks_data) < 1000:
-                        break
-            else:
-                raise Exception(
-                    f":: NYSEListing Error: {response.status_code} {response.text}"
-                )
+                        last_page = min(last_page, page_no)
+                        retry = [p for p in retry if p <= last_page]
+                    if page.symbols:
+                        yield page
 
-        self.save_to_cache(symbols_names)
+        # only now is the last page known, speculative pages past it may fail
+        for page_no, error in sorted(failed.items()):
+            if page_no <= last_page:
+                raise error
 
-        # Return a queue of symbols, to scrape
-        symbols = deque(symbols_names.keys())
+    def fetch_page(self, page_no: int) -> Tuple[List[Dict], ListingSnapshot]:
+        results_per_page = 1001  # Only 1k is returned
+        post_data = self.gen_post_data(page_no, results_per_page)
+        response = requests.post(self.url, headers=self.headers, json=post_data)
+        if response.status_code != 200:
+            raise Exception(
+                f":: NYSEListing Error: {response.status_code} {response.text}"
+            )
 
-        logger.debug(f":: NYSEListing: Found {len(symbols)} stocks.")
-        return symbols
+        # Parse response to get symbols and names, for this page
+        try:
+            all_stocks_data, valid_data = self.parse_response(response)
+        except:
+            raise Exception(f":: NYSEListing: Cannot parse {page_no} page response.")
+        logger.debug(f":: NYSEListing: Page {page_no}, {len(valid_data)} stocks.")
+        return all_stocks_data, self.snapshot(valid_data, response)
 
     def parse_response(self, response):
         all_stocks = response.json()
@@ -66,12 +113,6 @@ class NYSE:
         }
         return all_stocks, valid_symbol_names
 
-    def save_to_cache(self, symbols: Dict[str, str]):
-        try:
-            cache_listings(symbols)
-        except:
-            logger.error(":: NYSEListing Error: Cannot save listings to cache.")
-
     def gen_post_data(self, page_no, results_per_page):
         return {
             "instrumentType": "EQUITY",
@@ -1,50 +1,75 @@
-from collections import deque
-from typing import Dict
-
+"""
+Index listings from slickcharts, one html page each.
+- The components table is parsed with lxml and xpath,
+  BeautifulSoup's html.parser is the fallback when lxml fails on a page.
+- Both return symbols to names in table order.
+"""
+from typing import Dict, Iterator, Optional
+
+import lxml.html
 import requests
 from bs4 import BeautifulSoup
 
 from src import logger
-from src.databases import cache_listings
+from src.listings.cached import CachedListing, NotModified
+from src.types import ListingSnapshot
+
+TABLE_CLASS = "table table-hover table-borderless table-sm"
+
+
+def parse_table(html: str) -> Dict[str, str]:
+    try:
+        return parse_table_lxml(html)
+    except Exception as e:
+        logger.warning(f":: Slickcharts: lxml parse failed, using BeautifulSoup: {e}")
+        return parse_table_soup(html)
+
+
+def parse_table_lxml(html: str) -> Dict[str, str]:
+    tables = lxml.html.fromstring(html).xpath(f'//table[@class="{TABLE_CLASS}"]')
+    if not tables:
+        raise ValueError("Components table not found")
+
+    symbols_names = {}
+    for row in tables[0].iterdescendants("tr"):
+        cells = list(row.iterdescendants("td"))
+        if not cells:
+            continue
+        symbols_names[cells[2].text_content().strip()] = cells[1].text_content().strip()
+    return symbols_names
+
 
+def parse_table_soup(html: str) -> Dict[str, str]:
+    soup = BeautifulSoup(html, "html.parser")
 
-class Listing:
+    table = soup.find("table", {"class": TABLE_CLASS})
+    tr_blocks = table.find_all("tr")
+
+    symbols_names = {}
+    for block in tr_blocks:
+        td_blocks = block.find_all("td")
+        if len(td_blocks) == 0:
+            continue
+        full_name = td_blocks[1].text.strip()
+        symbol = td_blocks[2].text.strip()
+        symbols_names[symbol] = full_name
+    return symbols_names
+
+
+class Listing(CachedListing):
     url = "https://www.slickcharts.com/nasdaq100"
 
-    def get_data(self):
-        headers = self.get_headers()
+    def fetch_pages(
+        self, previous: Optional[ListingSnapshot]
+    ) -> Iterator[ListingSnapshot]:
+        # The whole listing is a single page
+        headers = dict(self.get_headers(), **self.conditional_headers(previous))
         response = requests.get(self.url, headers=headers)
-        soup = BeautifulSoup(response.text, "html.parser")
-
-        table = soup.find(
-            "table", {"class": "table table-hover table-borderless table-sm"}
-        )
-        tr_blocks = table.find_all("tr")
-
-        symbols_names = {}
-        for block in tr_blocks:
-            td_blocks = block.find_all("td")
-            if len(td_blocks) == 0:
-                continue
-            full_name = td_blocks[1].text.strip()
-            symbol = td_blocks[2].text.strip()
-            symbols_names[symbol] = full_name
-
-        self.save_to_cache(symbols_names)
-        symbols = deque(symbols_names.keys())
-
-        logger.debug(
-            f":: {self.__class__.__name__}: Found {len(symbols_names)} stocks."
-        )
-        return symbols
-
-    def save_to_cache(self, symbols: Dict[str, str]):
-        try:
-            cache_listings(symbols)
-        except:
-            logger.error(
-                f":: {self._class__.__name__} Error: Cannot save listings to cache."
-            )
+        if response.status_code == 304 and previous is not None:
+            raise NotModified
+        response.raise_for_status()
+
+        yield self.snapshot(parse_table(response.text), response)
 
     def get_headers(self):
         headers = {
@@ -69,15 +94,24 @@ class Listing:
 
 
 class SandP500(Listing):
+    name = "sandp500"
+
     def __init__(self):
+        super().__init__()
         self.url = "https://www.slickcharts.com/sp500"
 
 
 class Nasdaq100(Listing):
+    name = "nasdaq100"
+
     def __init__(self):
+        super().__init__()
         self.url = "https://www.slickcharts.com/nasdaq100"
 
 
 class DowJones30(Listing):
+    name = "dowjones30"
+
     def __init__(self):
+        super().__init__()
         self.url = "https://www.slickcharts.com/dowjones"
@@ -1,2 +1,4 @@
+from src.runners.async_runner import async_executor
 from src.runners.multi_thread import parallel_executor
+from src.runners.scheduler import Scheduler
 from src.runners.single_thread import executor
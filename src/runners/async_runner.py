@@ -0,0 +1,102 @@
+"""
+We create and execute multiple tasks, out of same coroutine instance using asyncio.
+- Same flow and return contract as the multi thread runner.
+- Instead of one thread per scraper, each scraper runs as a task on one event loop.
+- Each task keeps several requests in flight (scraper.concurrency),
+  blocking requests are run on a thread pool sized for all of them.
+
+- Second Pass: Failure dict is taken and again passed to scrapers
+- We then pair symbols and scraper so that symbol get new scraper than previous one.
+
+- All data and final failure list are then returned
+"""
+import asyncio
+import concurrent.futures
+from functools import partial
+from pprint import pformat
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from src import logger
+from src.runners.utils import (
+    cancel_func,
+    fix_duplication_and_missed_symbols,
+    match_scrapers_failures,
+)
+from src.scrapers import ScraperType
+from src.types import Result, StockInfo
+
+
+def async_executor(
+    instance_func: Callable[..., Awaitable[None]],
+    scrapers: List[ScraperType],
+    symbol_funcs: List[Callable[[], str]],
+    symbols: Deque[str],
+    reprocess_failures=True,
+    sink: Optional[Callable[[StockInfo], None]] = None,
+) -> Tuple[List[StockInfo], Dict[str, str]]:
+    return asyncio.run(
+        _async_executor(
+            instance_func, scrapers, symbol_funcs, symbols, reprocess_failures, sink
+        )
+    )
+
+
+async def _async_executor(
+    instance_func: Callable[..., Awaitable[None]],
+    scrapers: List[ScraperType],
+    symbol_funcs: List[Callable[[], str]],
+    symbols: Deque[str],
+    reprocess_failures=True,
+    sink: Optional[Callable[[StockInfo], None]] = None,
+) -> Tuple[List[StockInfo], Dict[str, str]]:
+    # Every in-flight request and scraper setup occupies one worker thread
+    max_workers = sum(scraper.concurrency for scraper in scrapers) + len(scrapers)
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+    )
+
+    result = Result(data={}, failures={}, sink=sink)
+    cancel_funcs = [partial(cancel_func, symbol_func) for symbol_func in symbol_funcs]
+
+    # Initial Pass
+    await asyncio.gather(
+        *(
+            instance_func(scraper, symbol_func, result, cancel_func)
+            for scraper, symbol_func, cancel_func in zip(
+                scrapers, symbol_funcs, cancel_funcs
+            )
+        )
+    )
+
+    failures = fix_duplication_and_missed_symbols(result, symbols)
+    logger.opt(lazy=True).debug(
+        ":: Failed symbols {}: {}", lambda: len(failures), lambda: pformat(failures)
+    )
+
+    # Second Pass: Retry failures with alternate scraper, disable cancellation
+    if reprocess_failures and failures:
+        result = await reprocess_failure(instance_func, scrapers, failures, result)
+
+    failures = fix_duplication_and_missed_symbols(result, symbols)
+    return list(result.data.values()), failures
+
+
+async def reprocess_failure(
+    instance_func: Callable[..., Awaitable[None]],
+    scrapers: List[ScraperType],
+    failures: Dict[str, str],
+    result: Result,
+) -> Result:
+    result = Result(data=result.data, failures={}, sink=result.sink, seen=result.seen)
+    disabled_cancel_func = lambda: False
+    logger.info(":: Reprocessing failures with alternate scraper")
+
+    scrapers_symbols = match_scrapers_failures(scrapers, failures)
+    await asyncio.gather(
+        *(
+            instance_func(scraper, symbol_func, result, disabled_cancel_func)
+            for scraper, symbol_func in scrapers_symbols.items()
+        )
+    )
+    return result
@@ -17,7 +17,7 @@ We create and execute multiple tasks, out of same function instance using thread
 import concurrent.futures
 from functools import partial
 from pprint import pformat
-from typing import Callable, Deque, Dict, List, Tuple
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 
 from src import logger
 from src.runners.utils import (
@@ -35,8 +35,9 @@ def parallel_executor(
     symbol_funcs: List[Callable[[], str]],
     symbols: Deque[str],
     reprocess_failures=True,
+    sink: Optional[Callable[[StockInfo], None]] = None,
 ) -> Tuple[List[StockInfo], Dict[str, str]]:
-    result = Result(data={}, failures={})
+    result = Result(data={}, failures={}, sink=sink)
 
     cancel_funcs = [partial(cancel_func, symbol_func) for symbol_func in symbol_funcs]
 
@@ -52,7 +53,9 @@ def parallel_executor(
             future.result()
 
     failures = fix_duplication_and_missed_symbols(result, symbols)
-    logger.debug(f":: Failed symbols {len(failures)}: {pformat(failures)}")
+    logger.opt(lazy=True).debug(
+        ":: Failed symbols {}: {}", lambda: len(failures), lambda: pformat(failures)
+    )
 
     # Second Pass: Retry failures with alternate scraper, disable cancellation
     if reprocess_failures and failures:
@@ -68,7 +71,7 @@ def reprocess_failure(
     failures: Dict[str, str],
     result: Result,
 ) -> Result:
-    result = Result(data=result.data, failures={})
+    result = Result(data=result.data, failures={}, sink=result.sink, seen=result.seen)
     disabled_cancel_func = lambda: False
     logger.info(":: Reprocessing failures with alternate scraper")
 
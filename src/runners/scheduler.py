@@ -0,0 +1,207 @@
+"""
+Throughput aware symbol dispatch with work stealing.
+- All symbols start in one shared queue, each scraper pulls from it via its own Worker.
+- A worker asks for a batch of up to its scraper's batch size (capacity).
+- Throughput of a worker is measured as symbols completed per second since its first batch.
+  A stalled worker's throughput decays on its own as time passes without completions.
+- Near the end, when the queue holds less than one round of batches,
+  the rest is split by throughput, so slow workers only take a small share.
+- Once the queue is empty, an idle worker steals the in-flight symbols of a slower worker.
+  Both may finish them, result data is keyed by symbol so duplicates are harmless.
+- A worker is drained when nothing is left to take or steal, and its own work was stolen.
+  This is used as the cancel signal, so a stalled proxy scraper gives up its retries.
+- A worker whose scraper stopped, even by an error, is closed: it no longer counts
+  for fair shares and its unfinished symbols go back to the queue.
+- A streaming scheduler is fed symbols while the listing is still being fetched.
+  Until it is closed, workers finding the queue empty wait for more instead of
+  stealing or stopping, and nobody is drained.
+"""
+import threading
+import time
+from collections import deque
+from typing import Iterable, List, Optional, Set
+
+from src import logger
+
+
+class Worker:
+    def __init__(self, scheduler: "Scheduler", name: str = "") -> None:
+        self.scheduler = scheduler
+        self.name = name
+        self.capacity = 1
+        self.in_flight: List[List[str]] = []
+        self.completed = 0
+        self.started_at: Optional[float] = None
+        self.closed = False
+
+    def pop_batch(self, capacity: int) -> List[str]:
+        """Next batch of up to capacity symbols, empty once no work is left"""
+        return self.scheduler.dispatch(self, capacity)
+
+    def finish_batch(self, batch: List[str]) -> None:
+        """Marks a batch returned by pop_batch as processed"""
+        self.scheduler.finish(self, batch)
+
+    def pop(self) -> str:
+        """Single symbol access, same contract as deque.pop"""
+        batch = self.pop_batch(1)
+        if not batch:
+            raise IndexError("pop from a drained scheduler")
+        self.finish_batch(batch)
+        return batch[0]
+
+    def drained(self) -> bool:
+        return self.scheduler.drained(self)
+
+    def close(self) -> None:
+        """The scraper stopped taking symbols"""
+        self.scheduler.retire(self)
+
+    def throughput(self) -> Optional[float]:
+        """Completed symbols per second since the first batch, None if unknown"""
+        if self.started_at is None or not self.completed:
+            return None
+        return self.completed / max(time.monotonic() - self.started_at, 1e-6)
+
+    def unstolen(self) -> List[str]:
+        stolen = self.scheduler.stolen
+        return [s for batch in self.in_flight for s in batch if s not in stolen]
+
+    def __len__(self):
+        """Symbols not yet handed out to any worker"""
+        return len(self.scheduler.queue)
+
+    def __repr__(self):
+        return f"Worker({self.name})"
+
+
+class Scheduler:
+    def __init__(self, symbols: Iterable[str] = (), streaming=False) -> None:
+        """streaming: More symbols are fed later, until close is called"""
+        self.queue = deque()
+        # every symbol fed so far, in order
+        self.symbols: List[str] = []
+        self.seen: Set[str] = set()
+        self.workers: List[Worker] = []
+        # symbols handed out a second time, never stolen again
+        self.stolen: Set[str] = set()
+        self.lock = threading.RLock()
+        self.fed = threading.Condition(self.lock)
+        self.streaming = streaming
+        self.feed(symbols)
+
+    def feed(self, symbols: Iterable[str]) -> None:
+        """Adds symbols to the queue, ignoring ones already fed"""
+        with self.lock:
+            new = [s for s in symbols if s not in self.seen]
+            self.seen.update(new)
+            self.symbols.extend(new)
+            self.queue.extend(new)
+            if new:
+                self.fed.notify_all()
+
+    def close(self) -> None:
+        """No more symbols will be fed, waiting workers finish up"""
+        with self.lock:
+            self.streaming = False
+            self.fed.notify_all()
+
+    def worker(self, name: str = "") -> Worker:
+        with self.lock:
+            worker = Worker(self, name=name)
+            self.workers.append(worker)
+            return worker
+
+    def retire(self, worker: Worker) -> None:
+        """Deregisters a worker, its unfinished symbols are queued for the others"""
+        with self.lock:
+            worker.closed = True
+            if worker not in self.workers:
+                return
+            self.workers.remove(worker)
+            unfinished = worker.unstolen()
+            worker.in_flight = []
+            if unfinished:
+                self.queue.extendleft(reversed(unfinished))
+                self.fed.notify_all()
+
+    def dispatch(self, worker: Worker, capacity: int) -> List[str]:
+        with self.lock:
+            worker.capacity = capacity
+            if worker.started_at is None:
+                worker.started_at = time.monotonic()
+
+            batch = self.take(worker, capacity)
+            while not batch and self.streaming:
+                self.fed.wait()
+                batch = self.take(worker, capacity)
+            batch = batch or self.steal(worker, capacity)
+            if batch:
+                worker.in_flight.append(batch)
+            else:
+                worker.closed = True
+            return batch
+
+    def finish(self, worker: Worker, batch: List[str]) -> None:
+        with self.lock:
+            worker.in_flight = [b for b in worker.in_flight if b is not batch]
+            worker.completed += len(batch)
+
+    def take(self, worker: Worker, capacity: int) -> List[str]:
+        size = min(self.fair_share(worker, capacity), len(self.queue))
+        return [self.queue.popleft() for _ in range(size)]
+
+    def fair_share(self, worker: Worker, capacity: int) -> int:
+        """
+        Full capacity while the queue can feed every worker a batch,
+        afterwards the worker's share of the rest by throughput
+        """
+        if self.streaming:
+            return capacity
+        active = [w for w in self.workers if not w.closed]
+        if len(self.queue) >= sum(w.capacity for w in active):
+            return capacity
+
+        rate = worker.throughput()
+        rates = [r for r in (w.throughput() for w in active) if r]
+        if not rate or not rates:
+            return capacity
+
+        share = round(len(self.queue) * rate / sum(rates))
+        return max(1, min(capacity, share))
+
+    def steal(self, thief: Worker, capacity: int) -> List[str]:
+        victim = self.find_victim(thief)
+        if victim is None:
+            return []
+
+        batch = victim.unstolen()[-capacity:]
+        self.stolen.update(batch)
+        logger.debug(
+            ":: Scheduler: {} stole {} symbols of {}", thief, len(batch), victim
+        )
+        return batch
+
+    def find_victim(self, thief: Worker) -> Optional[Worker]:
+        """The slowest worker with in-flight symbols, if slower than thief"""
+        rate = thief.throughput()
+        if not rate:
+            return None
+
+        victims = [
+            w
+            for w in self.workers
+            if w is not thief and w.unstolen() and (w.throughput() or 0.0) < rate
+        ]
+        if not victims:
+            return None
+        return min(victims, key=lambda w: w.throughput() or 0.0)
+
+    def drained(self, worker: Worker) -> bool:
+        with self.lock:
+            if self.streaming or self.queue or worker.unstolen():
+                return False
+            return self.find_victim(worker) is None
+
+    def remaining(self) -> int:
+        return len(self.queue)
@@ -14,7 +14,7 @@ We create and execute instance function.
 - All data and final failure list are then returned
 """
 from pprint import pformat
-from typing import Callable, Deque, Dict, List, Tuple
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 
 from src import logger
 from src.runners.utils import (
@@ -31,8 +31,9 @@ def executor(
     symbol_funcs: List[Callable[[], str]],
     symbols: Deque[str],
     reprocess_failures=True,
+    sink: Optional[Callable[[StockInfo], None]] = None,
 ) -> Tuple[List[StockInfo], Dict[str, str]]:
-    result = Result(data={}, failures={})
+    result = Result(data={}, failures={}, sink=sink)
 
     # First scraper is used.
     scraper = scrapers[0]
@@ -45,7 +46,9 @@ def executor(
     instance_func(scraper, symbol_func, result, cancel_function)
 
     failures = fix_duplication_and_missed_symbols(result, symbols)
-    logger.debug(f":: Failed symbols {len(failures)}: {pformat(failures)}")
+    logger.opt(lazy=True).debug(
+        ":: Failed symbols {}: {}", lambda: len(failures), lambda: pformat(failures)
+    )
 
     # Second Pass: Retry failures once again, using alt scraper if available
     if reprocess_failures and failures:
@@ -65,7 +68,7 @@ def reprocess_failure(
     failures: Dict[str, str],
     result: Result,
 ) -> Result:
-    result = Result(data=result.data, failures={})
+    result = Result(data=result.data, failures={}, sink=result.sink, seen=result.seen)
     scrapers_symbols = match_scrapers_failures(scrapers, failures)
     disabled_cancel_func = lambda: False
 
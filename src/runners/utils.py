@@ -10,18 +10,22 @@ def cancel_func(symbol_func: Callable[[], str]):
     # check if the symbol_func that fetches next symbol itself is empty
     # Cancellation is only used for proxy scrapers
     # To stop the time waste searching and rotating free proxies when queue is already empty
-    return len(symbol_func.__self__) == 0
+    source = symbol_func.__self__
+    # scheduler workers also wait for work they could still steal
+    if hasattr(source, "drained"):
+        return source.drained()
+    return len(source) == 0
 
 
 def fix_duplication_and_missed_symbols(
     result: Result, symbols: Deque[str]
 ) -> Dict[str, str]:
-    failures, data = result.failures, result.data
+    failures, seen = result.failures, result.seen
     # Get real failures, some failure arises due to same symbol being taken up by multiple scrapers
-    failures = {sym: s for sym, s in failures.items() if sym not in data}
+    failures = {sym: s for sym, s in failures.items() if sym not in seen}
 
     # Add missed symbols to failures,
-    missed_symbols = [sym for sym in symbols if sym not in data and sym not in failures]
+    missed_symbols = [sym for sym in symbols if sym not in seen and sym not in failures]
     # and assign it as "missed"
     failures.update({sym: "missed" for sym in missed_symbols})
     return failures
@@ -3,8 +3,9 @@ isort:skip_file
 """
 from src.scrapers.stock_analysis_api import StockAnalysisAPI
 from src.scrapers.yahooapi import YahooAPI
+from src.scrapers.async_api import AsyncStockAnalysisAPI, AsyncYahooAPI
 
 ScraperType = YahooAPI | StockAnalysisAPI
 
 # main imports this file so at last also
-from src.scrapers.main import scraper_instance
+from src.scrapers.main import async_scraper_instance, scraper_instance
@@ -0,0 +1,135 @@
+"""
+Asyncio versions of the scrapers
+- They reuse request building and response conversion of the sync scrapers.
+- Only the request itself is awaited, through an AsyncRequestProxy.
+- Setup (cookies, connection test) stays sync and is run in a worker thread.
+- Each scraper keeps up to `concurrency` requests in flight at once,
+  while the shared host rate limiter still paces every attempt of a request,
+  waiting for it in the request's worker thread.
+"""
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.databases import name_index
+from src.scrapers.stock_analysis_api import StockAnalysisAPI
+from src.scrapers.yahooapi import YahooAPI
+from src.types import RequestOutcome, StockInfo
+from src.utils.proxy import AsyncRequestProxy
+from src.utils.rate_limiter import TokenBucket
+
+
+class AsyncScraperMixin:
+    concurrency: int
+    rate_limiter: Optional[TokenBucket]
+
+    def setup(self, cancel_func: Callable[[], bool] = lambda: False) -> None:
+        super().setup(cancel_func=cancel_func)
+        self.async_session = AsyncRequestProxy(
+            self.session, max_in_flight=self.concurrency
+        )
+
+    def probe(self, cancel_func: Callable[[], bool] = lambda: False) -> None:
+        # probing may replace the session with one on a new proxy
+        super().probe(cancel_func=cancel_func)
+        self.async_session = AsyncRequestProxy(
+            self.session, max_in_flight=self.concurrency
+        )
+
+
+class AsyncYahooAPI(AsyncScraperMixin, YahooAPI):
+    def __init__(self, concurrency=4, **kwargs) -> None:
+        """Takes the YahooAPI arguments, and the requests to keep in flight"""
+        super().__init__(**kwargs)
+        self.concurrency = concurrency
+
+    async def aget_data(
+        self, symbols: List[str], cancel_func: Callable[[], bool] = lambda: False
+    ) -> Dict[str, Optional[StockInfo]]:
+        """Async counterpart of YahooAPI.get_data"""
+        return (await self.afetch_batch(symbols, cancel_func=cancel_func))[0]
+
+    async def afetch_batch(
+        self, symbols: List[str], cancel_func: Callable[[], bool] = lambda: False
+    ) -> Tuple[Dict[str, Optional[StockInfo]], RequestOutcome]:
+        """Async counterpart of YahooAPI.fetch_batch"""
+        batches = self.pack_symbols(symbols)
+        if len(batches) > 1:
+            fetched = await asyncio.gather(
+                *(
+                    self.afetch_batch(batch, cancel_func=cancel_func)
+                    for batch in batches
+                )
+            )
+            result = {}
+            for data, _ in fetched:
+                result.update(data)
+            return result, RequestOutcome.merge([outcome for _, outcome in fetched])
+
+        result: Dict[str, Optional[StockInfo]] = {symbol: None for symbol in symbols}
+        data, outcome = await self._aget_data(symbols, cancel_func=cancel_func)
+
+        failures = self.collect_data(result, data, symbols)
+        if not failures:
+            return result, outcome
+
+        plan = self.bisect_failures(failures)
+        try:
+            batch = next(plan)
+            while True:
+                data, retry = await self._aget_data(batch, cancel_func=cancel_func)
+                failed = self.collect_data(result, data, batch)
+                batch = plan.send((failed, retry.ok))
+        except StopIteration:
+            pass
+
+        return result, outcome
+
+    async def _aget_data(
+        self, symbols: List[str], cancel_func: Callable[[], bool] = lambda: False
+    ) -> Tuple[List[Optional[StockInfo]], RequestOutcome]:
+        # normalize symbol eg BRK.B -> BRK-B
+        symbols = [symbol.replace(".", "-") for symbol in symbols]
+
+        url, headers = self.build_request(symbols)
+        started = time.monotonic()
+        response = await self.async_session.request(
+            "get",
+            url,
+            headers=headers,
+            cancel_func=cancel_func,
+            rate_limiter=self.rate_limiter,
+        )
+        latency = time.monotonic() - started
+        return self.parse_outcome(response, symbols, latency)
+
+
+class AsyncStockAnalysisAPI(AsyncScraperMixin, StockAnalysisAPI):
+    def __init__(self, concurrency=4, **kwargs) -> None:
+        """Takes the StockAnalysisAPI arguments, and the requests to keep in flight"""
+        super().__init__(**kwargs)
+        self.concurrency = concurrency
+
+    async def aget_data(
+        self, symbols: List[str], cancel_func: Callable[[], bool] = lambda: False
+    ) -> Dict[str, Optional[StockInfo]]:
+        """Async counterpart of StockAnalysisAPI.get_data"""
+        if not symbols:
+            return {}
+        await asyncio.to_thread(name_index.lookup, symbols)
+        data = await self._aget_data(symbols[0], cancel_func=cancel_func)
+        return {symbols[0]: data}
+
+    async def _aget_data(
+        self, symbol: str, cancel_func: Callable[[], bool] = lambda: False
+    ) -> Optional[StockInfo]:
+        url, headers = self.BASE_URL.format(symbol), self.get_headers()
+        response = await self.async_session.request(
+            "get",
+            url,
+            headers=headers,
+            cancel_func=cancel_func,
+            rate_limiter=self.rate_limiter,
+        )
+        # name lookup may fall back to scraping, keep it off the loop
+        return await asyncio.to_thread(self.parse_response, response, symbol)
@@ -0,0 +1,55 @@
+"""
+Scraper health between runs, kept in a small json state file.
+- A scraper that worked within fresh_for seconds starts without a test request,
+  on the proxy it last worked with. Its first real batch is the health check,
+  if that fails it falls back to the usual connection test.
+- Scrapers that went dead are recorded too, they get tested on the next start.
+"""
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from src import logger
+from src.databases import DATA_DIR
+from src.utils.state import load_state, save_state
+
+
+class HealthSnapshot:
+    def __init__(self, path: str, fresh_for=12 * 60 * 60):
+        """fresh_for: Seconds a healthy record lets a scraper skip its test request"""
+        self.path = path
+        self.fresh_for = fresh_for
+        self.records: Optional[Dict[str, Dict]] = None
+        self.lock = threading.Lock()
+
+    def get(self, name: str) -> Dict:
+        with self.lock:
+            if self.records is None:
+                self.records = load_state(self.path, {})
+            return self.records.get(name, {})
+
+    def healthy(self, name: str) -> bool:
+        record = self.get(name)
+        checked_at = record.get("checked_at") or 0
+        return (
+            record.get("healthy", False) and time.time() - checked_at < self.fresh_for
+        )
+
+    def last_proxy(self, name: str) -> Optional[str]:
+        return self.get(name).get("proxy")
+
+    def record(self, name: str, healthy: bool, proxy: Optional[str] = None) -> None:
+        self.get(name)
+        with self.lock:
+            self.records[name] = {
+                "healthy": healthy,
+                "checked_at": time.time(),
+                "proxy": proxy,
+            }
+            save_state(self.path, self.records)
+        logger.debug(":: Health: {} {}", name, "healthy" if healthy else "dead")
+
+
+# Shared by all scrapers in this process
+health = HealthSnapshot(os.path.join(DATA_DIR, "scraper_health.json"))
@@ -1,8 +1,10 @@
-from typing import Callable
+import asyncio
+from typing import Callable, Dict, List, Optional, Tuple
 
 from src import logger
 from src.scrapers import ScraperType
-from src.types import Result
+from src.scrapers.health import health
+from src.types import RequestOutcome, Result, StockInfo
 from src.utils.validator import is_valid_stock
 
 
@@ -22,44 +24,256 @@ def scraper_instance(
     """
     # start scraper
     logger.info(f":: Starting scraper {scraper}...")
-    scraper.setup(cancel_func=cancel_func)
+    try:
+        scraper.setup(cancel_func=cancel_func)
+        scrape(scraper, symbol_func, result, cancel_func)
+    finally:
+        close_symbols(symbol_func)
+    record_dead(scraper)
 
+
+def scrape(
+    scraper: ScraperType,
+    symbol_func: Callable[[], str],
+    result: Result,
+    cancel_func: Callable[[], bool],
+) -> None:
+    """Scrapes batches until no symbols are left or the scraper stops working"""
     index = 0
     while True:
-        if not scraper.working:
-            logger.error(f":: {scraper} is not working. Ending thread.")
-            break
-
-        if cancel_func():
-            logger.debug(f":: Cancellation Signal {scraper}: No more symbols to scrape")
-            break
-
-        symbols = []
-        for _ in range(scraper.batch_size):
-            try:
-                symbols.append(symbol_func())
-            except IndexError:
-                # Deque empty
-                logger.debug(f":: {scraper} Queue empty: No more symbols to scrape")
-                break
-
+        symbols = next_symbols(scraper, symbol_func, cancel_func)
         if not symbols:
             break
 
         try:
-            symbol_data = scraper.get_data(symbols, cancel_func=cancel_func)
+            symbol_data, outcome = fetch_batch(scraper, symbols, cancel_func)
         except Exception as e:
             logger.exception(f":: {scraper}: {e}")
             result.failures.update({symbol: repr(scraper) for symbol in symbols})
+            finish_symbols(symbol_func, symbols)
+            adapt_batch_size(scraper, symbols, None)
+            if verify_health(scraper, None):
+                scraper.probe(cancel_func=cancel_func)
             continue
 
-        for symbol, stock_data in symbol_data.items():
-            if stock_data and is_valid_stock(stock_data):
+        index = submit_data(scraper, symbol_data, result, index)
+        adapt_batch_size(scraper, symbols, symbol_data, outcome)
+        finish_symbols(symbol_func, symbols)
+        if verify_health(scraper, symbol_data):
+            scraper.probe(cancel_func=cancel_func)
+        logger.info(":: Status: {} Symbols left.. ", len(symbol_func.__self__))
+
+
+async def async_scraper_instance(
+    scraper: ScraperType,
+    symbol_func: Callable[[], str],
+    result: Result,
+    cancel_func: Callable[[], bool],
+) -> None:
+    """
+    Async counterpart of scraper_instance, for the async scrapers.
+    Runs scraper.concurrency workers that share the scraper and its symbols,
+    so that many batches are in flight at once.
+    """
+    logger.info(f":: Starting scraper {scraper}...")
+    symbol_funcs = split_symbols(symbol_func, scraper.concurrency)
+    index = 0
+
+    async def worker(symbol_func: Callable[[], str]):
+        nonlocal index
+        try:
+            while True:
+                # a streaming scheduler blocks until the listing yields more symbols
+                symbols = await asyncio.to_thread(
+                    next_symbols, scraper, symbol_func, cancel_func
+                )
+                if not symbols:
+                    break
+
+                try:
+                    symbol_data, outcome = await scraper.afetch_batch(
+                        symbols, cancel_func=cancel_func
+                    )
+                except Exception as e:
+                    logger.exception(f":: {scraper}: {e}")
+                    failures = {symbol: repr(scraper) for symbol in symbols}
+                    result.failures.update(failures)
+                    finish_symbols(symbol_func, symbols)
+                    adapt_batch_size(scraper, symbols, None)
+                    if verify_health(scraper, None):
+                        await asyncio.to_thread(scraper.probe, cancel_func)
+                    continue
+
+                # the sink may wait on a full writer queue, keep that off the loop
+                index = await asyncio.to_thread(
+                    submit_data, scraper, symbol_data, result, index
+                )
+                adapt_batch_size(scraper, symbols, symbol_data, outcome)
+                finish_symbols(symbol_func, symbols)
+                if verify_health(scraper, symbol_data):
+                    await asyncio.to_thread(scraper.probe, cancel_func)
+                logger.info(":: Status: {} Symbols left.. ", len(symbol_func.__self__))
+        finally:
+            close_symbols(symbol_func)
+
+    try:
+        await asyncio.to_thread(scraper.setup, cancel_func)
+        await asyncio.gather(*(worker(func) for func in symbol_funcs))
+    finally:
+        for func in symbol_funcs:
+            close_symbols(func)
+    record_dead(scraper)
+
+
+def split_symbols(
+    symbol_func: Callable[[], str], count: int
+) -> List[Callable[[], str]]:
+    """
+    Symbol functions for count workers sharing a scraper.
+    A scheduler worker is split in count workers, so the scheduler measures
+    each one's throughput instead of counting them as a single worker.
+    """
+    source = symbol_func.__self__
+    if count == 1 or not hasattr(source, "scheduler"):
+        return [symbol_func] * count
+
+    workers = [source.scheduler.worker(f"{source.name}/{i}") for i in range(count)]
+    source.close()
+    return [worker.pop for worker in workers]
+
+
+def next_symbols(
+    scraper: ScraperType,
+    symbol_func: Callable[[], str],
+    cancel_func: Callable[[], bool],
+) -> List[str]:
+    """
+    Takes the next batch of symbols for the scraper.
+    An empty batch means the scraper should stop.
+    """
+    if not scraper.working:
+        logger.error(f":: {scraper} is not working. Ending thread.")
+        return []
+
+    if cancel_func():
+        logger.debug(":: Cancellation Signal {}: No more symbols to scrape", scraper)
+        return []
+
+    # scheduler workers hand out whole batches
+    source = symbol_func.__self__
+    if hasattr(source, "pop_batch"):
+        return source.pop_batch(scraper.batch_size)
+
+    symbols = []
+    for _ in range(scraper.batch_size):
+        try:
+            symbols.append(symbol_func())
+        except IndexError:
+            # Deque empty
+            logger.debug(":: {} Queue empty: No more symbols to scrape", scraper)
+            break
+    return symbols
+
+
+def fetch_batch(
+    scraper: ScraperType, symbols: List[str], cancel_func: Callable[[], bool]
+) -> Tuple[Dict[str, Optional[StockInfo]], Optional[RequestOutcome]]:
+    """
+    Scrapes a batch, with the outcome of its request when the scraper reports one.
+    Only batching scrapers do, their batch size controller needs it.
+    """
+    if hasattr(scraper, "fetch_batch"):
+        return scraper.fetch_batch(symbols, cancel_func=cancel_func)
+    return scraper.get_data(symbols, cancel_func=cancel_func), None
+
+
+def close_symbols(symbol_func: Callable[[], str]) -> None:
+    """Tells a scheduler worker that its scraper stopped"""
+    source = symbol_func.__self__
+    if hasattr(source, "close"):
+        source.close()
+
+
+def finish_symbols(symbol_func: Callable[[], str], symbols: List[str]) -> None:
+    """Tells a scheduler worker that the batch is processed"""
+    source = symbol_func.__self__
+    if hasattr(source, "finish_batch"):
+        source.finish_batch(symbols)
+
+
+def adapt_batch_size(
+    scraper: ScraperType,
+    symbols: List[str],
+    symbol_data: Optional[Dict[str, Optional[StockInfo]]],
+    outcome: Optional[RequestOutcome] = None,
+) -> None:
+    """
+    Feeds the outcome of a batch to the scraper's batch size controller, if any.
+    symbol_data None means the batch raised an exception.
+    outcome is the batch's own request, retries of its failures don't count.
+    """
+    controller = scraper.batch_controller
+    if controller is None:
+        return
+
+    latency = status_code = None
+    if outcome is not None:
+        latency, status_code = outcome.latency, outcome.status_code
+
+    if symbol_data is None:
+        failed, status_code = len(symbols), None
+    else:
+        failed = sum(1 for stock_data in symbol_data.values() if not stock_data)
+
+    scraper.batch_size = controller.record(
+        len(symbols), failed, latency=latency, status_code=status_code
+    )
+
+
+def submit_data(
+    scraper: ScraperType,
+    symbol_data: Dict[str, Optional[StockInfo]],
+    result: Result,
+    index: int,
+) -> int:
+    """
+    Adds valid stocks to result data, others to failures. Returns new index
+    With a sink, new stocks go to it and only their symbols are kept.
+    """
+    for symbol, stock_data in symbol_data.items():
+        if stock_data and is_valid_stock(stock_data):
+            if result.sink is None:
                 result.data.update({symbol: stock_data})
-                index += 1
-                logger.debug(f":: {scraper}: Added {symbol} | {index}")
-            else:
-                logger.warning(f":: {scraper}: Failed {symbol} | {index}")
-                result.failures.update({symbol: repr(scraper)})
+            elif symbol not in result.seen:
+                result.sink(stock_data)
+            result.seen.add(symbol)
+            index += 1
+            logger.debug(":: {}: Added {} | {}", scraper, symbol, index)
+        else:
+            logger.warning(":: {}: Failed {} | {}", scraper, symbol, index)
+            result.failures.update({symbol: repr(scraper)})
+    return index
+
+
+def verify_health(
+    scraper: ScraperType, symbol_data: Optional[Dict[str, Optional[StockInfo]]]
+) -> bool:
+    """
+    The first batch of a scraper started without a connection test checks its health.
+    Records a working batch, returns True when the connection needs testing instead.
+    """
+    if not getattr(scraper, "unverified", False):
+        return False
+
+    scraper.unverified = False
+    if symbol_data and any(symbol_data.values()):
+        health.record(scraper.health_key, True, proxy=scraper.session.proxy)
+        return False
+    logger.warning(f":: {scraper}: First batch failed, testing connection")
+    return True
+
 
-        logger.info(f":: Status: {len(symbol_func.__self__)} Symbols left.. ")
+def record_dead(scraper: ScraperType) -> None:
+    """A scraper that ended dead gets tested on its next start"""
+    if not scraper.working:
+        health.record(scraper.health_key, False)
@@ -4,47 +4,100 @@ StockAnalysis.com API
 - API doesnot require any cookies or auth.
 - However, it is little slower and needs rate limiting.
 - Response doesnot contain the full name of stock.
-- We primarily use listings cache, then fallback to just scraping the name from website.
+- We primarily use the in memory index of listings cache,
+  then fallback to just scraping the name from website.
+- A scraper healthy on its last run starts without the connection test,
+  its first batch is the health check.
 """
 
-import re
 import time
-from datetime import datetime
 from pprint import pformat
 from typing import Callable, Dict, List, Optional
 
 import lxml.html
-import pytz
 import requests
 
 from src import logger
-from src.databases import ListingCache
+from src.databases import name_index
+from src.scrapers.health import health
 from src.types import StockInfo
-from src.utils.proxy import RequestProxy
+from src.utils.proxy import new_session
+from src.utils.rate_limiter import get_rate_controller, get_rate_limiter
+from src.utils.timestamps import parse_market_time
 
 
 class StockAnalysisAPI:
-    def __init__(self, batch_size=1, use_proxy=False, rate_limit=0.0) -> None:
+    def __init__(
+        self,
+        batch_size=1,
+        use_proxy=False,
+        rate_limit=0.0,
+        burst=1,
+        proxy_lanes=1,
+        adaptive_rate=False,
+    ) -> None:
+        """
+        rate_limit: Seconds between requests, shared with scrapers on the same host
+          With proxy lanes, seconds between requests of each lane instead
+        burst: Requests allowed back to back before rate_limit applies
+        proxy_lanes: Proxies to spread requests over, when use_proxy is set
+        adaptive_rate: Tune the host's rate during the run, starting from rate_limit
+        """
         self.BASE_URL = "https://stockanalysis.com/api/quotes/s/{}"
         self.batch_size = batch_size
+        # batch requests are not supported, so there is no batch size to tune
+        self.batch_controller = None
         self.use_proxy = use_proxy
+        self.proxy_lanes = proxy_lanes
+        self.fan_out = use_proxy and proxy_lanes > 1
         self.rate_limit = rate_limit
+        self.burst = burst
+        self.rate_limiter = None
+        self.rate_controller = None
+        # each proxy lane is rate limited on its own by the session
+        if rate_limit and adaptive_rate and not self.fan_out:
+            self.rate_controller = get_rate_controller(
+                self.BASE_URL, 1 / rate_limit, burst
+            )
+            self.rate_limiter = self.rate_controller.bucket
+        elif rate_limit and not self.fan_out:
+            self.rate_limiter = get_rate_limiter(self.BASE_URL, 1 / rate_limit, burst)
 
     def setup(self, cancel_func: Callable[[], bool] = lambda: False) -> None:
         """
         Setup the scraper, create proxy session, test connection
+        unless the scraper was healthy recently
         """
         self.working = True
-        self.session = RequestProxy(use_proxy=self.use_proxy, cancel_func=cancel_func)
+        self.session = self.new_session(
+            cancel_func, proxy=health.last_proxy(self.health_key)
+        )
+        self.unverified = health.healthy(self.health_key)
+        if self.unverified:
+            logger.info(f":: {self}: Healthy last run, skipping connection test")
+            return
+        self.probe(cancel_func=cancel_func)
+
+    def probe(self, cancel_func: Callable[[], bool] = lambda: False) -> None:
+        """Tests the connection, retrying once with a new proxy if it fails"""
         if not self.test_connection(cancel_func=cancel_func):
             # Retry a new proxy once
-            self.session = RequestProxy(
-                use_proxy=self.use_proxy, cancel_func=cancel_func
-            )
+            self.session = self.new_session(cancel_func)
             if not self.test_connection(cancel_func=cancel_func):
                 # if still not working
                 logger.error(":: Setting Scraper as Dead")
                 self.working = False
+        health.record(self.health_key, self.working, proxy=self.session.proxy)
+
+    def new_session(self, cancel_func: Callable[[], bool], proxy=None):
+        return new_session(
+            use_proxy=self.use_proxy,
+            lanes=self.proxy_lanes,
+            rate_limit=self.rate_limit,
+            burst=self.burst,
+            cancel_func=cancel_func,
+            proxy=proxy,
+        )
 
     def get_data(
         self, symbols: List[str], cancel_func: Callable[[], bool] = lambda: False
@@ -55,6 +108,8 @@ class StockAnalysisAPI:
         """
         if not symbols:
             return {}
+        # resolve any unseen names of the batch in one lookup
+        name_index.lookup(symbols)
         data = self._get_data(symbols[0], cancel_func=cancel_func)
         return {symbols[0]: data}
 
@@ -65,29 +120,43 @@ class StockAnalysisAPI:
         Builds a url, header pair and makes a request.
         if successful, converts the data to our uniform format.
         """
-        if self.rate_limit:
-            time.sleep(self.rate_limit)
-
         url, headers = self.BASE_URL.format(symbol), self.get_headers()
+        # retries take their own token of the host's budget
         response = self.session.request(
-            "get", url, headers=headers, cancel_func=cancel_func
+            "get",
+            url,
+            headers=headers,
+            cancel_func=cancel_func,
+            rate_limiter=self.rate_limiter,
         )
+        return self.parse_response(response, symbol)
 
+    def parse_response(
+        self, response: requests.Response, symbol: str
+    ) -> Optional[StockInfo]:
+        """
+        Converts a quote response to our uniform format.
+        Shared by the sync and async request paths.
+        """
         data = None
         try:
             data = response.json()
         except requests.exceptions.JSONDecodeError as e:
-            logger.warning(f":: {self} failed {symbol}: {response.status_code} {e}")
+            logger.warning(
+                ":: {} failed {}: {} {}", self, symbol, response.status_code, e
+            )
             return None
 
         if response.status_code == 200:
+            if self.rate_controller:
+                self.rate_controller.record(True)
             return self.convert_data(data.get("data"), symbol)
         elif response.status_code == 407 or self.session.disabled:
             # This is our own response for proxy failure.
             logger.error(f":: {self} Failure with proxy, making scraper dead")
             self.working = False
 
-        logger.warning(f":: {self} failed {symbol}: {response.status_code}")
+        logger.warning(":: {} failed {}: {}", self, symbol, response.status_code)
         return None
 
     def convert_data(self, stock_info: dict, symbol: str) -> Optional[StockInfo]:
@@ -112,8 +181,10 @@ class StockAnalysisAPI:
             value = stock_info.get(old_key)
 
             if not value:
-                logger.warning(f":: {self}: {symbol} Failed to get {new_key}:{old_key}")
-                logger.debug(pformat(stock_info))
+                logger.warning(
+                    ":: {}: {} Failed to get {}:{}", self, symbol, new_key, old_key
+                )
+                logger.opt(lazy=True).debug("{}", lambda: pformat(stock_info))
                 return None
 
             new_data[new_key] = value
@@ -135,7 +206,8 @@ class StockAnalysisAPI:
             logger.exception(e)
             data = None
 
-        if data:
+        # failed symbols are still in the result, as None
+        if data and any(data.values()):
             logger.info(f":: Connection to {self} successful")
             return True
         else:
@@ -157,19 +229,18 @@ class StockAnalysisAPI:
         return headers
 
     def get_name(self, symbol: str) -> Optional[str]:
-        "Get name from listing cache database, if not found, scrape it"
-        try:
-            db = ListingCache()
-            name = db.get_name(symbol)[0]
-        except Exception as e:
-            name = None
+        "Get name from listing cache index, if not found, scrape it"
+        name = name_index.get(symbol)
 
         if not name:
             name = self.scrape_name(symbol)
+            if name:
+                name_index.update({symbol: name})
         return name
 
     def scrape_name(self, symbol: str) -> Optional[str]:
-        time.sleep(1)
+        if not self.rate_limiter and not self.fan_out:
+            time.sleep(1)
         url = f"https://stockanalysis.com/stocks/{symbol}/"
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:109.0) Gecko/20100101 Firefox/114.0",
@@ -186,7 +257,10 @@ class StockAnalysisAPI:
         }
         response, title = None, None
         try:
-            response = self.session.request("get", url, headers=headers)
+            # same host as the api, so take tokens from the same bucket
+            response = self.session.request(
+                "get", url, headers=headers, rate_limiter=self.rate_limiter
+            )
             tree = lxml.html.fromstring(response.content)
             title = tree.xpath('//*[@id="main"]/div[1]/div[1]/div[1]/h1')
             name = title[0].text_content().split("(")[0].strip()
@@ -201,28 +275,16 @@ class StockAnalysisAPI:
             return None
 
         # convert 'Jun 6, 2023, 4:00 PM', or 'Jun 6, 2023, 4:00 AM EDT' etc to timestamp
-        # Use regular expressions to extract the date and time
-        pattern = r"([A-Za-z]{3} \d{1,2}, \d{4}, \d{1,2}:\d{2} [APM]{2})"
-        matches = re.findall(pattern, raw_date)
-        if matches:
-            # Extract the first match
-            raw_date = matches[0]
-        else:
+        utc_timestamp = parse_market_time(raw_date)
+        if utc_timestamp is None:
             logger.error(f":: {self} parse_date failed: regex {raw_date}")
-            return None
-
-        # Parse the market time string
-        date = datetime.strptime(raw_date, "%b %d, %Y, %I:%M %p")
-        exchange_timezone = pytz.timezone("America/New_York")
-        # set the parsed date's timezone
-        date = exchange_timezone.localize(date)
-
-        # Create a UTC timezone
-        utc_timezone = pytz.timezone("UTC")
-        utc_timestamp = int(date.astimezone(utc_timezone).timestamp())
-
         return utc_timestamp
 
+    @property
+    def health_key(self) -> str:
+        """Direct and proxy scrapers keep separate health records"""
+        return str(self)
+
     def __repr__(self):
         return self.__class__.__name__
 
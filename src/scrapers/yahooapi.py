@@ -8,106 +8,298 @@ Yahoo API
 
 NOTE: The cookie surprisingly does not expire(till 1 yr), so it can be stored and reused
 This means, we dont have to spin up a playwright instance as often.
+- Cookie and crumb are shared by all yahoo scrapers through a CredentialManager,
+  so only one of them launches playwright when they need regenerating.
+- A scraper healthy on its last run, with credentials that worked recently,
+  starts without the connection test. Its first batch is the health check.
+- Quotes are requested with formatted=false, so numbers arrive as plain values
+  instead of {raw, fmt, longFmt} objects, and only the mapped fields are read.
 """
-import json
-import os
 import time
 import urllib.parse
-from datetime import datetime
 from pprint import pformat
-from typing import Callable, Dict, List, Optional, Tuple
+from typing import Callable, Dict, Generator, List, Optional, Tuple
 
-import pytz
+import requests
 
 from src import logger
-from src.types import StockInfo
+from src.scrapers.health import health
+from src.types import RequestOutcome, StockInfo
+from src.utils.batching import BatchSizeController, pack_symbols
 from src.utils.cookie_getter import get_browser_cookie
-from src.utils.proxy import RequestProxy
+from src.utils.credentials import CredentialManager
+from src.utils.json_decode import loads
+from src.utils.proxy import new_session
+from src.utils.rate_limiter import get_rate_controller, get_rate_limiter
+from src.utils.timestamps import epoch_seconds
 from src.utils.validator import is_valid_stock
 
+# Shared by all yahoo scrapers in this process
+credentials = CredentialManager("cookie.json")
+
+# Quote fields in StockInfo order, name and timestamp are derived
+QUOTE_FIELDS = (
+    "symbol",
+    "marketCap",
+    "regularMarketPrice",
+    "regularMarketVolume",
+    "regularMarketDayHigh",
+    "regularMarketDayLow",
+    "regularMarketOpen",
+    "regularMarketPreviousClose",
+)
+
 
 class YahooAPI:
-    def __init__(self, batch_size=10, use_proxy=False, rate_limit=0.0) -> None:
+    def __init__(
+        self,
+        batch_size=10,
+        use_proxy=False,
+        rate_limit=0.0,
+        burst=1,
+        adaptive_batch=False,
+        max_batch_size=200,
+        max_url_length=2000,
+        retry_budget=10,
+        proxy_lanes=1,
+        adaptive_rate=False,
+    ) -> None:
+        """
+        rate_limit: Seconds between requests, shared with scrapers on the same host
+          With proxy lanes, seconds between requests of each lane instead
+        burst: Requests allowed back to back before rate_limit applies
+        adaptive_batch: Tune batch_size during the run, starting from batch_size
+        max_url_length: Batches with longer request urls are split up
+        retry_budget: Max requests spent on retrying the failures of a batch
+        proxy_lanes: Proxies to spread requests over, when use_proxy is set
+        adaptive_rate: Tune the host's rate during the run, starting from rate_limit
+        """
         self.BASE_URL = "https://query1.finance.yahoo.com/v7/finance/quote"
         self.batch_size = batch_size
+        self.batch_controller = (
+            BatchSizeController(batch_size, max_size=max_batch_size)
+            if adaptive_batch
+            else None
+        )
+        self.max_url_length = max_url_length
+        self.last_response_ok = False
+        self.retry_budget = retry_budget
+        self.retry_stats = {"requests": 0, "saved": 0}
         self.use_proxy = use_proxy
+        self.proxy_lanes = proxy_lanes
+        self.fan_out = use_proxy and proxy_lanes > 1
         self.rate_limit = rate_limit
-        self.cookie_file_path = "cookie.json"
+        self.burst = burst
+        self.rate_limiter = None
+        self.rate_controller = None
+        # each proxy lane is rate limited on its own by the session
+        if rate_limit and adaptive_rate and not self.fan_out:
+            self.rate_controller = get_rate_controller(
+                self.BASE_URL, 1 / rate_limit, burst
+            )
+            self.rate_limiter = self.rate_controller.bucket
+        elif rate_limit and not self.fan_out:
+            self.rate_limiter = get_rate_limiter(self.BASE_URL, 1 / rate_limit, burst)
 
     def setup(self, cancel_func: Callable[[], bool] = lambda: False) -> None:
         self.working = True
-        self.session = RequestProxy(use_proxy=self.use_proxy, cancel_func=cancel_func)
-        self.cookie_cred = self.load_default_cookie()
+        self.session = new_session(
+            use_proxy=self.use_proxy,
+            lanes=self.proxy_lanes,
+            rate_limit=self.rate_limit,
+            burst=self.burst,
+            cancel_func=cancel_func,
+            proxy=health.last_proxy(self.health_key),
+        )
+        self.cookie_cred = credentials.get(self.regenerate_cookie)
+        # healthy recently, the first batch tests the connection instead
+        self.unverified = health.healthy(self.health_key) and credentials.trusted(
+            self.cookie_cred
+        )
+        if self.unverified:
+            logger.info(f":: {self}: Healthy last run, skipping connection test")
+            return
+        self.probe(cancel_func=cancel_func)
+
+    def probe(self, cancel_func: Callable[[], bool] = lambda: False) -> None:
+        """Tests the connection, regenerating the cookie once if it fails"""
         # refresh default cookie if not working
         if not self.test_connection(cancel_func=cancel_func):
-            self.cookie_cred = self.regenerate_cookie()
+            self.cookie_cred = credentials.regenerate(
+                self.regenerate_cookie, stale=self.cookie_cred
+            )
             # if still not working, then set works to False
             if not self.test_connection(cancel_func=cancel_func):
                 logger.error(f":: Setting {self} as Dead")
                 self.working = False
+        health.record(self.health_key, self.working, proxy=self.session.proxy)
 
     def get_data(
         self, symbols: List[str], cancel_func: Callable[[], bool] = lambda: False
     ) -> Dict[str, Optional[StockInfo]]:
         """
         Receives and Tries multiple symbols at once
-        For those symbols that failed, tries one by one
+        For those symbols that failed, narrows them down by bisection
         Then returns all data
         """
-        result: Dict[str, StockInfo] = {symbol: None for symbol in symbols}
-        data = self._get_data(symbols, cancel_func=cancel_func)
+        return self.fetch_batch(symbols, cancel_func=cancel_func)[0]
 
-        failures = []
-        for stock_data, symbol in zip(data, symbols):
-            if stock_data and is_valid_stock(stock_data):
-                result[symbol] = stock_data
-            else:
-                failures.append(symbol)
+    def fetch_batch(
+        self, symbols: List[str], cancel_func: Callable[[], bool] = lambda: False
+    ) -> Tuple[Dict[str, Optional[StockInfo]], RequestOutcome]:
+        """get_data, along with the outcome of the batch request, not its retries"""
+        batches = self.pack_symbols(symbols)
+        if len(batches) > 1:
+            result, outcomes = {}, []
+            for batch in batches:
+                data, outcome = self.fetch_batch(batch, cancel_func=cancel_func)
+                result.update(data)
+                outcomes.append(outcome)
+            return result, RequestOutcome.merge(outcomes)
 
+        result: Dict[str, StockInfo] = {symbol: None for symbol in symbols}
+        data, outcome = self._get_data(symbols, cancel_func=cancel_func)
+
+        failures = self.collect_data(result, data, symbols)
         if not failures:
-            return result
+            return result, outcome
 
-        # first pass try all failures at once
-        failures_data = self._get_data(failures, cancel_func=cancel_func)
+        plan = self.bisect_failures(failures)
+        try:
+            batch = next(plan)
+            while True:
+                data, retry = self._get_data(batch, cancel_func=cancel_func)
+                failed = self.collect_data(result, data, batch)
+                batch = plan.send((failed, retry.ok))
+        except StopIteration:
+            pass
+
+        return result, outcome
+
+    def bisect_failures(
+        self, failures: List[str]
+    ) -> Generator[List[str], Tuple[List[str], bool], None]:
+        """
+        Plans retries of failed symbols, shared by the sync and async request paths.
+        Yields batches to request, and is sent back (failed symbols, response ok).
+        - First all failures are retried at once, transient errors clear up here.
+        - A symbol failing inside an ok response was answered, and is just bad.
+        - A failed response of many symbols may be caused by a few of them,
+          so it is split in halves and retried, finding k bad ones in O(k log n).
+        - At most retry_budget requests are made, the rest stay failed.
+        """
+        pending = [failures]
+        used = 0
+        fallback_cost = None
+        while pending and used < self.retry_budget:
+            batch = pending.pop()
+            failed, response_ok = yield batch
+            used += 1
+
+            if fallback_cost is None:
+                # previous strategy: this batch retry, then one request per failure
+                fallback_cost = 1 + len(failed)
+
+            if response_ok or len(failed) < 2:
+                continue
+            middle = len(failed) // 2
+            pending += [failed[middle:], failed[:middle]]
+
+        if fallback_cost is None:
+            return
+        self.retry_stats["requests"] += used
+        self.retry_stats["saved"] += fallback_cost - used
+        logger.debug(
+            ":: {} Retried {} failures with {} requests, saved {}",
+            self,
+            len(failures),
+            used,
+            fallback_cost - used,
+        )
 
-        # second pass try one by one if still failed
-        for stock_data, symbol in zip(failures_data, failures):
+    def pack_symbols(self, symbols: List[str]) -> List[List[str]]:
+        """Splits symbols into batches whose request url fits max_url_length"""
+        base_length = len(self.build_request([])[0])
+        return pack_symbols(symbols, base_length, self.max_url_length)
+
+    def collect_data(
+        self,
+        result: Dict[str, Optional[StockInfo]],
+        data: List[Optional[StockInfo]],
+        symbols: List[str],
+    ) -> List[str]:
+        """Adds valid stocks to result, returns the symbols that failed"""
+        failures = []
+        for stock_data, symbol in zip(data, symbols):
             if stock_data and is_valid_stock(stock_data):
                 result[symbol] = stock_data
             else:
-                # try individually again, then add anyway
-                stock_data = self._get_data([symbol], cancel_func=cancel_func)[0]
-                result[symbol] = stock_data
-
-        return result
+                failures.append(symbol)
+        return failures
 
     def _get_data(
         self, symbols: List[str], cancel_func: Callable[[], bool] = lambda: False
-    ) -> List[Optional[StockInfo]]:
+    ) -> Tuple[List[Optional[StockInfo]], RequestOutcome]:
         """
         Builds a url, header pair and makes a request.
         if successful, converts the data to our uniform format.
         """
-        if self.rate_limit:
-            time.sleep(self.rate_limit)
-
         # normalize symbol eg BRK.B -> BRK-B
         symbols = [symbol.replace(".", "-") for symbol in symbols]
 
         url, headers = self.build_request(symbols)
+        started = time.monotonic()
+        # retries take their own token of the host's budget
         response = self.session.request(
-            "get", url, headers=headers, cancel_func=cancel_func
+            "get",
+            url,
+            headers=headers,
+            cancel_func=cancel_func,
+            rate_limiter=self.rate_limiter,
         )
+        latency = time.monotonic() - started
+        return self.parse_outcome(response, symbols, latency)
+
+    def parse_outcome(
+        self, response: requests.Response, symbols: List[str], latency: float
+    ) -> Tuple[List[Optional[StockInfo]], RequestOutcome]:
+        data = self.parse_response(response, symbols)
+        # read right after parsing, before another request of this scraper can finish
+        outcome = RequestOutcome(response.status_code, latency, self.last_response_ok)
+        return data, outcome
+
+    def parse_response(
+        self, response: requests.Response, symbols: List[str]
+    ) -> List[Optional[StockInfo]]:
+        """
+        Converts a quote response of normalized symbols to our uniform format.
+        Shared by the sync and async request paths.
+        """
         api_error = None
+        self.last_response_ok = False
 
         if response.status_code == 200:
-            data = response.json()
+            data = loads(response.content)
             api_error = data["quoteResponse"]["error"]
             result_data = data["quoteResponse"]["result"]
+            # an answered request, even if some symbols are unknown to yahoo
+            self.last_response_ok = api_error is None and result_data is not None
+            if self.last_response_ok:
+                credentials.mark_valid(self.cookie_cred)
+            if self.rate_controller:
+                # nothing found for many symbols at once is yahoo throttling us
+                if result_data:
+                    self.rate_controller.record(True)
+                elif len(symbols) > 1:
+                    self.rate_controller.record(False)
             if api_error is None and result_data:
+                # unknown symbols are left out of the result, so match by symbol
+                symbols_info = {info.get("symbol"): info for info in result_data}
                 converted_data = [
-                    self.convert_data(stock_info, symbol)
-                    for stock_info, symbol in zip(result_data, symbols)
+                    self.convert_data(symbols_info[symbol], symbol)
+                    if symbol in symbols_info
+                    else None
+                    for symbol in symbols
                 ]
                 return converted_data
 
@@ -116,8 +308,13 @@ class YahooAPI:
             logger.error(f":: {self} Failure with proxy, making scraper dead")
             self.working = False
         else:
-            logger.warning(
-                f":: {self} Failed {symbols}: {response.status_code} {response.text} {api_error}"
+            logger.opt(lazy=True).warning(
+                ":: {} Failed {}: {} {} {}",
+                lambda: self,
+                lambda: symbols,
+                lambda: response.status_code,
+                lambda: response.text,
+                lambda: api_error,
             )
 
         failed_data: List[Optional[StockInfo]] = [None] * len(symbols)
@@ -125,42 +322,26 @@ class YahooAPI:
 
     def convert_data(self, stock_info: dict, symbol: str) -> Optional[StockInfo]:
         # favor longer name and fallback to shorter name or displayName
-        stock_info["name"] = (
+        name = (
             stock_info.get("longName")
             or stock_info.get("shortName")
             or stock_info.get("displayName")
         )
-
-        conversion_map = {
-            "name": "name",
-            "symbol": "symbol",
-            "marketCap": "marketcap",
-            "regularMarketPrice": "price",
-            "regularMarketVolume": "volume",
-            "regularMarketDayHigh": "highprice",
-            "regularMarketDayLow": "lowprice",
-            "regularMarketOpen": "open",
-            "regularMarketPreviousClose": "prevclose",
-        }
-
-        new_data = {}
-        for old_key, new_key in conversion_map.items():
-            value = stock_info.get(old_key)
-            if not value:
-                # if any one value is missing, then skip this stock
-                logger.warning(f":: {self} {symbol}: Failed to get {old_key}")
-                logger.debug(pformat(stock_info))
-                break
-            # for values with multi forms, prefer the raw form
+        values = []
+        for key in ("name",) + QUOTE_FIELDS:
+            value = name if key == "name" else stock_info.get(key)
+            # formatted responses wrap values as {raw, fmt}, prefer the raw form
             if isinstance(value, dict):
                 value = value.get("raw")
-            new_data[new_key] = value
-        else:
-            # Derive timestamp
-            new_data["timestamp"] = self.parse_date(stock_info)
-            return StockInfo(**new_data)
+            if not value:
+                # if any one value is missing, then skip this stock
+                logger.warning(":: {} {}: Failed to get {}", self, symbol, key)
+                logger.opt(lazy=True).debug("{}", lambda: pformat(stock_info))
+                return None
+            values.append(value)
 
-        return None
+        # Derive timestamp
+        return StockInfo(*values, timestamp=self.parse_date(stock_info))
 
     def test_connection(self, cancel_func: Callable[[], bool]) -> bool:
         logger.info(f":: Testing connection to {self}")
@@ -171,7 +352,8 @@ class YahooAPI:
         except Exception as e:
             logger.exception(e)
 
-        if data:
+        # failed symbols are still in the result, as None
+        if data and any(data.values()):
             logger.info(f":: Connection to {self} successful")
             return True
         else:
@@ -192,13 +374,11 @@ class YahooAPI:
             "regularMarketDayLow",
             "regularMarketOpen",
             "regularMarketPreviousClose",
-            "gmtOffSetMilliseconds",
-            "exchangeTimezoneName",
             "regularMarketTime",
         ]
         query_params = {
             "symbols": ",".join(symbols),
-            "formatted": "true",
+            "formatted": "false",
             "crumb": crumb,
             "lang": "en-US",
             "region": "US",
@@ -251,10 +431,6 @@ class YahooAPI:
 
         cookie_data = {"cookie": cookie, "crumb": crumb}
         logger.info(f":: {self}: Generated new cookie {cookie_str}")
-
-        with open(self.cookie_file_path, "w") as f:
-            json.dump(cookie_data, f)
-
         return cookie_data
 
     def get_crumb(self, cookie: str) -> Optional[str]:
@@ -282,27 +458,14 @@ class YahooAPI:
         else:
             return None
 
-    def load_default_cookie(self) -> dict:
-        if not os.path.exists(self.cookie_file_path):
-            return self.regenerate_cookie()
-        with open(self.cookie_file_path) as rf:
-            return json.load(rf)
-
     def parse_date(self, data) -> int:
-        exchange_timezone_name = data["exchangeTimezoneName"]
-        regular_market_time_raw = data["regularMarketTime"]["raw"]
-
-        exchange_timezone = pytz.timezone(exchange_timezone_name)
-        # Convert regular_market_time_raw to datetime
-        regular_market_time = datetime.fromtimestamp(regular_market_time_raw)
-        # Convert regular market time to the specified time zone
-        regular_market_time = regular_market_time.astimezone(exchange_timezone)
-
-        # Create a UTC timezone
-        utc_timezone = pytz.timezone("UTC")
-        utc_timestamp = int(regular_market_time.astimezone(utc_timezone).timestamp())
+        # regularMarketTime is already a utc epoch, whatever the exchange timezone
+        return epoch_seconds(data["regularMarketTime"])
 
-        return utc_timestamp
+    @property
+    def health_key(self) -> str:
+        """Direct and proxy scrapers keep separate health records"""
+        return str(self)
 
     def __repr__(self):
         return self.__class__.__name__
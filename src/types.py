@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import Dict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Set
 
 
 @dataclass(frozen=True)
@@ -16,7 +16,46 @@ class StockInfo:
     timestamp: int
 
 
+@dataclass(frozen=True)
+class SaveResult:
+    inserted: int
+    skipped: int
+
+
+@dataclass(frozen=True)
+class RequestOutcome:
+    # None when the request raised
+    status_code: Optional[int]
+    latency: float
+    # answered, even if some symbols are unknown
+    ok: bool
+
+    @classmethod
+    def merge(cls, outcomes: List["RequestOutcome"]) -> "RequestOutcome":
+        """One outcome for requests made for the same batch"""
+        failed = [o for o in outcomes if not o.ok]
+        return cls(
+            status_code=(failed or outcomes)[0].status_code,
+            latency=max(o.latency for o in outcomes),
+            ok=not failed,
+        )
+
+
+@dataclass
+class ListingSnapshot:
+    # symbol to name, in listing order
+    symbols: Dict[str, str]
+    fetched_at: float
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
 @dataclass
 class Result:
     data: Dict[str, StockInfo]
     failures: Dict[str, str]
+    # receives each newly scraped stock, eg. to stream it to databases,
+    # data is then left empty so memory doesn't grow with the listing
+    sink: Optional[Callable[[StockInfo], None]] = None
+    # symbols scraped so far, with or without a sink
+    seen: Set[str] = field(default_factory=set)
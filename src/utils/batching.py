@@ -0,0 +1,100 @@
+"""
+Batch sizing for scrapers that support batch requests.
+- BatchSizeController grows the batch size while requests are fast and clean,
+  and shrinks it on errors, error responses or slow responses.
+- pack_symbols splits symbols into batches whose request url stays under a length limit.
+"""
+from typing import List, Optional
+from urllib.parse import quote_plus
+
+from src import logger
+
+
+class BatchSizeController:
+    def __init__(
+        self,
+        initial: int,
+        min_size=1,
+        max_size=200,
+        step=5,
+        target_latency=3.0,
+        max_error_rate=0.2,
+        patience=2,
+        smoothing=0.3,
+    ) -> None:
+        """
+        step: Symbols added after `patience` healthy batches in a row
+        target_latency: Seconds per request above which batches shrink by a step
+        max_error_rate: Smoothed share of failed symbols above which batches halve
+        """
+        self.size = initial
+        self.min_size = min_size
+        self.max_size = max_size
+        self.step = step
+        self.target_latency = target_latency
+        self.max_error_rate = max_error_rate
+        self.patience = patience
+        self.smoothing = smoothing
+        self.error_rate = 0.0
+        self.healthy_streak = 0
+
+    def record(
+        self,
+        size: int,
+        failed: int,
+        latency: Optional[float] = None,
+        status_code: Optional[int] = None,
+    ) -> int:
+        """
+        Takes the outcome of one batch, returns the batch size to use next.
+        status_code None means the request raised an exception.
+        """
+        if size:
+            rate = failed / size
+            self.error_rate += self.smoothing * (rate - self.error_rate)
+
+        old_size = self.size
+        if status_code is None or status_code >= 400:
+            self.size //= 2
+            self.healthy_streak = 0
+        elif self.error_rate > self.max_error_rate:
+            self.size //= 2
+            self.healthy_streak = 0
+        elif latency is not None and latency > self.target_latency:
+            self.size -= self.step
+            self.healthy_streak = 0
+        else:
+            self.healthy_streak += 1
+            # only grow once the current size has been filled
+            if self.healthy_streak >= self.patience and size >= self.size:
+                self.size += self.step
+                self.healthy_streak = 0
+
+        self.size = max(self.min_size, min(self.max_size, self.size))
+        if self.size != old_size:
+            logger.debug(f":: BatchSize: {old_size} -> {self.size}")
+        return self.size
+
+
+def pack_symbols(
+    symbols: List[str], base_length: int, max_length: int
+) -> List[List[str]]:
+    """
+    Splits symbols into batches, so that each batch's comma separated,
+    url encoded symbols fit in max_length along with base_length of the rest of url
+    """
+    batches: List[List[str]] = []
+    batch: List[str] = []
+    length = base_length
+    for symbol in symbols:
+        # each symbol costs its encoding and an encoded comma, %2C
+        cost = len(quote_plus(symbol)) + (3 if batch else 0)
+        if batch and length + cost > max_length:
+            batches.append(batch)
+            batch, length, cost = [], base_length, cost - 3
+        batch.append(symbol)
+        length += cost
+
+    if batch:
+        batches.append(batch)
+    return batches
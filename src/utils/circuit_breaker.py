@@ -0,0 +1,146 @@
+"""
+Backoff and circuit breaking for hosts that throttle us, shared per host.
+- Retries wait a jittered exponential backoff, at least as long as Retry-After asks.
+- Every scraper hitting the same host shares its circuit breaker,
+  so once the host throttles us repeatedly they all stop, not just the one that saw it.
+- closed: Requests go through. `threshold` throttled responses in a row open it.
+- open: Requests wait until the cooldown is over, then one goes through as a probe.
+- half open: The probe's outcome closes the circuit, or opens it again
+  with a doubled cooldown.
+- Each breaker counts retries, seconds spent backing off and waiting on it.
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+from src import logger
+from src.utils.rate_limiter import host_key
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half open"
+
+
+def backoff_delay(
+    attempt: int, base=0.5, cap=30.0, retry_after: Optional[float] = None
+) -> float:
+    """Full jitter exponential backoff, never shorter than retry_after"""
+    delay = random.uniform(0, min(cap, base * 2**attempt))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, cap))
+    return delay
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header, given as seconds or a date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, threshold=3, cooldown=5.0, max_cooldown=120.0):
+        """
+        threshold: Throttled responses in a row that open the circuit
+        cooldown: Seconds the circuit first stays open, doubled on every failed probe
+        """
+        self.name = name
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.throttled_streak = 0
+        self.open_until = 0.0
+        self.condition = threading.Condition()
+        # counters
+        self.trips = 0
+        self.retries = 0
+        self.backoff = 0.0
+        self.waited = 0.0
+
+    def allow(self) -> None:
+        """Waits until a request may go to the host"""
+        started = time.monotonic()
+        with self.condition:
+            while self.state != CLOSED:
+                now = time.monotonic()
+                if self.state == OPEN and now >= self.open_until:
+                    # this caller probes the host, the others wait for its outcome
+                    self.state = HALF_OPEN
+                    break
+                timeout = self.open_until - now if self.state == OPEN else None
+                self.condition.wait(timeout)
+            self.waited += time.monotonic() - started
+
+    def succeeded(self) -> None:
+        with self.condition:
+            if self.state != CLOSED:
+                logger.info(f":: CircuitBreaker {self.name}: Closed")
+            self.state = CLOSED
+            self.throttled_streak = 0
+            self.cooldown = self.base_cooldown
+            self.condition.notify_all()
+
+    def throttled(self, retry_after: Optional[float] = None) -> None:
+        with self.condition:
+            self.throttled_streak += 1
+            if self.state == OPEN:
+                # answers to requests sent before it opened
+                if retry_after:
+                    self.open_until = max(
+                        self.open_until, time.monotonic() + retry_after
+                    )
+                return
+            if self.state == HALF_OPEN:
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            elif self.throttled_streak < self.threshold:
+                return
+
+            cooldown = max(self.cooldown, retry_after or 0.0)
+            self.state = OPEN
+            self.open_until = time.monotonic() + cooldown
+            self.trips += 1
+            logger.warning(f":: CircuitBreaker {self.name}: Open for {cooldown:.1f}s")
+            self.condition.notify_all()
+
+    def abandoned(self) -> None:
+        """A request ended without an answer from the host, eg a proxy error"""
+        with self.condition:
+            if self.state == HALF_OPEN:
+                # let the next caller probe instead
+                self.state = OPEN
+                self.condition.notify_all()
+
+    def record_backoff(self, seconds: float) -> None:
+        with self.condition:
+            self.retries += 1
+            self.backoff += seconds
+
+    def __repr__(self):
+        return (
+            f"CircuitBreaker({self.name}, {self.state}, trips={self.trips}, "
+            f"retries={self.retries}, backoff={self.backoff:.1f}s, "
+            f"waited={self.waited:.1f}s)"
+        )
+
+
+circuit_breakers: Dict[str, CircuitBreaker] = {}
+registry_lock = threading.Lock()
+
+
+def get_circuit_breaker(url: str, via: Optional[str] = None) -> CircuitBreaker:
+    """Returns the breaker shared by all requests to the host of url, through `via`"""
+    host = host_key(url, via)
+    with registry_lock:
+        breaker = circuit_breakers.get(host)
+        if breaker is None:
+            breaker = circuit_breakers[host] = CircuitBreaker(host)
+        return breaker
@@ -0,0 +1,83 @@
+"""
+Cookie and crumb credentials shared by all scrapers of a site in this process.
+- Loaded from the cookie file once, then held in memory.
+- Regeneration is single flight: the first caller generates new credentials,
+  callers waiting meanwhile get its result instead of generating again.
+- The cookie file is written atomically, along with when the credentials
+  were created and last verified to work.
+- Credentials verified within trust_for seconds are trusted without a test request.
+  When they stop working, how long they lasted is logged.
+"""
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from src import logger
+from src.utils.state import load_state, save_state
+
+Credentials = Dict
+
+
+class CredentialManager:
+    def __init__(self, path: str, trust_for=24 * 60 * 60, persist_interval=600.0):
+        """
+        path: Json file the credentials are kept in between runs
+        trust_for: Seconds after a successful request the credentials are trusted
+        persist_interval: Min seconds between writes of the last verified time
+        """
+        self.path = path
+        self.trust_for = trust_for
+        self.persist_interval = persist_interval
+        self.credentials: Optional[Credentials] = None
+        self.lock = threading.Lock()
+        self.persisted_at = 0.0
+
+    def get(self, generate: Callable[[], Credentials]) -> Credentials:
+        """Current credentials, loaded from the file or generated if there are none"""
+        with self.lock:
+            if self.credentials is None:
+                self.credentials = load_state(self.path)
+            if self.credentials is None:
+                self.credentials = self.generate(generate)
+            return self.credentials
+
+    def regenerate(
+        self, generate: Callable[[], Credentials], stale: Credentials
+    ) -> Credentials:
+        """
+        Replaces the stale credentials a caller found not working.
+        If they were already replaced meanwhile, returns the replacement.
+        """
+        with self.lock:
+            if self.credentials is not stale and self.credentials is not None:
+                logger.debug(":: Credentials: Already regenerated, reusing")
+                return self.credentials
+
+            created_at = stale.get("created_at")
+            if created_at:
+                lasted = (time.time() - created_at) / 3600
+                logger.info(f":: Credentials: Stopped working after {lasted:.1f} hours")
+            self.credentials = self.generate(generate)
+            return self.credentials
+
+    def generate(self, generate: Callable[[], Credentials]) -> Credentials:
+        credentials = dict(generate(), created_at=time.time(), verified_at=None)
+        if credentials.get("crumb"):
+            save_state(self.path, credentials)
+        return credentials
+
+    def mark_valid(self, credentials: Credentials) -> None:
+        """Records that a request with the credentials worked"""
+        with self.lock:
+            if credentials is not self.credentials:
+                return
+            now = time.time()
+            credentials["verified_at"] = now
+            if now - self.persisted_at >= self.persist_interval:
+                save_state(self.path, credentials)
+                self.persisted_at = now
+
+    def trusted(self, credentials: Credentials) -> bool:
+        """Whether the credentials worked recently enough to skip testing them"""
+        verified_at = credentials.get("verified_at")
+        return bool(verified_at) and time.time() - verified_at < self.trust_for
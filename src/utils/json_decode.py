@@ -0,0 +1,18 @@
+"""
+Decodes json response bodies with orjson when it is installed, the stdlib otherwise.
+- orjson parses the raw bytes directly, without decoding them to a str first.
+- Both raise a ValueError subclass on invalid json.
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(content: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
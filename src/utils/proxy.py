@@ -1,20 +1,45 @@
 """
 A wrapper around requests to handle proxy rotation and retries.
-- Proxy and rotation is handled by free-proxy library.
-- FreeProxy will test and return only working proxies.
-- As Fallback, we do max retries with the proxy before disabling it.
+- Proxies come from a ProxyPool, filled in the background from free-proxy lists.
+- The pool validates candidates in parallel, scores them by latency and success rate,
+  and hands out the best one without waiting, once it has any.
+- Requests report back to the pool, failing and stale proxies are evicted.
+- ProxyLanes spreads the requests of one scraper over several proxies,
+  each lane with its own keep-alive session and rate budget per host.
+- Failed requests are retried in a loop with jittered exponential backoff.
+  Every attempt, retries included, waits for a token of the host's budget.
+  After max retries of request errors the proxy is disabled.
+- Throttled responses (429, 503) honor Retry-After and never disable the scraper,
+  the last one is returned once retries run out.
+- Throttled responses feed the host's circuit breaker and rate controller,
+  timeouts feed the rate controller too.
+- AsyncRequestProxy wraps a RequestProxy so that asyncio code can keep
+  several requests in flight at once, each one running in a worker thread.
+  Each attempt uses the proxy it started with, and requests failing on the
+  same proxy rotate it once, under a lock.
 """
 
-
+import asyncio
 import threading
-from queue import Queue
-from typing import Callable
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Set, Union
 
 import requests
 from fp.errors import FreeProxyException
 from fp.fp import FreeProxy
 
 from src import logger
+from src.utils.circuit_breaker import (
+    CircuitBreaker,
+    backoff_delay,
+    get_circuit_breaker,
+    parse_retry_after,
+)
+from src.utils.rate_limiter import TokenBucket, get_rate_limiter, report_throttled
+
+# Responses of a host asking us to slow down
+THROTTLED_STATUS_CODES = (429, 503)
 
 
 class RequestProxy:
@@ -24,16 +49,36 @@ class RequestProxy:
         max_retries=5,
         timeout=10.0,
         cancel_func: Callable[[], bool] = lambda: False,
+        proxy: Optional[str] = None,
+        avoid: Callable[[], Set[str]] = lambda: set(),
+        backoff_base=0.5,
+        backoff_cap=30.0,
+        rate_limit=0.0,
+        burst=1,
     ):
+        """
+        proxy: A proxy known to work, used first instead of finding a new one
+        avoid: Proxies in use elsewhere, not picked when rotating
+        backoff_base: Seconds of the first retry's backoff, doubling on each retry
+        backoff_cap: Max seconds of a backoff
+        rate_limit: Seconds between requests to a host through the current proxy,
+            used when a request is not given the host's rate limiter
+        """
         self.session = requests.Session()
         self.use_proxy = use_proxy
+        self.avoid = avoid
         self.proxy = (
-            self.set_proxy(timeout=timeout, cancel_func=cancel_func)
+            (proxy or self.set_proxy(timeout=timeout, cancel_func=cancel_func))
             if self.use_proxy
             else None
         )
         self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.rate_limit = rate_limit
+        self.burst = burst
         self.disabled = False
+        self.rotation_lock = threading.Lock()
         # once disabled the request method always returns a 407
         self.disabled_response = DisabledProxyResponse()
 
@@ -42,43 +87,102 @@ class RequestProxy:
         method: str,
         url: str,
         cancel_func: Callable[[], bool] = lambda: False,
-        tries=0,
         timeout=10.0,
+        rate_limiter: Optional[TokenBucket] = None,
         **kwargs,
     ):
-        if self.disabled:
-            return self.disabled_response
-
-        if self.proxy:
-            kwargs["proxies"] = {"http": self.proxy, "https": self.proxy}
-        else:
-            kwargs["proxies"] = None
-
-        try:
-            response = self.session.request(method, url, timeout=timeout, **kwargs)
-        except Exception as e:
-            proxy = "Proxy" if self.proxy else ""
-            # Only apply cancellation for proxy requests
-            is_cancelled = cancel_func() and self.use_proxy
-
-            if tries == self.max_retries or is_cancelled:
-                logger.error(f":: {proxy} Retries Maxed out: Disabling Scraper")
-                self.disabled = True
+        """rate_limiter: Bucket of the host, a token is taken for every attempt"""
+        response = None
+        for attempt in range(self.max_retries + 1):
+            if self.disabled:
                 return self.disabled_response
+
+            # concurrent requests may rotate self.proxy, each attempt keeps its own
+            proxy = self.proxy
+            breaker = get_circuit_breaker(url, via=proxy)
+            breaker.allow()
+            self.throttle(url, rate_limiter, proxy)
+            if proxy:
+                kwargs["proxies"] = {"http": proxy, "https": proxy}
             else:
-                logger.debug(f":: {proxy} Request Error: {self.proxy}, {e} Rotating")
-                self.proxy = self.set_proxy(cancel_func) if self.use_proxy else None
-                return self.request(
-                    method,
-                    url,
-                    cancel_func=cancel_func,
-                    tries=tries + 1,
-                    timeout=timeout,
-                    **kwargs,
+                kwargs["proxies"] = None
+
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except Exception as e:
+                breaker.abandoned()
+                if proxy:
+                    proxy_pool.report(proxy, ok=False)
+                elif isinstance(e, requests.exceptions.Timeout):
+                    report_throttled(url)
+                label = "Proxy" if proxy else ""
+                # Only apply cancellation for proxy requests
+                is_cancelled = cancel_func() and self.use_proxy
+
+                if attempt == self.max_retries or is_cancelled:
+                    logger.error(f":: {label} Retries Maxed out: Disabling Scraper")
+                    self.disabled = True
+                    return self.disabled_response
+                logger.debug(f":: {label} Request Error: {proxy}, {e} Rotating")
+                if self.use_proxy:
+                    # a fresh proxy is the remedy, no need to wait
+                    self.rotate(proxy, cancel_func)
+                else:
+                    self.backoff(breaker, attempt)
+                continue
+
+            if response.status_code in THROTTLED_STATUS_CODES:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                breaker.throttled(retry_after)
+                if not proxy:
+                    report_throttled(url)
+                logger.debug(
+                    f":: Throttled by {breaker.name}: {response.status_code}, "
+                    f"retry after {retry_after}"
                 )
+                if attempt < self.max_retries:
+                    self.backoff(breaker, attempt, retry_after)
+                continue
+
+            breaker.succeeded()
+            if proxy:
+                proxy_pool.report(proxy, ok=True, latency=time.monotonic() - started)
+            return response
 
+        # still throttled, the caller sees the last response
         return response
 
+    def throttle(
+        self, url: str, rate_limiter: Optional[TokenBucket], proxy: Optional[str]
+    ) -> None:
+        """Waits for a token of the host's budget, or the proxy's"""
+        if rate_limiter is None and self.rate_limit:
+            # looked up per attempt, a rotated proxy spends a budget of its own
+            rate_limiter = get_rate_limiter(
+                url, 1 / self.rate_limit, self.burst, via=proxy
+            )
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+
+    def rotate(self, failed: str, cancel_func: Callable[[], bool]) -> None:
+        """Replaces a failed proxy, once for all the requests that failed on it"""
+        with self.rotation_lock:
+            if self.proxy == failed and not self.disabled:
+                self.proxy = self.set_proxy(cancel_func)
+
+    def backoff(
+        self,
+        breaker: CircuitBreaker,
+        attempt: int,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        delay = backoff_delay(
+            attempt, self.backoff_base, self.backoff_cap, retry_after=retry_after
+        )
+        breaker.record_backoff(delay)
+        time.sleep(delay)
+
     def set_proxy(
         self,
         cancel_func: Callable[[], bool] = lambda: False,
@@ -86,18 +190,141 @@ class RequestProxy:
         timeout=10.0,
     ):
         logger.debug(f":: Proxy: Getting new proxy, please wait..")
-        try:
-            fp = FreeProxy(https=True, anonym=True)
-            proxy = with_timeout(timeout, fp.get)
+        # rotating away from the current proxy
+        exclude = self.avoid()
+        if getattr(self, "proxy", None):
+            exclude.add(self.proxy)
+        proxy = proxy_pool.get(timeout=timeout, exclude=exclude)
+        if proxy:
             logger.debug(f":: Proxy Selected: {proxy}")
             return proxy
-        except (FreeProxyException, TimeoutError) as e:
-            logger.debug(f":: Proxy Error: {e}")
-            if tries >= 3 or cancel_func():  # use 3 for no available proxy errors
-                self.disabled = True
-                return None
-            return self.set_proxy(
-                cancel_func=cancel_func, tries=tries + 1, timeout=timeout
+
+        logger.debug(f":: Proxy Error: No working proxy within {timeout}s")
+        if tries >= 3 or cancel_func():  # use 3 for no available proxy errors
+            self.disabled = True
+            return None
+        return self.set_proxy(cancel_func=cancel_func, tries=tries + 1, timeout=timeout)
+
+
+class ProxyLanes:
+    """
+    Same interface as RequestProxy, over several proxy lanes.
+    Each request goes to the live lane with the fewest requests in flight,
+    taking turns on ties, and waits for that lane's token of the host's budget.
+    """
+
+    def __init__(
+        self,
+        lanes=2,
+        rate_limit=0.0,
+        burst=1,
+        cancel_func: Callable[[], bool] = lambda: False,
+        proxy: Optional[str] = None,
+    ):
+        """
+        rate_limit: Seconds between requests to a host, per lane
+        proxy: A proxy known to work, used by the first lane
+        """
+        self.lock = threading.Lock()
+        self.lanes: List[RequestProxy] = []
+        for i in range(lanes):
+            self.lanes.append(
+                RequestProxy(
+                    use_proxy=True,
+                    cancel_func=cancel_func,
+                    proxy=proxy if i == 0 else None,
+                    avoid=self.proxies,
+                    rate_limit=rate_limit,
+                    burst=burst,
+                )
+            )
+        self.in_flight = [0] * lanes
+        self.turn = 0
+        self.disabled_response = DisabledProxyResponse()
+
+    @property
+    def disabled(self) -> bool:
+        return all(lane.disabled for lane in self.lanes)
+
+    @property
+    def proxy(self) -> Optional[str]:
+        return next((lane.proxy for lane in self.lanes if not lane.disabled), None)
+
+    def proxies(self) -> Set[str]:
+        return {lane.proxy for lane in self.lanes if lane.proxy}
+
+    def request(self, method: str, url: str, **kwargs):
+        with self.lock:
+            live = [i for i, lane in enumerate(self.lanes) if not lane.disabled]
+            if not live:
+                return self.disabled_response
+            # fewest in flight, the lane after the last used one wins ties
+            index = min(
+                live,
+                key=lambda i: (self.in_flight[i], (i - self.turn) % len(self.lanes)),
+            )
+            self.turn = index + 1
+            self.in_flight[index] += 1
+
+        try:
+            # the lane takes its proxy's token on every attempt
+            return self.lanes[index].request(method, url, **kwargs)
+        finally:
+            with self.lock:
+                self.in_flight[index] -= 1
+
+
+def new_session(
+    use_proxy=False,
+    lanes=1,
+    rate_limit=0.0,
+    burst=1,
+    cancel_func: Callable[[], bool] = lambda: False,
+    proxy: Optional[str] = None,
+) -> Union[RequestProxy, ProxyLanes]:
+    """A request session for a scraper, fanned out over proxy lanes if asked to"""
+    if use_proxy and lanes > 1:
+        return ProxyLanes(
+            lanes,
+            rate_limit=rate_limit,
+            burst=burst,
+            cancel_func=cancel_func,
+            proxy=proxy,
+        )
+    return RequestProxy(use_proxy=use_proxy, cancel_func=cancel_func, proxy=proxy)
+
+
+class AsyncRequestProxy:
+    """
+    Asyncio facade over a RequestProxy.
+    The blocking request runs in the loop's default executor,
+    bounded by max_in_flight concurrent requests.
+    """
+
+    def __init__(self, request_proxy: Union[RequestProxy, ProxyLanes], max_in_flight=4):
+        self.request_proxy = request_proxy
+        self.semaphore = asyncio.Semaphore(max_in_flight)
+
+    @property
+    def disabled(self) -> bool:
+        return self.request_proxy.disabled
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        cancel_func: Callable[[], bool] = lambda: False,
+        timeout=10.0,
+        **kwargs,
+    ) -> requests.Response:
+        async with self.semaphore:
+            return await asyncio.to_thread(
+                self.request_proxy.request,
+                method,
+                url,
+                cancel_func=cancel_func,
+                timeout=timeout,
+                **kwargs,
             )
 
 
@@ -110,23 +337,176 @@ class DisabledProxyResponse(requests.Response):
         return {"error": "Proxy Disabled"}
 
 
-def with_timeout(time_limit, func, *args, **kwargs):
+class ProxyStats:
+    def __init__(self, latency: float) -> None:
+        self.latency = latency
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        # last time the proxy was seen working
+        self.seen_at = time.monotonic()
+
+    def score(self) -> float:
+        """Lower is better: latency, inflated by the failure rate"""
+        success_rate = (self.successes + 1) / (self.successes + self.failures + 1)
+        return self.latency / success_rate
+
+
+class ProxyPool:
     """
-    Run a function with a time limit.
-    If the function does not return within the time limit, return None
+    Working proxies, found and validated by a background thread.
+    The thread starts with the first get, and tops the pool up to min_size.
     """
-    q = Queue()
 
-    def wrapper(*args, **kwargs):
+    def __init__(
+        self,
+        min_size=5,
+        max_size=20,
+        workers=16,
+        check_url="https://www.google.com",
+        check_timeout=3.0,
+        max_age=600.0,
+        max_failures=3,
+        refill_interval=30.0,
+        source: Optional[Callable[[], List[str]]] = None,
+        validate: Optional[Callable[[str], Optional[float]]] = None,
+    ) -> None:
+        """
+        workers: Candidates validated in parallel
+        max_age: Seconds a proxy is kept without being seen working
+        max_failures: Failures in a row after which a proxy is evicted
+        source: Candidate proxy urls, free-proxy lists by default
+        validate: Latency of a proxy, None if it does not work
+        """
+        self.min_size = min_size
+        self.max_size = max_size
+        self.workers = workers
+        self.check_url = check_url
+        self.check_timeout = check_timeout
+        self.max_age = max_age
+        self.max_failures = max_failures
+        self.refill_interval = refill_interval
+        self.source = source or self.list_proxies
+        self.validate = validate or self.check_proxy
+        self.entries: Dict[str, ProxyStats] = {}
+        self.lock = threading.Lock()
+        self.available = threading.Condition(self.lock)
+        self.wanted = threading.Event()
+        self.closed = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+    def get(self, timeout=10.0, exclude: Optional[Set[str]] = None) -> Optional[str]:
+        """The best proxy, waits up to timeout for one if the pool is empty"""
+        exclude = exclude or set()
+        self.start()
+        with self.available:
+            if not self.available.wait_for(lambda: self.best(exclude), timeout):
+                self.wanted.set()
+                return None
+            proxy = self.best(exclude)
+            if len(self.entries) < self.min_size:
+                self.wanted.set()
+        return proxy
+
+    def best(self, exclude: Set[str]) -> Optional[str]:
+        candidates = [p for p in self.entries if p not in exclude]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda p: self.entries[p].score())
+
+    def report(self, proxy: str, ok: bool, latency: Optional[float] = None) -> None:
+        """Outcome of a request made through a proxy of the pool"""
+        with self.lock:
+            stats = self.entries.get(proxy)
+            if stats is None:
+                return
+            if ok:
+                stats.successes += 1
+                stats.consecutive_failures = 0
+                stats.seen_at = time.monotonic()
+                if latency is not None:
+                    stats.latency += 0.3 * (latency - stats.latency)
+                return
+
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            if stats.consecutive_failures >= self.max_failures:
+                self.evict(proxy, "failing")
+
+    def evict(self, proxy: str, reason: str) -> None:
+        del self.entries[proxy]
+        logger.debug(f":: ProxyPool: Evicted {reason} {proxy}")
+        self.wanted.set()
+
+    def evict_stale(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            for proxy, stats in list(self.entries.items()):
+                if now - stats.seen_at > self.max_age:
+                    self.evict(proxy, "stale")
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is None:
+                self.wanted.set()
+                self.thread = threading.Thread(
+                    target=self.run, name="ProxyPool", daemon=True
+                )
+                self.thread.start()
+
+    def close(self) -> None:
+        """Stops the background thread, once its current refill is done"""
+        self.closed.set()
+        self.wanted.set()
+
+    def run(self) -> None:
+        while True:
+            self.wanted.wait(self.refill_interval)
+            self.wanted.clear()
+            if self.closed.is_set():
+                return
+            self.evict_stale()
+            if len(self.entries) < self.min_size:
+                try:
+                    self.refill()
+                except Exception as e:
+                    logger.debug(f":: ProxyPool: Refill failed: {e}")
+
+    def refill(self) -> None:
+        """Validates fresh candidates in parallel, adding each as soon as it works"""
+        candidates = [p for p in self.source() if p not in self.entries]
+        logger.debug(f":: ProxyPool: Validating {len(candidates)} candidates")
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = {executor.submit(self.validate, p): p for p in candidates}
+            for future in as_completed(futures):
+                latency = future.result()
+                if latency is None:
+                    continue
+                with self.available:
+                    if len(self.entries) < self.max_size:
+                        self.entries[futures[future]] = ProxyStats(latency)
+                        self.available.notify_all()
+
+    def list_proxies(self) -> List[str]:
+        try:
+            fp = FreeProxy(https=True, anonym=True)
+            return [f"http://{address}" for address in fp.get_proxy_list(repeat=False)]
+        except FreeProxyException as e:
+            logger.debug(f":: ProxyPool: {e}")
+            return []
+
+    def check_proxy(self, proxy: str) -> Optional[float]:
+        started = time.monotonic()
         try:
-            q.put(func(*args, **kwargs))
-        except Exception as e:
-            q.put(e)
-
-    t = threading.Thread(target=wrapper, args=args, kwargs=kwargs)
-    t.start()
-    t.join(time_limit)
-    if t.is_alive():
-        raise TimeoutError(f":: Proxy Timeout: {time_limit}s")
-    else:
-        return q.get()
+            requests.head(
+                self.check_url,
+                proxies={"http": proxy, "https": proxy},
+                timeout=self.check_timeout,
+            )
+        except requests.exceptions.RequestException:
+            return None
+        return time.monotonic() - started
+
+
+# Shared by all request proxies in this process
+proxy_pool = ProxyPool()
@@ -0,0 +1,183 @@
+"""
+Token bucket rate limiting, shared per host.
+- Every scraper hitting the same host takes tokens from the same bucket,
+  so the combined request rate to that host is controlled, not each scraper's.
+- Requests through a proxy reach the host from another address,
+  so each host and proxy pair has a bucket of its own.
+- Tokens refill at `rate` per second up to `capacity`, allowing short bursts.
+- A caller reserves its token first and then waits until it is due,
+  so concurrent callers are served in order without busy looping.
+- A RateController tunes the rate of a host's bucket by AIMD:
+  healthy responses raise it additively, throttling cuts it multiplicatively.
+  Learned rates are saved, to start the next run from.
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+from src import logger
+from src.utils.state import load_state, save_state
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+        # total seconds callers had to wait for tokens
+        self.waited = 0.0
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Takes tokens now, returns seconds to wait until they are due"""
+        with self.lock:
+            now = time.monotonic()
+            elapsed = now - self.updated_at
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += wait
+            return wait
+
+    def set_rate(self, rate: float) -> None:
+        with self.lock:
+            # tokens earned so far count at the old rate
+            now = time.monotonic()
+            elapsed = now - self.updated_at
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+            self.rate = rate
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 1.0) -> None:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def __repr__(self):
+        return f"TokenBucket(rate={self.rate:.2f}/s, capacity={self.capacity})"
+
+
+class RateController:
+    def __init__(
+        self,
+        bucket: TokenBucket,
+        min_rate=0.1,
+        max_rate=20.0,
+        increase=0.1,
+        decrease=0.5,
+    ) -> None:
+        """
+        increase: Requests per second added over a second of healthy responses
+        decrease: Factor the rate is cut by when throttled
+        """
+        self.bucket = bucket
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.held_until = 0.0
+        self.lock = threading.Lock()
+
+    def record(self, ok: bool) -> None:
+        """Takes the outcome of a request, ok or throttled"""
+        with self.lock:
+            rate = self.bucket.rate
+            now = time.monotonic()
+            if ok:
+                # one increase per second worth of requests
+                rate += self.increase / rate
+            elif now >= self.held_until:
+                rate *= self.decrease
+                # requests in flight were sent at the old rate, one cut is enough
+                self.held_until = now + 1 / rate
+                logger.debug(f":: RateController: Throttled, down to {rate:.2f}/s")
+            else:
+                return
+            self.bucket.set_rate(max(self.min_rate, min(self.max_rate, rate)))
+
+
+rate_limiters: Dict[str, TokenBucket] = {}
+rate_controllers: Dict[str, RateController] = {}
+# rates learned by previous runs, per host
+learned_rates: Dict[str, float] = {}
+registry_lock = threading.Lock()
+
+
+def host_key(url: str, via: Optional[str] = None) -> str:
+    """Host of url, through the proxy `via` if given"""
+    host = urlsplit(url).netloc or url
+    return f"{host}@{via}" if via else host
+
+
+def get_rate_limiter(
+    url: str, rate: float, capacity: float = 1.0, via: Optional[str] = None
+) -> TokenBucket:
+    """
+    Returns the bucket shared by all requests to the host of url,
+    made through the proxy `via` if given.
+    The first call creates it; later calls can only raise its rate and capacity,
+    so the most permissive scraper setting becomes the host budget.
+    Once a RateController owns the bucket its learned rate is kept,
+    only capped at the controller's max rate.
+    """
+    host = host_key(url, via)
+    with registry_lock:
+        bucket = rate_limiters.get(host)
+        if bucket is None:
+            bucket = rate_limiters[host] = TokenBucket(rate, capacity)
+        else:
+            controller = rate_controllers.get(host)
+            with bucket.lock:
+                if controller is None:
+                    bucket.rate = max(bucket.rate, rate)
+                else:
+                    bucket.rate = min(bucket.rate, controller.max_rate)
+                bucket.capacity = max(bucket.capacity, capacity)
+        return bucket
+
+
+def get_rate_controller(
+    url: str, rate: float, capacity: float = 1.0, **kwargs
+) -> RateController:
+    """
+    Returns the controller of the bucket shared by all requests to the host of url.
+    It starts from the rate learned last run, or the given rate.
+    """
+    host = host_key(url)
+    bucket = get_rate_limiter(url, rate, capacity)
+    with registry_lock:
+        controller = rate_controllers.get(host)
+        if controller is None:
+            controller = rate_controllers[host] = RateController(bucket, **kwargs)
+            if host in learned_rates:
+                rate = min(controller.max_rate, learned_rates[host])
+                bucket.set_rate(max(controller.min_rate, rate))
+                logger.info(f":: RateController: {host} starts at {bucket.rate:.2f}/s")
+        return controller
+
+
+def report_throttled(url: str) -> None:
+    """Feeds a throttled request to the host's controller, if it has one"""
+    controller = rate_controllers.get(host_key(url))
+    if controller:
+        controller.record(False)
+
+
+def load_rates(path: str) -> None:
+    learned_rates.update(load_state(path, {}))
+
+
+def save_rates(path: str) -> None:
+    rates = dict(learned_rates)
+    rates.update({host: c.bucket.rate for host, c in rate_controllers.items()})
+    save_state(path, rates)
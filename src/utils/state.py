@@ -0,0 +1,38 @@
+"""
+Small json state files that persist between runs.
+- Writes go to a temporary file in the same directory that then replaces the old one,
+  so a crash or a concurrent reader never sees a half written file.
+- A missing or unreadable file loads as the given default.
+"""
+import json
+import os
+import tempfile
+from typing import Any
+
+from src import logger
+
+
+def load_state(path: str, default: Any = None) -> Any:
+    try:
+        with open(path) as rf:
+            return json.load(rf)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logger.warning(f":: State: Ignoring unreadable {path}: {e}")
+        return default
+
+
+def save_state(path: str, data: Any) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
@@ -0,0 +1,45 @@
+"""
+Timestamp normalization shared by the scrapers, everything ends up as utc epoch seconds.
+- Timezones are looked up once and cached, pytz.timezone is slow to call per quote.
+- Yahoo's regularMarketTime is already an epoch, it only needs unwrapping.
+- Stockanalysis sends exchange local times like 'Jun 6, 2023, 4:00 PM EDT'.
+  Most quotes of a run share the same string, so parsed results are cached by it.
+"""
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Union
+
+import pytz
+
+EXCHANGE_TIMEZONE_NAME = "America/New_York"
+MARKET_TIME_PATTERN = re.compile(
+    r"([A-Za-z]{3} \d{1,2}, \d{4}, \d{1,2}:\d{2} [APM]{2})"
+)
+MARKET_TIME_FORMAT = "%b %d, %Y, %I:%M %p"
+
+
+@lru_cache(maxsize=None)
+def timezone(name: str = EXCHANGE_TIMEZONE_NAME) -> pytz.BaseTzInfo:
+    return pytz.timezone(name)
+
+
+def epoch_seconds(value: Union[int, float, dict]) -> int:
+    """Epoch from a raw value, or a formatted {raw, fmt} one"""
+    if isinstance(value, dict):
+        value = value["raw"]
+    return int(value)
+
+
+@lru_cache(maxsize=1024)
+def parse_market_time(raw_date: str) -> Optional[int]:
+    """
+    Epoch of the first exchange local time in raw_date, eg 'Jun 6, 2023, 4:00 PM EDT'
+    None if there is none
+    """
+    match = MARKET_TIME_PATTERN.search(raw_date)
+    if match is None:
+        return None
+
+    date = datetime.strptime(match.group(1), MARKET_TIME_FORMAT)
+    return int(timezone().localize(date).timestamp())
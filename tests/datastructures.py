@@ -1,8 +1,14 @@
+import json
+import random
+import string
+import urllib.parse
+from typing import List
+
 import requests
 
-from src.scrapers import StockAnalysisAPI, YahooAPI
+from src.scrapers import AsyncYahooAPI, StockAnalysisAPI, YahooAPI
 from src.types import StockInfo
-from src.utils.proxy import RequestProxy
+from src.utils.proxy import AsyncRequestProxy, RequestProxy
 
 
 class CRequestProxy(RequestProxy):
@@ -49,6 +55,12 @@ class CustomResponse(requests.Response):
         self.error = error
         self.result_num = result_num
 
+    @property
+    def content(self):
+        if self._content:
+            return self._content
+        return json.dumps(self.json()).encode()
+
     def json(self):
         data = {"quoteResponse": {"error": self.error, "result": []}}
         if self.replace_json is not None:
@@ -137,3 +149,76 @@ StandardStockInfoValues = dict(
 )
 
 StandardStockInfo = StockInfo(**StandardStockInfoValues)
+
+
+class CAsyncYahooAPI(AsyncYahooAPI):
+    def __init__(self, response, **kwargs):
+        super().__init__(**kwargs)
+        self.response = response
+
+    def setup(self, cancel_func=lambda: False):
+        self.working = True
+        self.cookie_cred = {"cookie": {}, "crumb": ""}
+        self.session = CRequestProxy(response=self.response)
+        self.async_session = AsyncRequestProxy(
+            self.session, max_in_flight=self.concurrency
+        )
+
+
+class CSymbolRequestProxy(RequestProxy):
+    """
+    Answers quote requests per symbol in the url.
+    Symbols starting with BAD make the whole request fail with a 400,
+    symbols starting with DEL are left out of the result like delisted ones.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.requested = []
+
+    def request(self, method, url, cancel_func=None, **kwargs):
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)
+        symbols = query["symbols"][0].split(",")
+        self.requested.append(symbols)
+
+        if any(symbol.startswith("BAD") for symbol in symbols):
+            return CustomResponse(status_code=400)
+
+        result = []
+        for symbol in symbols:
+            if not symbol.startswith("DEL"):
+                stock = CustomResponse().default_data()
+                stock["symbol"] = symbol
+                result.append(stock)
+        return CustomResponse(replace_result=result)
+
+
+class CBisectYahooAPI(YahooAPI):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.cookie_cred = {"cookie": {}, "crumb": ""}
+        self.session = CSymbolRequestProxy()
+
+
+def synthetic_stocks(num: int, timestamp=1686340993, seed=212) -> List[StockInfo]:
+    """Random but valid StockInfo rows, with unique symbols"""
+    rng = random.Random(seed)
+    stocks = []
+    for i in range(num):
+        symbol = "".join(rng.choices(string.ascii_uppercase, k=3)) + str(i)
+        price = round(rng.uniform(1, 500), 2)
+        stocks.append(
+            StockInfo(
+                name=f"{symbol.title()}, Inc.",
+                symbol=symbol,
+                marketcap=rng.randint(10**6, 10**12),
+                price=price,
+                volume=rng.randint(1, 10**8),
+                highprice=round(price * 1.02, 2),
+                lowprice=round(price * 0.98, 2),
+                open=round(price * 0.99, 2),
+                prevclose=round(price * 1.01, 2),
+                timestamp=timestamp,
+            )
+        )
+    return stocks
@@ -0,0 +1,66 @@
+from collections import deque
+
+from src.runners import async_executor
+from src.runners.scheduler import Scheduler
+from src.scrapers import async_scraper_instance
+from tests.datastructures import CAsyncYahooAPI, CustomResponse
+
+
+def test_async_executor_pass():
+    symbols = deque(["FI"] * 95)
+    scrapers = [
+        CAsyncYahooAPI(response=CustomResponse(result_num=10), batch_size=10),
+        CAsyncYahooAPI(response=CustomResponse(result_num=10), batch_size=10),
+    ]
+    data, failures = async_executor(
+        async_scraper_instance, scrapers, [symbols.pop, symbols.popleft], symbols
+    )
+    assert len(symbols) == 0
+    assert data and all(stock.symbol == "FI" for stock in data)
+    assert failures == {}
+
+
+def test_async_executor_failures():
+    symbols = deque(["FI", "NKE"])
+    scrapers = [CAsyncYahooAPI(response=CustomResponse(status_code=404))]
+    data, failures = async_executor(
+        async_scraper_instance, scrapers, [symbols.pop], symbols
+    )
+    assert data == []
+    assert set(failures) == {"FI", "NKE"}
+
+
+def test_async_executor_sink_keeps_no_data():
+    symbols = deque(["FI"] * 30 + ["NKE"])
+    scrapers = [CAsyncYahooAPI(response=CustomResponse(result_num=10), batch_size=10)]
+    sunk = []
+    data, failures = async_executor(
+        async_scraper_instance, scrapers, [symbols.pop], symbols, sink=sunk.append
+    )
+    # each stock reaches the sink once, the result only keeps its symbol
+    assert [stock.symbol for stock in sunk] == ["FI"]
+    assert data == []
+    assert set(failures) == {"NKE"}
+
+
+def test_async_workers_of_a_scraper_get_scheduler_workers_of_their_own():
+    scheduler = Scheduler(f"S{i}" for i in range(40))
+    scraper = CAsyncYahooAPI(
+        response=CustomResponse(result_num=10), batch_size=5, concurrency=3
+    )
+    names = []
+    worker = scheduler.worker
+    scheduler.worker = lambda name="": names.append(name) or worker(name)
+
+    _, failures = async_executor(
+        async_scraper_instance,
+        [scraper],
+        [scheduler.worker("scraper").pop],
+        scheduler.symbols,
+        reprocess_failures=False,
+    )
+    # the canned response only has FI, every symbol was tried once
+    assert set(failures) == set(scheduler.symbols)
+    assert names == ["scraper", "scraper/0", "scraper/1", "scraper/2"]
+    # all of them are closed once the scraper is done
+    assert scheduler.workers == []
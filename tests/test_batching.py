@@ -0,0 +1,37 @@
+from urllib.parse import quote_plus
+
+from src.utils.batching import BatchSizeController, pack_symbols
+
+
+def test_controller_grows_when_healthy():
+    controller = BatchSizeController(50, max_size=60, step=5, patience=2)
+    assert controller.record(50, 0, latency=0.5, status_code=200) == 50
+    assert controller.record(50, 0, latency=0.5, status_code=200) == 55
+    # does not grow unless the current size was used
+    controller.record(10, 0, latency=0.5, status_code=200)
+    assert controller.record(10, 0, latency=0.5, status_code=200) == 55
+    for _ in range(10):
+        controller.record(60, 0, latency=0.5, status_code=200)
+    assert controller.size == 60
+
+
+def test_controller_shrinks_on_errors():
+    controller = BatchSizeController(50, min_size=5, target_latency=2.0, step=5)
+    assert controller.record(50, 0, latency=5.0, status_code=200) == 45
+    assert controller.record(45, 0, latency=0.5, status_code=429) == 22
+    assert controller.record(22, 22, latency=None, status_code=None) == 11
+    # smoothed error rate stays high for a while
+    assert controller.record(11, 11, latency=0.5, status_code=200) == 5
+
+
+def test_pack_symbols_by_url_length():
+    symbols = [f"SYM{i}" for i in range(100)] + ["BRK.B", "^GSPC"]
+    batches = pack_symbols(symbols, base_length=500, max_length=600)
+
+    assert [s for batch in batches for s in batch] == symbols
+    for batch in batches:
+        joined = quote_plus(",".join(batch))
+        assert 500 + len(joined) <= 600
+
+    assert pack_symbols(["NKE"], 500, 600) == [["NKE"]]
+    assert pack_symbols([], 500, 600) == []
@@ -0,0 +1,80 @@
+import threading
+import time
+
+import requests
+
+from src.utils.circuit_breaker import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    backoff_delay,
+    get_circuit_breaker,
+    parse_retry_after,
+)
+from src.utils.proxy import RequestProxy
+
+
+def test_backoff_delay_honors_retry_after():
+    for attempt in range(6):
+        assert (
+            0 <= backoff_delay(attempt, base=0.5, cap=4) <= min(4, 0.5 * 2**attempt)
+        )
+    assert backoff_delay(0, base=0.5, retry_after=3) == 3
+    assert backoff_delay(0, cap=2, retry_after=30) == 2
+    assert parse_retry_after("7") == 7
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0
+    assert parse_retry_after("soon") is None
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker("host", threshold=2, cooldown=0.1)
+    breaker.throttled()
+    assert breaker.state == CLOSED
+    breaker.throttled()
+    assert breaker.state == OPEN and breaker.trips == 1
+
+    # after the cooldown one caller probes, the other waits for its outcome
+    started = time.monotonic()
+    breaker.allow()
+    assert breaker.state == HALF_OPEN and time.monotonic() - started >= 0.09
+    waiter = threading.Thread(target=breaker.allow)
+    waiter.start()
+    waiter.join(0.1)
+    assert waiter.is_alive()
+
+    # a throttled probe doubles the cooldown
+    breaker.throttled()
+    assert breaker.state == OPEN and breaker.cooldown == 0.2
+    waiter.join(0.5)
+    assert breaker.state == HALF_OPEN and not waiter.is_alive()
+    breaker.succeeded()
+    assert breaker.state == CLOSED and breaker.cooldown == 0.1
+    assert breaker.waited > 0.2
+
+
+def throttled_response(status_code, retry_after=None):
+    response = requests.Response()
+    response.status_code = status_code
+    if retry_after:
+        response.headers["Retry-After"] = retry_after
+    return response
+
+
+def test_request_retries_throttled_responses_with_backoff():
+    responses = [throttled_response(429, "0.05"), throttled_response(503)]
+    responses.append(throttled_response(200))
+    proxy = RequestProxy(backoff_base=0.01)
+    proxy.session.request = lambda *args, **kwargs: responses.pop(0)
+
+    url = "https://throttled.example.com/quote"
+    assert proxy.request("get", url).status_code == 200
+    breaker = get_circuit_breaker(url)
+    assert breaker.retries == 2 and breaker.backoff >= 0.05
+    assert breaker.state == CLOSED
+
+    # once retries run out the scraper sees the throttled response, not disabled
+    proxy.max_retries = 1
+    proxy.session.request = lambda *args, **kwargs: throttled_response(429)
+    assert proxy.request("get", url).status_code == 429
+    assert not proxy.disabled
@@ -0,0 +1,55 @@
+import json
+import threading
+import time
+
+from src.utils.credentials import CredentialManager
+
+
+def slow_generate(calls):
+    def generate():
+        calls.append(threading.current_thread().name)
+        time.sleep(0.1)
+        return {"cookie": {"A1": "x"}, "crumb": f"crumb{len(calls)}"}
+
+    return generate
+
+
+def test_regeneration_is_single_flight(tmp_path):
+    path = tmp_path / "cookie.json"
+    path.write_text(json.dumps({"cookie": {}, "crumb": "stale"}))
+    manager = CredentialManager(str(path))
+    stale = manager.get(lambda: {})
+
+    calls, results = [], []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(
+                manager.regenerate(slow_generate(calls), stale=stale)
+            )
+        )
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    assert json.loads(path.read_text())["crumb"] == "crumb1"
+
+
+def test_recently_verified_credentials_are_trusted(tmp_path):
+    path = tmp_path / "cookie.json"
+    manager = CredentialManager(str(path), trust_for=60)
+    calls = []
+    creds = manager.get(slow_generate(calls))
+    assert calls and not manager.trusted(creds)
+
+    manager.mark_valid(creds)
+    assert manager.trusted(creds)
+
+    # a new process loads them from the file, still trusted
+    reloaded = CredentialManager(str(path), trust_for=60).get(slow_generate(calls))
+    assert len(calls) == 1 and reloaded["crumb"] == "crumb1"
+    assert CredentialManager(str(path), trust_for=60).trusted(reloaded)
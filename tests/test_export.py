@@ -0,0 +1,169 @@
+import csv
+
+import pytest
+
+import export
+from src.databases import sqlitedb
+from src.databases.sqlitedb import SqliteDB
+from tests.datastructures import synthetic_stocks
+
+
+@pytest.fixture
+def db_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlitedb, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(export, "DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_sqlite_export_streams_in_chunks(db_dir):
+    data = synthetic_stocks(25)
+    with SqliteDB.session() as db:
+        db.save(data)
+
+    export.CsvExport(source="sqlite", chunk_size=10)
+    with open(db_dir / "data.csv", newline="") as f:
+        header, *rows = list(csv.reader(f))
+
+    assert header[:3] == ["id", "name", "symbol"]
+    assert [row[2] for row in rows] == [d.symbol for d in data]
+
+
+def test_parquet_export_partitions_by_trading_date(db_dir):
+    pq = pytest.importorskip("pyarrow.parquet")
+    # 2023-06-09 and 2023-06-10 in New York, the second is 23:00 UTC on the 10th
+    data = synthetic_stocks(5) + synthetic_stocks(3, timestamp=1686438000)
+    with SqliteDB.session() as db:
+        db.save(data)
+
+    export.ParquetExport(source="sqlite", chunk_size=4)
+    path = db_dir / "parquet"
+    assert sorted(p.name for p in path.iterdir()) == [
+        "date=2023-06-09",
+        "date=2023-06-10",
+    ]
+
+    table = pq.read_table(
+        path, columns=["symbol", "price"], filters=[("date", "=", "2023-06-10")]
+    )
+    assert table.column("symbol").to_pylist() == [d.symbol for d in data[5:]]
+    assert table.schema.field("price").type == "double"
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        return list(csv.reader(f))
+
+
+def test_incremental_csv_export_appends_new_rows(db_dir):
+    first, second = synthetic_stocks(4), synthetic_stocks(3, timestamp=1686438000)
+    with SqliteDB.session() as db:
+        db.save(first)
+    export.CsvExport(source="sqlite", incremental=True)
+
+    with SqliteDB.session() as db:
+        db.save(second)
+    # tamper with the artifact, an incremental export only appends to it
+    with open(db_dir / "data.csv", "a") as f:
+        f.write("marker\n")
+    export.CsvExport(source="sqlite", incremental=True)
+
+    header, *rows = read_csv(db_dir / "data.csv")
+    assert header[0] == "id"
+    assert [row[0] for row in rows] == ["1", "2", "3", "4", "marker", "5", "6", "7"]
+    state = export.load_state(str(db_dir / "export_state.json"))
+    assert state["csv"] == {"source": "sqlite", "last_id": 7, "since_compaction": 1}
+
+
+def test_incremental_export_compacts_periodically(db_dir):
+    with SqliteDB.session() as db:
+        db.save(synthetic_stocks(2))
+    export.CsvExport(source="sqlite", incremental=True, compact_every=1)
+    with open(db_dir / "data.csv", "a") as f:
+        f.write("marker\n")
+
+    export.CsvExport(source="sqlite", incremental=True, compact_every=1)
+    assert "marker" in open(db_dir / "data.csv").read()
+    # the limit of incremental runs is reached, this one rewrites the file
+    export.CsvExport(source="sqlite", incremental=True, compact_every=1)
+    assert len(read_csv(db_dir / "data.csv")) == 3
+
+
+def test_failed_full_export_keeps_previous_artifact(db_dir, monkeypatch):
+    with SqliteDB.session() as db:
+        db.save(synthetic_stocks(3))
+    export.CsvExport(source="sqlite")
+    previous = read_csv(db_dir / "data.csv")
+
+    def export_sqlite(self, f, query, params, header):
+        f.write("partial\n")
+        raise ConnectionError("lost the database")
+
+    monkeypatch.setattr(export.CsvExport, "export_sqlite", export_sqlite)
+    export.CsvExport(source="sqlite")
+    assert read_csv(db_dir / "data.csv") == previous
+    assert sorted(p.name for p in db_dir.iterdir() if p.suffix == ".csv") == [
+        "data.csv"
+    ]
+
+
+def test_failed_incremental_export_is_truncated(db_dir, monkeypatch):
+    with SqliteDB.session() as db:
+        db.save(synthetic_stocks(3))
+    export.CsvExport(source="sqlite", incremental=True)
+    with SqliteDB.session() as db:
+        db.save(synthetic_stocks(2, timestamp=1686438000))
+
+    export_sqlite = export.CsvExport.export_sqlite
+
+    def failing_export_sqlite(self, f, query, params, header):
+        export_sqlite(self, f, query, params, header)
+        raise ConnectionError("lost the database")
+
+    monkeypatch.setattr(export.CsvExport, "export_sqlite", failing_export_sqlite)
+    export.CsvExport(source="sqlite", incremental=True)
+    assert len(read_csv(db_dir / "data.csv")) == 1 + 3
+
+    monkeypatch.setattr(export.CsvExport, "export_sqlite", export_sqlite)
+    export.CsvExport(source="sqlite", incremental=True)
+    rows = read_csv(db_dir / "data.csv")[1:]
+    assert [row[0] for row in rows] == ["1", "2", "3", "4", "5"]
+
+
+def test_parquet_export_closes_dates_it_moved_past(db_dir, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+    day = 24 * 60 * 60
+    # five trading dates in order, then the first one again
+    data = [
+        stock
+        for i in range(5)
+        for stock in synthetic_stocks(3, timestamp=1686340993 + i * day, seed=i)
+    ]
+    data += synthetic_stocks(2, timestamp=1686340993, seed=9)
+    with SqliteDB.session() as db:
+        db.save(data)
+
+    open_writers, most_open = set(), []
+    ParquetWriter = pq.ParquetWriter
+
+    class CountingWriter(ParquetWriter):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            open_writers.add(self)
+            most_open.append(len(open_writers))
+
+        def close(self):
+            open_writers.discard(self)
+            super().close()
+
+    monkeypatch.setattr(export.pq, "ParquetWriter", CountingWriter)
+    export.ParquetExport(source="sqlite", chunk_size=4)
+
+    assert max(most_open) <= 2 and not open_writers
+    first = db_dir / "parquet" / "date=2023-06-09"
+    assert sorted(p.name for p in first.iterdir()) == [
+        "part-0-1.parquet",
+        "part-0.parquet",
+    ]
+    # rows of a date are written as one row group while they fit a chunk
+    assert pq.ParquetFile(first / "part-0.parquet").metadata.num_row_groups == 1
+    assert pq.read_table(db_dir / "parquet").num_rows == len(data)
@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+from src.scrapers import YahooAPI
+from src.scrapers.health import HealthSnapshot
+from src.scrapers.main import record_dead, verify_health
+from tests.datastructures import StandardStockInfo
+
+
+def test_health_snapshot_persists_between_runs(tmp_path):
+    path = str(tmp_path / "scraper_health.json")
+    HealthSnapshot(path).record("YahooAPI", True, proxy="http://1.2.3.4:80")
+    HealthSnapshot(path).record("StockAnalysisAPI", False)
+
+    snapshot = HealthSnapshot(path)
+    assert snapshot.healthy("YahooAPI")
+    assert snapshot.last_proxy("YahooAPI") == "http://1.2.3.4:80"
+    assert not snapshot.healthy("StockAnalysisAPI")
+    assert not snapshot.healthy("Unknown")
+    assert not HealthSnapshot(path, fresh_for=0).healthy("YahooAPI")
+
+
+def test_first_batch_is_the_health_check(tmp_path, monkeypatch):
+    snapshot = HealthSnapshot(str(tmp_path / "scraper_health.json"))
+    monkeypatch.setattr("src.scrapers.main.health", snapshot)
+    scraper = SimpleNamespace(
+        unverified=True, session=SimpleNamespace(proxy=None), health_key="YahooAPI"
+    )
+
+    assert not verify_health(scraper, {"NKE": StandardStockInfo})
+    assert snapshot.healthy("YahooAPI")
+    # only the first batch is checked
+    assert not verify_health(scraper, {"NKE": None})
+
+    # a failed first batch asks for the connection test
+    scraper.unverified = True
+    assert verify_health(scraper, None)
+    assert not scraper.unverified
+
+
+def test_direct_and_proxy_scrapers_keep_separate_records(tmp_path, monkeypatch):
+    snapshot = HealthSnapshot(str(tmp_path / "scraper_health.json"))
+    monkeypatch.setattr("src.scrapers.main.health", snapshot)
+    direct, proxied = YahooAPI(), YahooAPI(use_proxy=True)
+    assert direct.health_key != proxied.health_key
+
+    direct.session = SimpleNamespace(proxy=None)
+    direct.unverified = True
+    verify_health(direct, {"NKE": StandardStockInfo})
+    proxied.working = False
+    record_dead(proxied)
+
+    assert snapshot.healthy(direct.health_key)
+    assert not snapshot.healthy(proxied.health_key)
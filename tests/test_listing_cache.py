@@ -0,0 +1,174 @@
+import time
+
+import pytest
+
+from src.databases import listing_cache
+from src.databases.listing_cache import ListingCache, NameIndex
+from src.listings import nyse
+from src.listings.cached import CachedListing, NotModified
+from src.types import ListingSnapshot
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(listing_cache, "DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_get_name_multichar_symbol(cache_dir):
+    with ListingCache.session() as db:
+        db.save({"NKE": "Nike, Inc.", "BRK.B": "Berkshire Hathaway Inc."})
+        assert db.get_name("NKE") == ("Nike, Inc.",)
+        assert db.get_names(["NKE", "BRK.B", "XXX"]) == {
+            "NKE": "Nike, Inc.",
+            "BRK.B": "Berkshire Hathaway Inc.",
+        }
+
+
+def test_name_index_loads_once_and_batches_misses(cache_dir, monkeypatch):
+    with ListingCache.session() as db:
+        db.save({"NKE": "Nike, Inc."})
+
+    index = NameIndex()
+    assert index.get("NKE") == "Nike, Inc."
+
+    # added to the cache by another process after load
+    with ListingCache.session() as db:
+        db.save({"FI": "Fiserv, Inc."})
+
+    queries = []
+    get_names = ListingCache.get_names
+    monkeypatch.setattr(
+        ListingCache,
+        "get_names",
+        lambda self, symbols: queries.append(symbols) or get_names(self, symbols),
+    )
+    assert index.lookup(["NKE", "FI", "XXX"]) == {
+        "NKE": "Nike, Inc.",
+        "FI": "Fiserv, Inc.",
+    }
+    # known and missing symbols are not queried again
+    assert index.get("FI") == "Fiserv, Inc."
+    assert index.get("XXX") is None
+    assert queries == [["FI", "XXX"]]
+
+
+def test_snapshot_records_added_and_removed(cache_dir):
+    with ListingCache.session() as db:
+        assert db.get_snapshot("nasdaq100") is None
+        first = ListingSnapshot({"NKE": "Nike", "FI": "Fiserv"}, 100.0, etag='"a"')
+        assert db.save_snapshot("nasdaq100", first) == ([], [])
+
+        second = ListingSnapshot({"NKE": "Nike", "MMM": "3M"}, 200.0)
+        assert db.save_snapshot("nasdaq100", second) == (["MMM"], ["FI"])
+        assert db.get_snapshot("nasdaq100") == second
+        assert db.get_changes("nasdaq100") == {"added": ["MMM"], "removed": ["FI"]}
+        assert db.get_changes("nasdaq100", since=200.0) == {"added": [], "removed": []}
+
+
+class FakeListing(CachedListing):
+    name = "fake"
+
+    def __init__(self, pages):
+        super().__init__()
+        self.pages = pages
+        self.seen = []
+
+    def fetch_pages(self, previous):
+        self.seen.append(previous and previous.etag)
+        symbols = self.pages.pop(0)
+        if symbols is None:
+            raise NotModified
+        yield ListingSnapshot(symbols, time.time(), etag=str(len(self.seen)))
+
+
+def test_cached_listing_serves_fresh_snapshot(cache_dir):
+    listing = FakeListing([{"NKE": "Nike"}, None, {"NKE": "Nike", "FI": "Fiserv"}])
+    assert list(listing.get_data()) == ["NKE"]
+    # fresh, no request
+    assert list(listing.get_data()) == ["NKE"]
+    assert listing.seen == [None]
+
+    # not modified keeps the snapshot
+    assert list(listing.get_data(refresh=True)) == ["NKE"]
+    assert listing.seen == [None, "1"]
+
+    listing.ttl = 0
+    assert list(listing.get_data()) == ["NKE", "FI"]
+    assert listing.seen == [None, "1", "1"]
+    assert listing.added == ["FI"] and listing.removed == []
+    assert listing.changes()["added"] == ["FI"]
+
+
+class NYSEResponse:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, page_no, pages):
+        self.page_no = page_no
+        self.pages = pages
+
+    def json(self):
+        size = 1000 if self.page_no < self.pages else 10
+        if self.page_no > self.pages:
+            size = 0
+        symbol = lambda i: f"P{self.page_no}S{i}"
+        return [
+            {
+                "symbolTicker": symbol(i),
+                "normalizedTicker": symbol(i),
+                "instrumentName": symbol(i),
+                "micCode": "XNYS",
+            }
+            for i in range(size)
+        ]
+
+
+def test_nyse_streams_pages_until_short_page(cache_dir, monkeypatch):
+    requested = []
+
+    def post(url, headers, json):
+        requested.append(json["pageNumber"])
+        return NYSEResponse(json["pageNumber"], pages=3)
+
+    monkeypatch.setattr(nyse.requests, "post", post)
+    pages = list(nyse.NYSE(concurrency=2).stream())
+    assert sorted(len(page) for page in pages) == [10, 1000, 1000]
+    # at most one page requested past the last one
+    assert sorted(requested) in ([1, 2, 3], [1, 2, 3, 4])
+    with ListingCache.session() as db:
+        assert len(db.get_snapshot("nyse").symbols) == 2010
+
+
+class FailedResponse:
+    status_code = 500
+    text = "Internal Server Error"
+
+
+def test_nyse_ignores_failures_past_the_last_page(cache_dir, monkeypatch):
+    failures = {2: 1, 4: 3, 5: 3, 6: 3}
+
+    def post(url, headers, json):
+        page_no = json["pageNumber"]
+        if failures.get(page_no, 0) > 0:
+            failures[page_no] -= 1
+            return FailedResponse()
+        return NYSEResponse(page_no, pages=3)
+
+    monkeypatch.setattr(nyse.requests, "post", post)
+    pages = list(nyse.NYSE(concurrency=4).stream())
+    # page 2 is retried, failing pages past page 3 are not
+    assert sorted(len(page) for page in pages) == [10, 1000, 1000]
+    with ListingCache.session() as db:
+        assert len(db.get_snapshot("nyse").symbols) == 2010
+
+
+def test_nyse_fails_when_a_page_keeps_failing(cache_dir, monkeypatch):
+    def post(url, headers, json):
+        if json["pageNumber"] == 2:
+            return FailedResponse()
+        return NYSEResponse(json["pageNumber"], pages=3)
+
+    monkeypatch.setattr(nyse.requests, "post", post)
+    with pytest.raises(Exception, match="500"):
+        list(nyse.NYSE(concurrency=4).stream())
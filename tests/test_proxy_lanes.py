@@ -0,0 +1,96 @@
+import asyncio
+import time
+
+from src.utils import proxy as proxy_module
+from src.utils.proxy import AsyncRequestProxy, ProxyLanes, ProxyPool, RequestProxy
+from src.utils.rate_limiter import TokenBucket, get_rate_limiter
+from tests.datastructures import CustomResponse
+
+PROXIES = [f"http://10.0.1.{i}:80" for i in range(1, 5)]
+
+
+def test_lanes_use_distinct_proxies_and_take_turns(monkeypatch):
+    pool = ProxyPool(source=lambda: PROXIES, validate=lambda proxy: 0.1)
+    monkeypatch.setattr(proxy_module, "proxy_pool", pool)
+    lanes = ProxyLanes(lanes=3, rate_limit=0.01)
+    assert len(lanes.proxies()) == 3
+
+    used = []
+    for lane in lanes.lanes:
+        lane.session.request = lambda *args, proxies, **kwargs: (
+            used.append(proxies["https"]) or CustomResponse()
+        )
+    url = "https://lanes.example.com/quote"
+    for _ in range(6):
+        lanes.request("get", url)
+
+    assert used == [lane.proxy for lane in lanes.lanes] * 2
+    # every lane spends a budget of its own
+    buckets = {id(get_rate_limiter(url, 100, via=proxy)) for proxy in used}
+    assert len(buckets) == 3 and id(get_rate_limiter(url, 100)) not in buckets
+    pool.close()
+
+
+def test_retries_take_a_token_each():
+    bucket = TokenBucket(rate=0.001, capacity=5)
+    proxy = RequestProxy(backoff_base=0.001)
+    responses = [CustomResponse(status_code=429), CustomResponse(status_code=503)]
+    responses.append(CustomResponse())
+    proxy.session.request = lambda *args, **kwargs: responses.pop(0)
+
+    proxy.request("get", "https://retries.example.com/quote", rate_limiter=bucket)
+    assert round(bucket.tokens) == 5 - 3
+
+
+def test_rotated_lane_takes_tokens_of_its_new_proxy(monkeypatch):
+    pool = ProxyPool(source=lambda: PROXIES, validate=lambda proxy: 0.1)
+    monkeypatch.setattr(proxy_module, "proxy_pool", pool)
+    lanes = ProxyLanes(lanes=2, rate_limit=1000, burst=5)
+    lane = lanes.lanes[0]
+    first = lane.proxy
+
+    def request(*args, proxies, **kwargs):
+        if proxies["https"] == first:
+            raise ConnectionError("proxy down")
+        return CustomResponse()
+
+    lane.session.request = request
+    url = "https://rotation.example.com/quote"
+    lanes.request("get", url)
+
+    assert lane.proxy != first
+    assert round(get_rate_limiter(url, 0.001, via=first).tokens) == 4
+    assert round(get_rate_limiter(url, 0.001, via=lane.proxy).tokens) == 4
+    pool.close()
+
+
+def test_concurrent_requests_rotate_a_failed_proxy_once(monkeypatch):
+    pool = ProxyPool(source=lambda: PROXIES, validate=lambda proxy: 0.1)
+    monkeypatch.setattr(proxy_module, "proxy_pool", pool)
+    proxy = RequestProxy(use_proxy=True)
+    first = proxy.proxy
+    used, rotations = [], []
+    set_proxy = proxy.set_proxy
+    proxy.set_proxy = lambda *args: rotations.append(1) or set_proxy(*args)
+
+    def request(*args, proxies, **kwargs):
+        time.sleep(0.05)
+        if proxies["https"] == first:
+            raise ConnectionError("proxy down")
+        used.append(proxies["https"])
+        return CustomResponse()
+
+    proxy.session.request = request
+    async_proxy = AsyncRequestProxy(proxy, max_in_flight=8)
+
+    async def run():
+        url = "https://concurrent.example.com/quote"
+        return await asyncio.gather(
+            *(async_proxy.request("get", url) for _ in range(8))
+        )
+
+    responses = asyncio.run(run())
+    assert all(response.status_code == 200 for response in responses)
+    assert len(rotations) == 1
+    assert set(used) == {proxy.proxy} and proxy.proxy != first
+    pool.close()
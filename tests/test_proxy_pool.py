@@ -0,0 +1,51 @@
+import time
+
+from src.utils.proxy import ProxyPool
+
+LATENCIES = {f"http://10.0.0.{i}:80": 0.05 * i for i in range(1, 9)}
+
+
+def validate(proxy):
+    time.sleep(0.2)
+    # odd ones do not work
+    latency = LATENCIES[proxy]
+    return None if int(proxy[-4]) % 2 else latency
+
+
+def make_pool(**kwargs):
+    return ProxyPool(source=lambda: list(LATENCIES), validate=validate, **kwargs)
+
+
+def test_validates_in_parallel_and_hands_out_fastest():
+    pool = make_pool(workers=8)
+    started = time.monotonic()
+    proxy = pool.get(timeout=2)
+    # all 8 validated at once, not one after another
+    assert time.monotonic() - started < 1
+    assert proxy in ("http://10.0.0.2:80", "http://10.0.0.4:80")
+
+    time.sleep(0.3)
+    assert sorted(pool.entries) == [f"http://10.0.0.{i}:80" for i in (2, 4, 6, 8)]
+    assert pool.get(timeout=0) == "http://10.0.0.2:80"
+    assert pool.get(timeout=0, exclude={"http://10.0.0.2:80"}) == "http://10.0.0.4:80"
+    pool.close()
+
+
+def test_failing_and_stale_proxies_are_evicted():
+    pool = make_pool(workers=8, max_failures=3, min_size=1, refill_interval=60)
+    pool.get(timeout=2)
+    time.sleep(0.3)
+
+    # failures push a fast proxy behind slower but reliable ones
+    for _ in range(2):
+        pool.report("http://10.0.0.2:80", ok=False)
+    assert pool.get(timeout=0) == "http://10.0.0.4:80"
+    pool.report("http://10.0.0.2:80", ok=False)
+    assert "http://10.0.0.2:80" not in pool.entries
+
+    pool.max_age = 0
+    pool.entries["http://10.0.0.4:80"].seen_at -= 1
+    pool.evict_stale()
+    assert not pool.entries
+    pool.close()
+    pool.thread.join(1)
@@ -0,0 +1,91 @@
+import pytest
+
+from src.utils import rate_limiter
+from src.utils.rate_limiter import (
+    RateController,
+    TokenBucket,
+    get_rate_controller,
+    get_rate_limiter,
+    host_key,
+    load_rates,
+    report_throttled,
+    save_rates,
+)
+from src.utils.state import save_state
+
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=10, capacity=2)
+    # burst capacity is free, then one token per 0.1s
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == pytest.approx(0.1, abs=0.01)
+    assert bucket.reserve() == pytest.approx(0.2, abs=0.01)
+    assert bucket.waited == pytest.approx(0.3, abs=0.02)
+
+
+def test_rate_limiter_shared_per_host():
+    first = get_rate_limiter("https://example.com/api/quotes/s/{}", 2.0)
+    second = get_rate_limiter("https://example.com/stocks/NKE/", 5.0, capacity=3)
+    other = get_rate_limiter("https://other.example.com/quote", 1.0)
+
+    assert first is second
+    assert other is not first
+    # most permissive setting wins
+    assert first.rate == 5.0 and first.capacity == 3
+
+
+def test_rate_controller_aimd():
+    controller = RateController(TokenBucket(rate=1.0), max_rate=1.5)
+    for _ in range(10):
+        controller.record(True)
+    assert controller.bucket.rate == 1.5
+
+    controller.record(False)
+    assert controller.bucket.rate == 0.75
+    # throttled responses of requests already in flight do not cut it again
+    controller.record(False)
+    assert controller.bucket.rate == 0.75
+    controller.record(True)
+    assert controller.bucket.rate == pytest.approx(0.75 + 0.1 / 0.75)
+
+
+def test_learned_rates_persist(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "learned_rates", {})
+    monkeypatch.setattr(rate_limiter, "rate_controllers", {})
+    monkeypatch.setattr(rate_limiter, "rate_limiters", {})
+    path = str(tmp_path / "rates.json")
+    url = "https://learned.example.com/quote"
+
+    controller = get_rate_controller(url, 2.0)
+    controller.record(False)
+    save_rates(path)
+
+    monkeypatch.setattr(rate_limiter, "rate_controllers", {})
+    load_rates(path)
+    assert get_rate_controller(url, 2.0).bucket.rate == 1.0
+
+    report_throttled(url)
+    assert controller.bucket.rate == 0.5
+
+
+def test_learned_rate_survives_more_scrapers(tmp_path, monkeypatch):
+    monkeypatch.setattr(rate_limiter, "learned_rates", {})
+    monkeypatch.setattr(rate_limiter, "rate_controllers", {})
+    monkeypatch.setattr(rate_limiter, "rate_limiters", {})
+    path = str(tmp_path / "rates.json")
+    url = "https://survives.example.com/quote"
+    save_state(path, {host_key(url): 1.0})
+    load_rates(path)
+
+    bucket = get_rate_controller(url, 4.0, max_rate=3.0).bucket
+    assert bucket.rate == 1.0
+    # a second scraper on the host registers with its configured rate
+    assert get_rate_controller(url, 4.0).bucket.rate == 1.0
+    assert get_rate_limiter(url, 4.0, capacity=2) is bucket
+    assert bucket.rate == 1.0 and bucket.capacity == 2
+
+    # but the rate stays within the controller's max
+    bucket.set_rate(5.0)
+    get_rate_limiter(url, 4.0)
+    assert bucket.rate == 3.0
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from src.runners.scheduler import Scheduler
+from src.runners.utils import cancel_func
+from src.scrapers import scraper_instance
+
+
+def make_rate(worker, rate, seconds=10.0):
+    """Pretend worker completed rate symbols per second for some seconds"""
+    worker.started_at = time.monotonic() - seconds
+    worker.completed = int(rate * seconds)
+
+
+def test_full_batches_then_fair_share():
+    scheduler = Scheduler(f"S{i}" for i in range(100))
+    fast, slow = scheduler.worker("fast"), scheduler.worker("slow")
+
+    assert len(fast.pop_batch(40)) == 40
+    assert len(slow.pop_batch(40)) == 40
+    fast.finish_batch(fast.in_flight[0])
+    slow.finish_batch(slow.in_flight[0])
+    make_rate(fast, 9.0)
+    make_rate(slow, 1.0)
+
+    # 20 left, less than a round of batches: split by throughput
+    assert len(slow.pop_batch(40)) == 2
+    assert len(fast.pop_batch(40)) == 16
+    assert len(fast.pop_batch(40)) == 2
+    assert len(fast) == 0
+
+
+def test_idle_fast_worker_steals_from_slow():
+    scheduler = Scheduler(f"S{i}" for i in range(10))
+    fast, slow = scheduler.worker("fast"), scheduler.worker("slow")
+
+    slow_batch = slow.pop_batch(10)
+    assert len(slow_batch) == 10
+    assert not slow.drained()
+    # slow has not completed anything yet, fast has
+    make_rate(fast, 10.0)
+
+    stolen = fast.pop_batch(4)
+    assert stolen == slow_batch[-4:]
+    # stolen symbols are not handed out a third time
+    assert fast.pop_batch(10) == slow_batch[:6]
+    assert fast.pop_batch(10) == []
+    assert slow.drained() and fast.drained()
+    assert cancel_func(slow.pop)
+
+
+def test_no_stealing_from_faster_worker():
+    scheduler = Scheduler(["A", "B"])
+    fast, slow = scheduler.worker("fast"), scheduler.worker("slow")
+    make_rate(fast, 10.0)
+    make_rate(slow, 0.1)
+
+    assert fast.pop_batch(2) == ["A", "B"]
+    assert slow.pop_batch(2) == []
+    assert slow.drained() and not fast.drained()
+
+
+def test_streaming_workers_wait_for_feed_until_closed():
+    scheduler = Scheduler(["S0"], streaming=True)
+    worker = scheduler.worker("w")
+    first = worker.pop_batch(5)
+    assert first == ["S0"]
+    worker.finish_batch(first)
+    assert not worker.drained()
+
+    batches = []
+    waiting = threading.Thread(target=lambda: batches.append(worker.pop_batch(5)))
+    waiting.start()
+    time.sleep(0.05)
+    assert not batches
+    scheduler.feed(["S0", "S1", "S2"])
+    waiting.join(1)
+    # already fed symbols are ignored
+    assert batches == [["S1", "S2"]]
+    assert scheduler.symbols == ["S0", "S1", "S2"]
+
+    worker.finish_batch(batches[0])
+    waiting = threading.Thread(target=lambda: batches.append(worker.pop_batch(5)))
+    waiting.start()
+    scheduler.close()
+    waiting.join(1)
+    assert batches[-1] == []
+    assert worker.drained()
+
+
+def test_closed_worker_gives_back_its_share():
+    scheduler = Scheduler(f"S{i}" for i in range(100))
+    fast, dead = scheduler.worker("fast"), scheduler.worker("dead")
+    fast.finish_batch(fast.pop_batch(40))
+    dead_batch = dead.pop_batch(40)
+    make_rate(fast, 9.0)
+    make_rate(dead, 1.0)
+
+    # the scraper died mid batch, its symbols are queued again
+    dead.close()
+    assert scheduler.workers == [fast]
+    assert list(scheduler.queue)[:40] == dead_batch
+    # no share is reserved for the dead worker anymore
+    assert len(fast.pop_batch(40)) == 40
+    assert len(fast.pop_batch(40)) == 20
+
+
+def test_scraper_failing_to_start_closes_its_worker():
+    scheduler = Scheduler(["NKE", "FI"])
+    worker = scheduler.worker("broken")
+
+    class BrokenScraper:
+        def setup(self, cancel_func):
+            raise ConnectionError("unreachable")
+
+    with pytest.raises(ConnectionError):
+        scraper_instance(BrokenScraper(), worker.pop, None, lambda: False)
+    assert worker.closed and scheduler.workers == []
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from src.listings import slick_charts
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "slickcharts")
+
+
+def read_fixture(page: str) -> str:
+    with open(os.path.join(FIXTURES, f"{page}.html"), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize(
+    "page, rows", [("sp500", 503), ("nasdaq100", 101), ("dowjones", 30)]
+)
+def test_lxml_parser_matches_soup(page, rows):
+    html = read_fixture(page)
+    parsed = slick_charts.parse_table_lxml(html)
+    assert len(parsed) == rows
+    assert list(parsed.items()) == list(slick_charts.parse_table_soup(html).items())
+
+
+def test_entities_and_unicode_names():
+    parsed = slick_charts.parse_table(read_fixture("sp500"))
+    assert parsed["T"] == "AT&T Inc."
+    assert parsed["EL"] == "Estée Lauder Companies Inc. (The)"
+    assert parsed["BRK.B"] == "Berkshire Hathaway Inc. Class B"
+
+
+def test_falls_back_to_soup(monkeypatch):
+    def broken(html):
+        raise ValueError("broken")
+
+    monkeypatch.setattr(slick_charts, "parse_table_lxml", broken)
+    assert len(slick_charts.parse_table(read_fixture("dowjones"))) == 30
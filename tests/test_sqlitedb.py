@@ -0,0 +1,78 @@
+import sqlite3
+
+import pytest
+
+from src.databases import sqlitedb
+from src.databases.sqlitedb import MIGRATIONS, SqliteDB
+from src.types import SaveResult
+from tests.datastructures import synthetic_stocks
+
+
+@pytest.fixture
+def db_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlitedb, "DATA_DIR", str(tmp_path))
+    return tmp_path
+
+
+def indexes(conn):
+    rows = conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")
+    return {name for (name,) in rows}
+
+
+def test_writer_profile(db_dir):
+    with SqliteDB.session() as db:
+        assert db.cursor.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert db.cursor.execute("PRAGMA synchronous").fetchone()[0] == 1
+        assert {"stockinfo_symbol_timestamp", "stockinfo_timestamp"} <= indexes(db.conn)
+
+
+def test_migrates_existing_database(db_dir):
+    conn = sqlite3.connect(db_dir / "database.sqlite")
+    conn.execute(
+        "CREATE TABLE stockinfo (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "name TEXT, symbol TEXT, timestamp INTEGER)"
+    )
+    conn.commit()
+    assert not indexes(conn)
+
+    SqliteDB().close()
+    assert "stockinfo_symbol_timestamp" in indexes(conn)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    assert version == len(MIGRATIONS)
+    conn.close()
+
+
+def test_chunked_save(db_dir):
+    data = synthetic_stocks(25)
+    with SqliteDB.session() as db:
+        db.chunk_size = 10
+        db.save(data)
+        rows = db.cursor.execute("SELECT symbol FROM stockinfo ORDER BY id").fetchall()
+    assert [symbol for (symbol,) in rows] == [d.symbol for d in data]
+
+
+def test_save_skips_already_saved(db_dir):
+    data = synthetic_stocks(10)
+    with SqliteDB.session() as db:
+        assert db.save(data[:6]) == SaveResult(inserted=6, skipped=0)
+        assert db.save(data) == SaveResult(inserted=4, skipped=6)
+        count = db.cursor.execute("SELECT COUNT(*) FROM stockinfo").fetchone()[0]
+    assert count == 10
+
+
+def test_migration_removes_duplicates(db_dir):
+    conn = sqlite3.connect(db_dir / "database.sqlite")
+    conn.execute(
+        "CREATE TABLE stockinfo (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        "name TEXT, symbol TEXT, timestamp INTEGER)"
+    )
+    conn.executemany(
+        "INSERT INTO stockinfo (name, symbol, timestamp) VALUES (?, ?, ?)",
+        [("first", "NKE", 1), ("second", "NKE", 1), ("other", "NKE", 2)],
+    )
+    conn.commit()
+
+    SqliteDB().close()
+    rows = conn.execute("SELECT name FROM stockinfo ORDER BY id").fetchall()
+    assert rows == [("first",), ("other",)]
+    conn.close()
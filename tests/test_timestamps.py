@@ -0,0 +1,34 @@
+import json
+import os
+
+from src.scrapers import StockAnalysisAPI, YahooAPI
+from src.utils.timestamps import epoch_seconds, parse_market_time, timezone
+
+CORPUS = os.path.join(os.path.dirname(__file__), "fixtures", "timestamps.json")
+
+
+def load_corpus():
+    with open(CORPUS) as f:
+        return json.load(f)
+
+
+def test_yahoo_dates_match_corpus():
+    api = YahooAPI()
+    for data, expected in load_corpus()["yahoo"]:
+        assert epoch_seconds(data["regularMarketTime"]) == expected
+        assert api.parse_date(data) == expected
+
+
+def test_market_times_match_corpus():
+    api = StockAnalysisAPI()
+    for raw_date, expected in load_corpus()["stockanalysis"]:
+        assert parse_market_time(raw_date) == expected
+        assert api.parse_date(raw_date) == expected
+
+
+def test_market_times_cached_by_string():
+    parse_market_time.cache_clear()
+    for _ in range(3):
+        parse_market_time("Jun 9, 2023, 4:00 PM EDT")
+    assert parse_market_time.cache_info().hits == 2
+    assert timezone() is timezone("America/New_York")
@@ -0,0 +1,119 @@
+import threading
+import time
+from dataclasses import replace
+
+import pytest
+
+from src.databases import StreamWriter, sqlitedb
+from src.databases import writer as writer_module
+from src.databases.sqlitedb import SqliteDB
+from src.types import SaveResult
+from tests.datastructures import StandardStockInfo
+
+
+class MemoryDB:
+    instances = []
+
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+        MemoryDB.instances.append(self)
+
+    def save(self, data):
+        self.batches.append(list(data))
+        return SaveResult(inserted=len(data), skipped=0)
+
+    def close(self):
+        self.closed = True
+
+
+class SlowDB(MemoryDB):
+    gate = threading.Event()
+
+    def save(self, data):
+        self.gate.wait()
+        return super().save(data)
+
+
+class BrokenDB:
+    def __init__(self):
+        raise ConnectionError("unreachable")
+
+
+def test_writer_flushes_by_size_and_on_close():
+    MemoryDB.instances = []
+    with StreamWriter([MemoryDB, BrokenDB], batch_size=3, flush_interval=60) as writer:
+        for _ in range(7):
+            writer.put(StandardStockInfo)
+
+    (db,) = MemoryDB.instances
+    assert [len(batch) for batch in db.batches] == [3, 3, 1]
+    assert db.closed and writer.saved == 7
+    assert writer.inserted == {"MemoryDB": 7}
+
+
+def test_writer_flushes_by_time():
+    MemoryDB.instances = []
+    with StreamWriter([MemoryDB], batch_size=100, flush_interval=0.05) as writer:
+        writer.put(StandardStockInfo)
+        time.sleep(0.3)
+        assert MemoryDB.instances[0].batches == [[StandardStockInfo]]
+
+
+def test_writer_backpressure():
+    MemoryDB.instances = []
+    SlowDB.gate.clear()
+    writer = StreamWriter([SlowDB], batch_size=1, max_queue=2).start()
+
+    # one stock held by the stuck save, two fill the queue, the next one waits
+    for _ in range(3):
+        writer.put(StandardStockInfo)
+    blocked = threading.Thread(target=writer.put, args=(StandardStockInfo,))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+
+    SlowDB.gate.set()
+    blocked.join(1)
+    writer.close()
+    assert not blocked.is_alive() and writer.saved == 4
+
+
+def test_writer_saves_to_sqlite_from_its_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(sqlitedb, "DATA_DIR", str(tmp_path))
+    stocks = [replace(StandardStockInfo, symbol=f"S{i}") for i in range(20)]
+    with StreamWriter([SqliteDB], batch_size=7, flush_interval=60) as writer:
+        for stock in stocks:
+            writer.put(stock)
+
+    assert writer.inserted == {"SqliteDB": 20}
+    with SqliteDB.session() as db:
+        assert db.cursor.execute("SELECT COUNT(*) FROM stockinfo").fetchone() == (20,)
+
+
+class CrashingDB(MemoryDB):
+    def save(self, data):
+        # escapes the per database error handling
+        raise SystemExit("crash")
+
+
+def test_dead_writer_fails_put_and_close(monkeypatch):
+    monkeypatch.setattr(writer_module, "PUT_CHECK_INTERVAL", 0.01)
+    writer = StreamWriter([CrashingDB], batch_size=1, max_queue=1).start()
+    writer.put(StandardStockInfo)
+    writer.thread.join(1)
+    assert not writer.thread.is_alive()
+
+    with pytest.raises(RuntimeError):
+        for _ in range(3):
+            writer.put(StandardStockInfo)
+    with pytest.raises(RuntimeError):
+        writer.close()
+
+
+def test_dead_writer_does_not_hide_the_scrape_error():
+    with pytest.raises(ValueError, match="scrape failed"):
+        with StreamWriter([CrashingDB], batch_size=1) as writer:
+            writer.put(StandardStockInfo)
+            writer.thread.join(1)
+            raise ValueError("scrape failed")
@@ -4,6 +4,7 @@ import pytest
 
 from src.types import StockInfo
 from tests.datastructures import (
+    CBisectYahooAPI,
     CustomResponse,
     CYahooAPI,
     StandardStockInfo,
@@ -71,6 +72,20 @@ def get_test_data_incomplete():
     assert api.get_data(["FI"]) == {"FI": StockInfo(**expected)}
 
 
+def test_get_data_raw_values():
+    # formatted=false answers with plain values instead of {raw, fmt} objects
+    raw = {
+        key: value["raw"] if isinstance(value, dict) else value
+        for key, value in CustomResponse().default_data().items()
+    }
+    api = CYahooAPI(response=CustomResponse(replace_result=[raw]))
+    assert api.get_data(["FI"]) == {"FI": StandardStockInfo}
+
+    del raw["regularMarketOpen"]
+    api = CYahooAPI(response=CustomResponse(replace_result=[raw]))
+    assert api.get_data(["FI"]) == {"FI": None}
+
+
 def test_get_data_codes():
     num = randint(1, 100)
     api = CYahooAPI(response=CustomResponse(status_code=404))
@@ -111,3 +126,57 @@ def test_get_data_exception():
     api = CYahooAPI(response=CustomResponse(replace_json={}))
     with pytest.raises(KeyError) as e:
         api.get_data([])
+
+
+def test_get_data_matches_by_symbol():
+    api = CBisectYahooAPI()
+    data = api.get_data(["AAA", "DEL1", "BBB"])
+    assert data["AAA"].symbol == "AAA"
+    assert data["BBB"].symbol == "BBB"
+    assert data["DEL1"] is None
+
+
+def test_get_data_delisted_not_retried_one_by_one():
+    api = CBisectYahooAPI()
+    symbols = [f"S{i}" for i in range(30)] + [f"DEL{i}" for i in range(20)]
+    data = api.get_data(symbols)
+
+    assert all(data[f"S{i}"] for i in range(30))
+    assert all(data[f"DEL{i}"] is None for i in range(20))
+    # batch, then one retry of the failures that answers for all of them
+    assert len(api.session.requested) == 2
+    assert api.retry_stats == {"requests": 1, "saved": 20}
+
+
+def test_get_data_bisects_poisoned_batch():
+    api = CBisectYahooAPI(retry_budget=20)
+    symbols = [f"S{i}" for i in range(32)]
+    symbols[5], symbols[20] = "BAD1", "BAD2"
+    data = api.get_data(symbols)
+
+    assert data["BAD1"] is None and data["BAD2"] is None
+    assert all(data[s] for s in symbols if not s.startswith("BAD"))
+    # 2 bad in 32: 1 + 2 * log2(32) requests, instead of 1 + 32 one by one
+    assert api.retry_stats == {"requests": 19, "saved": 14}
+
+
+def test_get_data_retry_budget():
+    api = CBisectYahooAPI(retry_budget=3)
+    symbols = [f"S{i}" for i in range(32)]
+    symbols[5], symbols[20] = "BAD1", "BAD2"
+    api.get_data(symbols)
+    assert len(api.session.requested) == 1 + 3
+
+
+def test_fetch_batch_outcome_is_the_batch_request():
+    api = CBisectYahooAPI(retry_budget=20)
+    symbols = [f"S{i}" for i in range(8)] + ["BAD1"]
+    data, outcome = api.fetch_batch(symbols)
+
+    assert all(data[s] for s in symbols if s != "BAD1")
+    # the retries answered 200, the batch itself did not
+    assert outcome.status_code == 400 and not outcome.ok
+    assert outcome.latency >= 0
+
+    data, outcome = api.fetch_batch(["S1", "DEL1"])
+    assert outcome.status_code == 200 and outcome.ok